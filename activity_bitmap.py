@@ -0,0 +1,121 @@
+"""
+活动位图模块 - 用1440位(180字节)表示一天中每分钟是否活跃
+
+本模块负责:
+1. 创建和修改每日活动位图
+2. 在位图上用位运算计算活跃分钟数、最长连续会话、每小时活跃分钟数
+3. 找出一天中的活跃时段和休息间隔
+
+位图格式: 第m分钟(0点起)对应第m // 8个字节的第m % 8位(低位在前)，
+即按小端序转换为整数后，第m位表示第m分钟。daily_summary.activity_bitmap
+以此格式存储，一年的位图约65KB，可以一次性全部载入分析。
+"""
+
+MINUTES_PER_DAY = 1440
+BITMAP_BYTES = MINUTES_PER_DAY // 8
+
+_HOUR_MASK = (1 << 60) - 1
+
+def empty():
+    """返回全部不活跃的位图"""
+    return bytes(BITMAP_BYTES)
+
+def to_int(bitmap):
+    """将位图转换为整数，第m位表示第m分钟，None视为全部不活跃"""
+    if not bitmap:
+        return 0
+    return int.from_bytes(bitmap, "little")
+
+def from_int(value):
+    """将整数转换为180字节的位图"""
+    return value.to_bytes(BITMAP_BYTES, "little")
+
+def set_minute(bitmap, minute, active):
+    """设置某一分钟的活跃状态
+
+    参数:
+        bitmap (bytes): 原位图，None视为全部不活跃
+        minute (int): 当天的第几分钟 (0-1439)
+        active (bool): 是否活跃
+
+    返回:
+        bytes: 新位图
+    """
+    if not 0 <= minute < MINUTES_PER_DAY:
+        raise ValueError(f"分钟序号超出范围: {minute}")
+    data = bytearray(bitmap or BITMAP_BYTES)
+    if active:
+        data[minute >> 3] |= 1 << (minute & 7)
+    else:
+        data[minute >> 3] &= ~(1 << (minute & 7)) & 0xFF
+    return bytes(data)
+
+def from_minutes(minutes):
+    """由当天活跃分钟序号的集合构建位图"""
+    value = 0
+    for minute in minutes:
+        value |= 1 << minute
+    return from_int(value)
+
+def active_minutes(bitmap):
+    """当天的活跃分钟数"""
+    return bin(to_int(bitmap)).count("1")
+
+def longest_run(bitmap):
+    """最长连续活跃分钟数
+
+    每次与右移一位的自身相与，所有连续段都缩短1分钟，
+    循环次数即为最长连续段的长度。
+    """
+    value = to_int(bitmap)
+    length = 0
+    while value:
+        value &= value >> 1
+        length += 1
+    return length
+
+def hourly_counts(bitmap):
+    """每小时的活跃分钟数
+
+    返回:
+        list: 24个元素的列表
+    """
+    value = to_int(bitmap)
+    return [bin((value >> (hour * 60)) & _HOUR_MASK).count("1") for hour in range(24)]
+
+def active_runs(bitmap):
+    """按时间顺序列出所有连续活跃时段
+
+    返回:
+        list: (起始分钟, 持续分钟数)元组的列表
+    """
+    value = to_int(bitmap)
+    runs = []
+    while value:
+        # 最低的置位即下一个时段的起点，(y + 1)进位后最低的零位即时段的终点
+        start = (value & -value).bit_length() - 1
+        shifted = value >> start
+        length = (~shifted & (shifted + 1)).bit_length() - 1
+        runs.append((start, length))
+        value = (shifted >> length) << (start + length)
+    return runs
+
+def breaks(bitmap, min_minutes=1):
+    """找出两段活跃时段之间的休息间隔
+
+    第一段活跃之前和最后一段活跃之后的空闲时间不算作休息。
+
+    参数:
+        bitmap (bytes): 当天的位图
+        min_minutes (int): 至少多长的间隔才算作一次休息
+
+    返回:
+        list: (起始分钟, 持续分钟数)元组的列表
+    """
+    runs = active_runs(bitmap)
+    result = []
+    for (start, length), (next_start, _) in zip(runs, runs[1:]):
+        gap_start = start + length
+        if next_start - gap_start >= min_minutes:
+            result.append((gap_start, next_start - gap_start))
+    return result
@@ -2,25 +2,120 @@
 活动监控模块 - 负责检测鼠标和键盘活动
 """
 
+import math
 import threading
 import time
-from pynput import mouse, keyboard
+from array import array
 import logging
+import activity_sources
+from typing_stats import TypingStats
+
+# 回调中频繁调用，绑定为模块级名称省去属性查找
+_monotonic = time.monotonic
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class ActivityMonitor:
-    def __init__(self):
-        """初始化活动监控器"""
-        self.mouse_position = None
+    """鼠标和键盘活动监控器
+
+    输入事件由活动来源(见activity_sources)上报，默认使用pynput监听。
+    输入事件回调不加锁: 鼠标和键盘各由自己的监听线程回调，每个计数器只有
+    一个写入者，回调里只做计数加一和保存时间戳。计数器只增不减，读取方
+    (check_activity_minute、reset)在锁内记下读取时的值作为基准，用两次
+    读取之差得到区间内的事件数，因此回调线程和读取线程之间不需要同步。
+    时间戳使用time.monotonic()，不受系统时间调整的影响。
+    check_activity_minute会推进基准、取走这段时间的采样，只应由TimeTracker的
+    节拍调用；界面、后台线程等其他读取方使用snapshot()，它只读不改基准，
+    任意多个读取方同时调用也不会影响跟踪器的统计。
+    可以注入时钟(见clock模块)供模拟运行使用: 注入的时钟用于读取方和add_events
+    的默认时间戳，单事件回调始终使用系统单调时钟，模拟时事件应通过add_events
+    带时间戳上报。
+
+    另外用一个环形缓冲区记录最近RING_SECONDS秒中每一秒是否有输入。每秒只有
+    第一个事件进入慢路径(持有_second_lock补齐环形缓冲区)，其余事件仍然无锁。
+    缓冲区的每个槽保存"截至该秒的累计活跃秒数"，任意最近N秒的活跃秒数都是
+    两个槽之差，查询为常数时间且不分配内存。
+
+    鼠标移动事件的频率取决于鼠标的回报率，逐个计数只反映硬件而不是使用强度。
+    移动事件按时间和距离合并采样: 距上一个采样点不足MOUSE_SAMPLE_INTERVAL秒的
+    事件只记录位置，移动不足MOUSE_SAMPLE_DISTANCE像素的采样视为抖动忽略。
+    mouse_moves统计采样次数，mouse_distance累计采样点之间的直线距离(像素)。
+
+    键盘线程同时流式统计相邻按键的间隔(见typing_stats)，check_activity_minute
+    把当前的统计对象整个换成新对象后再读取，换出时正在进行的那一次更新可能
+    落在旧对象上而未被读到，最多影响一个间隔。
+
+    流量保护: 游戏鼠标或按键连发可能每秒产生上千个事件，全部在系统输入钩子
+    线程上回调，回调处理不过来会造成系统级的输入延迟。每个监听线程每秒最多
+    完整处理MOUSE_EVENT_BUDGET / KEY_EVENT_BUDGET个事件，这一秒已经确认活跃
+    之后，超出预算的事件只做一次比较和一次计数加一就返回(计为丢弃)，
+    鼠标移动仍按采样间隔放行采样点，移动距离的统计不受影响。
+    未成为采样点的鼠标移动计为合并。两者的累计值见get_input_stats()。
+    """
+
+    # 鼠标移动的采样间隔(秒)和最小采样距离(像素)
+    MOUSE_SAMPLE_INTERVAL = 0.05
+    MOUSE_SAMPLE_DISTANCE = 3
+    # 每个监听线程每秒完整处理的事件数上限，远高于采样和正常打字所需
+    MOUSE_EVENT_BUDGET = 200
+    KEY_EVENT_BUDGET = 50
+
+    # 环形缓冲区的深度(秒)，固定占用RING_SECONDS * 8字节
+    RING_SECONDS = 4 * 3600
+
+    def __init__(self, source=None, clock=None):
+        """初始化活动监控器
+        
+        参数:
+            source (ActivitySource, optional): 输入事件来源，默认为PynputSource
+            clock (SystemClock/VirtualClock, optional): 时钟，默认为系统单调时钟
+        """
+        self.source = source or activity_sources.PynputSource()
+        self._clock_monotonic = clock.monotonic if clock else _monotonic
+        
+        # 以下字段只由各自的监听线程写入
+        self._mouse_events = 0
+        self._key_events = 0
+        self._other_events = 0  # 无法区分鼠标和键盘的输入(如空闲时间查询)
+        self._click_events = 0
+        self._mouse_distance = 0.0
+        self._mouse_position = None
+        self._sample_position = None
+        self._sample_time = 0.0
+        
+        # 每秒事件预算及丢弃/合并计数，同样按监听线程分开，各自只有一个写入者
+        self._mouse_budget_second = -1
+        self._mouse_budget = 0
+        self._mouse_dropped = 0
+        self._mouse_coalesced = 0
+        self._key_budget_second = -1
+        self._key_budget = 0
+        self._key_dropped = 0
+        self._last_mouse_time = self._clock_monotonic()
+        self._last_key_time = -math.inf  # 第一次按键没有间隔
+        self._last_other_time = self._last_mouse_time
+        self._typing = TypingStats()
+        
+        # 每秒活跃状态的环形缓冲区，以下字段在_second_lock内写入
+        # _cumulative[s % RING_SECONDS] = 截至第s秒(含)的累计活跃秒数，对_filled_second之前的
+        # RING_SECONDS秒有效；_current_second是最近一个活跃的秒，回调用它判断是否需要进入慢路径
+        self._second_lock = threading.Lock()
+        self._cumulative = array('q', bytes(8 * self.RING_SECONDS))
+        self._active_seconds_total = 0
+        self._filled_second = int(self._last_mouse_time)
+        self._current_second = -1
+
+        # 以下字段只在锁内由读取方访问
+        self._mouse_baseline = 0
+        self._key_baseline = 0
+        self._other_baseline = 0
+        self._click_baseline = 0
+        self._distance_baseline = 0.0
+        self._seconds_baseline = 0
         self.last_mouse_position = None
-        self.key_press_count = 0
-        self.mouse_move_count = 0  # 新增鼠标移动计数
-        self.last_activity_time = time.time()
         self.is_active_minute = False
-        self.mouse_listener = None
-        self.keyboard_listener = None
+
         self.running = False
         self.lock = threading.Lock()
 
@@ -29,85 +124,296 @@ class ActivityMonitor:
         if self.running:
             return
             
+        try:
+            self.source.start(self)
+        except Exception as e:
+            logging.error(f"启动活动来源{self.source.name}失败: {e}")
+            if isinstance(self.source, activity_sources.PynputSource):
+                return
+            # 选择的来源不可用时退回默认的pynput来源
+            logging.warning("改用pynput活动来源")
+            self.source = activity_sources.PynputSource()
+            try:
+                self.source.start(self)
+            except Exception as e:
+                logging.error(f"启动活动来源{self.source.name}失败，活动监控未启动: {e}")
+                return
+            
         self.running = True
-        
-        # 启动鼠标监听
-        self.mouse_listener = mouse.Listener(on_move=self._on_mouse_move)
-        self.mouse_listener.start()
-        
-        # 启动键盘监听
-        self.keyboard_listener = keyboard.Listener(on_press=self._on_key_press)
-        self.keyboard_listener.start()
-        
-        logging.info("活动监控已启动")
+        logging.info(f"活动监控已启动，来源: {self.source.name}")
     
     def stop(self):
         """停止监控线程"""
+        if self.running:
+            self.source.stop()
         self.running = False
-        
-        if self.mouse_listener:
-            self.mouse_listener.stop()
-            
-        if self.keyboard_listener:
-            self.keyboard_listener.stop()
-            
         logging.info("活动监控已停止")
     
     def _on_mouse_move(self, x, y):
-        """鼠标移动时触发"""
-        with self.lock:
-            self.mouse_position = (x, y)
-            self.mouse_move_count += 1  # 增加移动计数
-            self.last_activity_time = time.time()
+        """鼠标移动时触发(鼠标监听线程，同一秒内的后续事件不加锁)"""
+        now = _monotonic()
+        second = int(now)
+        if second != self._mouse_budget_second:
+            # 本线程在这一秒的第一个事件: 重置预算并记录活跃秒
+            self._mouse_budget_second = second
+            self._mouse_budget = self.MOUSE_EVENT_BUDGET
+            if second != self._current_second:
+                self._mark_second(second)
+        elif self._mouse_budget <= 0 and now - self._sample_time < self.MOUSE_SAMPLE_INTERVAL:
+            # 预算用尽时只放行到期的采样点
+            self._mouse_dropped += 1
+            return
+        self._mouse_budget -= 1
+        
+        self._mouse_position = (x, y)
+        self._last_mouse_time = now
+        if now - self._sample_time < self.MOUSE_SAMPLE_INTERVAL:
+            self._mouse_coalesced += 1
+            return
+        
+        # 采样: 与上一个采样点比较移动距离
+        last = self._sample_position
+        if last is None:
+            self._sample_position = (x, y)
+            self._sample_time = now
+            return
+        distance = math.hypot(x - last[0], y - last[1])
+        if distance >= self.MOUSE_SAMPLE_DISTANCE:
+            self._mouse_distance += distance
+            self._mouse_events += 1
+            self._sample_position = (x, y)
+            self._sample_time = now
+        else:
+            # 抖动同样推进采样时间，否则之后的每个抖动事件都会重新计算距离
+            self._sample_time = now
+            self._mouse_coalesced += 1
+            
+    def _on_mouse_click(self, x, y, button, pressed):
+        """鼠标按键时触发(鼠标监听线程)，只统计按下"""
+        if not pressed:
+            return
+        self._click_events += 1
+        now = self._last_mouse_time = _monotonic()
+        if int(now) != self._current_second:
+            self._mark_second(int(now))
     
     def _on_key_press(self, key):
-        """键盘按键时触发"""
+        """键盘按键时触发(键盘监听线程，同一秒内的后续事件不加锁)"""
+        now = _monotonic()
+        second = int(now)
+        if second != self._key_budget_second:
+            self._key_budget_second = second
+            self._key_budget = self.KEY_EVENT_BUDGET
+            if second != self._current_second:
+                self._mark_second(second)
+        elif self._key_budget <= 0:
+            self._key_dropped += 1
+            return
+        self._key_budget -= 1
+        
+        self._key_events += 1
+        previous = self._last_key_time
+        self._last_key_time = now
+        self._typing.add(now - previous)
+            
+    def add_events(self, mouse_moves=0, key_presses=0, other_events=0, position=None,
+                   timestamp=None, mouse_distance=0.0, mouse_clicks=0, key_intervals=()):
+        """批量上报输入事件，供按批读取事件的来源使用
+        
+        与单事件回调一样不加锁，调用方应是该来源唯一的上报线程。
+        
+        参数:
+            mouse_moves (int): 鼠标移动次数(应由来源自行合并为采样次数)
+            key_presses (int): 按键次数
+            other_events (int): 未分类的输入次数
+            position (tuple, optional): 最新的鼠标位置
+            timestamp (float, optional): 最后一个事件的单调时钟时间，默认为现在
+            mouse_distance (float): 鼠标移动距离
+            mouse_clicks (int): 鼠标按键次数
+            key_intervals (iterable): 来源测得的相邻按键间隔(秒)
+        """
+        now = self._clock_monotonic() if timestamp is None else timestamp
+        if mouse_moves:
+            if position is not None:
+                self._mouse_position = position
+            self._mouse_events += mouse_moves
+            self._mouse_distance += mouse_distance
+            self._last_mouse_time = now
+        if mouse_clicks:
+            self._click_events += mouse_clicks
+            self._last_mouse_time = now
+        if key_presses:
+            self._key_events += key_presses
+            self._last_key_time = now
+            typing = self._typing
+            for interval in key_intervals:
+                typing.add(interval)
+        if other_events:
+            self._other_events += other_events
+            self._last_other_time = now
+        if ((mouse_moves or key_presses or other_events or mouse_clicks)
+                and int(now) != self._current_second):
+            self._mark_second(int(now))
+            
+    def _mark_second(self, second):
+        """将某一秒记为活跃，每秒最多执行一次"""
+        with self._second_lock:
+            if second <= self._current_second:
+                return  # 另一个监听线程已经记录了这一秒(或更晚的一秒)
+            self._fill_until(second - 1)
+            self._active_seconds_total += 1
+            # get_active_seconds可能已经补齐了这一秒之后的槽，它们同样要计入这一秒
+            total = self._active_seconds_total
+            for s in range(second, max(second, self._filled_second) + 1):
+                self._cumulative[s % self.RING_SECONDS] = total
+            self._filled_second = max(second, self._filled_second)
+            self._current_second = second
+            
+    def _fill_until(self, second):
+        """用当前累计值补齐从上次记录到second(含)之间没有活动的各秒(需持有_second_lock)"""
+        size = self.RING_SECONDS
+        start = max(self._filled_second + 1, second - size + 1)
+        total = self._active_seconds_total
+        cumulative = self._cumulative
+        for s in range(start, second + 1):
+            cumulative[s % size] = total
+        if second > self._filled_second:
+            self._filled_second = second
+        
+    def get_active_seconds(self, seconds=60):
+        """最近seconds秒(含当前这一秒)中有输入的秒数
+        
+        参数:
+            seconds (int): 时间窗口长度，最大为RING_SECONDS - 1
+            
+        返回:
+            int: 活跃秒数
+        """
+        seconds = min(int(seconds), self.RING_SECONDS - 1)
+        if seconds <= 0:
+            return 0
+        with self._second_lock:
+            now = int(self._clock_monotonic())
+            self._fill_until(now)
+            before = self._cumulative[(now - seconds) % self.RING_SECONDS]
+            return self._active_seconds_total - before
+    
+    def snapshot(self):
+        """读取自上次check_activity_minute以来的活动，不取走采样
+        
+        与check_activity_minute返回相同的计数，但不推进基准、不更新鼠标位置，
+        也不包含按键间隔统计(统计对象只能由消费方换出)。可以由任意线程随时调用。
+        
+        返回:
+            dict: is_active、mouse_moves、key_presses、active_seconds、mouse_distance、
+                mouse_clicks，以及idle_seconds(距最近一次输入的秒数)
+        """
         with self.lock:
-            self.key_press_count += 1
-            self.last_activity_time = time.time()
+            moves_count = self._mouse_events - self._mouse_baseline
+            keys_count = self._key_events - self._key_baseline
+            other_count = self._other_events - self._other_baseline
+            clicks_count = self._click_events - self._click_baseline
+            distance = self._mouse_distance - self._distance_baseline
+            active_seconds = min(self._active_seconds_total - self._seconds_baseline, 60)
+            current_position = self._mouse_position
+            mouse_moved = (self.last_mouse_position != current_position and
+                           self.last_mouse_position is not None and
+                           current_position is not None)
+        return {
+            "is_active": mouse_moved or keys_count > 0 or clicks_count > 0 or other_count > 0,
+            "mouse_moves": moves_count,
+            "key_presses": keys_count,
+            "active_seconds": active_seconds,
+            "mouse_distance": int(round(distance)),
+            "mouse_clicks": clicks_count,
+            "idle_seconds": self.get_idle_time()
+        }
     
     def check_activity_minute(self):
-        """检查过去一分钟内是否有活动"""
+        """取走自上次检查以来的活动采样并推进基准
+        
+        只应由TimeTracker的节拍调用，其他读取方请使用snapshot()。
+        """
         with self.lock:
-            current_position = self.mouse_position
+            mouse_events = self._mouse_events
+            key_events = self._key_events
+            other_events = self._other_events
+            click_events = self._click_events
+            distance_total = self._mouse_distance
+            typing = self._typing
+            self._typing = TypingStats()
+            active_total = self._active_seconds_total
+            current_position = self._mouse_position
+            
+            moves_count = mouse_events - self._mouse_baseline
+            keys_count = key_events - self._key_baseline
+            self._mouse_baseline = mouse_events
+            self._key_baseline = key_events
+            other_count = other_events - self._other_baseline
+            self._other_baseline = other_events
+            clicks_count = click_events - self._click_baseline
+            self._click_baseline = click_events
+            distance = distance_total - self._distance_baseline
+            self._distance_baseline = distance_total
+            # 两次检查间隔略大于一分钟时活跃秒数可能超过60，按一分钟截断
+            active_seconds = min(active_total - self._seconds_baseline, 60)
+            self._seconds_baseline = active_total
+            
             mouse_moved = (self.last_mouse_position != current_position and 
                           self.last_mouse_position is not None and 
                           current_position is not None)
             
-            moves_count = self.mouse_move_count
-            keys_count = self.key_press_count
-            
-            # 更新上次位置并重置按键计数
+            # 更新上次位置
             self.last_mouse_position = current_position
             
             # 检查是否活跃
-            active = mouse_moved or keys_count > 0
+            active = mouse_moved or keys_count > 0 or clicks_count > 0 or other_count > 0
             self.is_active_minute = active
             
-            # 获取当前状态并重置计数器
             result = {
                 "is_active": active,
                 "mouse_moves": moves_count,
-                "key_presses": keys_count
+                "key_presses": keys_count,
+                "active_seconds": active_seconds,
+                "mouse_distance": int(round(distance)),
+                "mouse_clicks": clicks_count,
+                "typing": typing
             }
             
-            self.mouse_move_count = 0
-            self.key_press_count = 0
-            
             if active:
-                logging.debug(f"检测到活动: 鼠标移动={mouse_moved}({moves_count}次), 按键次数={keys_count}")
+                logging.debug(f"检测到活动: 鼠标移动={mouse_moved}({moves_count}次, {distance:.0f}像素), 点击{clicks_count}次, 按键次数={keys_count}, 其他输入={other_count}")
             
             return result
     
+    def get_input_stats(self):
+        """获取启动以来的输入事件处理统计
+        
+        返回:
+            dict: mouse_samples(鼠标采样次数)、mouse_coalesced(合并的鼠标移动)、
+                mouse_dropped / key_dropped(超出每秒预算而丢弃的事件)、key_presses(计入的按键)
+        """
+        return {
+            "mouse_samples": self._mouse_events,
+            "mouse_coalesced": self._mouse_coalesced,
+            "mouse_dropped": self._mouse_dropped,
+            "key_presses": self._key_events,
+            "key_dropped": self._key_dropped
+        }
+        
     def get_idle_time(self):
         """获取自上次活动以来的时间（秒）"""
-        with self.lock:
-            return time.time() - self.last_activity_time
+        return self._clock_monotonic() - max(self._last_mouse_time, self._last_key_time,
+                                             self._last_other_time)
     
     def reset(self):
         """重置监控状态"""
         with self.lock:
-            self.key_press_count = 0
-            self.mouse_move_count = 0
+            self._mouse_baseline = self._mouse_events
+            self._key_baseline = self._key_events
+            self._other_baseline = self._other_events
+            self._click_baseline = self._click_events
+            self._distance_baseline = self._mouse_distance
+            self._typing = TypingStats()
+            self._seconds_baseline = self._active_seconds_total
             self.last_mouse_position = None
-            self.is_active_minute = False 
\ No newline at end of file
+            self.is_active_minute = False
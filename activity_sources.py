@@ -0,0 +1,424 @@
+"""
+活动来源模块 - 为ActivityMonitor提供不同的输入事件来源
+
+本模块提供以下来源，通过配置项ACTIVITY_SOURCE选择:
+1. pynput: 通过pynput监听鼠标和键盘，每个事件回调一次(默认)
+2. evdev: 在一个线程中直接读取Linux的/dev/input/event*设备，按批计数，
+   不依赖图形环境，适用于无界面或Wayland的Linux系统(需要对输入设备有读权限)
+3. idle: 每秒查询一次系统空闲时间(Windows的GetLastInputInfo或X11的
+   XScreenSaver扩展)，没有逐事件开销，但无法区分鼠标和键盘
+4. 脚本来源(ScriptedSource): 按预设的事件序列回放，用于测试
+
+每个来源在start()时绑定一个ActivityMonitor，并通过其_on_mouse_move、
+_on_key_press或add_events方法上报事件。
+"""
+
+import glob
+from abc import ABC, abstractmethod
+import math
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import logging
+
+class ActivitySource:
+    """活动来源的基类"""
+
+    name = "base"
+
+    def __init__(self):
+        self.monitor = None
+        self.running = False
+
+    def start(self, monitor):
+        """开始向monitor上报输入事件
+
+        参数:
+            monitor (ActivityMonitor): 接收事件的活动监控器
+        """
+        self.monitor = monitor
+        self.running = True
+
+    def stop(self):
+        """停止上报事件"""
+        self.running = False
+
+class PynputSource(ActivitySource):
+    """通过pynput的鼠标/键盘监听线程上报每一个事件"""
+
+    name = "pynput"
+
+    def __init__(self):
+        super().__init__()
+        self.mouse_listener = None
+        self.keyboard_listener = None
+
+    def start(self, monitor):
+        from pynput import mouse, keyboard
+
+        super().start(monitor)
+        self.mouse_listener = mouse.Listener(on_move=monitor._on_mouse_move,
+                                             on_click=monitor._on_mouse_click)
+        self.mouse_listener.start()
+        self.keyboard_listener = keyboard.Listener(on_press=monitor._on_key_press)
+        self.keyboard_listener.start()
+
+    def stop(self):
+        super().stop()
+        if self.mouse_listener:
+            self.mouse_listener.stop()
+        if self.keyboard_listener:
+            self.keyboard_listener.stop()
+
+class _ThreadSource(ActivitySource, ABC):
+    """在后台线程中运行_run()的来源，子类实现_run()"""
+
+    def __init__(self):
+        super().__init__()
+        self.thread = None
+
+    def start(self, monitor):
+        super().start(monitor)
+        self.thread = threading.Thread(target=self._run_safely, name=f"activity-{self.name}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        super().stop()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+
+    def _run_safely(self):
+        try:
+            self._run()
+        except Exception as e:
+            logging.error(f"活动来源{self.name}异常退出: {e}")
+
+    @abstractmethod
+    def _run(self):
+        """读取输入事件并上报，self.running变为False时返回"""
+
+class EvdevSource(_ThreadSource):
+    """直接读取Linux输入设备(/dev/input/event*)
+
+    所有设备在一个线程中用select等待，每次读取一批原始事件后汇总上报一次。
+    X/Y方向的相对移动(REL_X/REL_Y)和绝对坐标(ABS_X/ABS_Y)以SYN_REPORT为界，
+    每组计为一次鼠标移动并累计位移距离；触摸板的多点触控槽位、压力、加速度计等
+    其他EV_ABS轴不计入，滚轮(REL_WHEEL/REL_HWHEEL)计为未分类的输入。一次读取中的移动本身就是合并后的批次，不再逐个回调。
+    EV_KEY中键盘按键计为按键(按键间隔取自事件自带的时间戳)，鼠标左/右/中等按钮计为点击，其他按钮计为未分类
+    的输入。相对设备没有屏幕坐标，累加位移得到一个虚拟位置供ActivityMonitor
+    判断鼠标是否移动。
+    """
+
+    name = "evdev"
+
+    DEVICE_PATTERN = "/dev/input/event*"
+    # struct input_event: struct timeval(两个long) + type(u16) + code(u16) + value(s32)
+    EVENT_FORMAT = "llHHi"
+    EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+    READ_EVENTS = 64
+    # 等待事件的超时及重新扫描设备的间隔(秒)
+    SELECT_TIMEOUT = 0.5
+    RESCAN_INTERVAL = 30
+
+    EV_SYN, EV_KEY, EV_REL, EV_ABS = 0, 1, 2, 3
+    # REL_X/REL_Y与ABS_X/ABS_Y的代码均为0和1
+    AXIS_X, AXIS_Y = 0, 1
+    REL_HWHEEL, REL_WHEEL = 0x06, 0x08
+    # 小于BTN_MISC的键码是键盘按键，其余是鼠标/手柄等设备的按钮，
+    # [BTN_MOUSE, BTN_JOYSTICK)是鼠标按钮
+    BTN_MISC = 0x100
+    BTN_MOUSE = 0x110
+    BTN_JOYSTICK = 0x120
+
+    def __init__(self):
+        super().__init__()
+        self._devices = {}  # 文件描述符 -> 设备路径
+        self._position = [0, 0]
+        self._last_key_time = None  # 上一次按键事件的时间戳(内核时钟)
+
+    def start(self, monitor):
+        if not sys.platform.startswith("linux"):
+            raise RuntimeError("evdev来源只支持Linux")
+        self._open_devices()
+        if not self._devices:
+            raise RuntimeError("没有可读取的输入设备，请检查/dev/input权限(通常需要加入input组)")
+        super().start(monitor)
+
+    def stop(self):
+        super().stop()
+        for fd in list(self._devices):
+            self._close_device(fd)
+
+    def _open_devices(self):
+        """打开尚未打开的输入设备，跳过没有权限的设备"""
+        opened = set(self._devices.values())
+        for path in sorted(glob.glob(self.DEVICE_PATTERN)):
+            if path in opened:
+                continue
+            try:
+                fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            except OSError as e:
+                logging.debug(f"无法打开输入设备{path}: {e}")
+                continue
+            self._devices[fd] = path
+            logging.info(f"evdev来源已打开输入设备: {path}")
+
+    def _close_device(self, fd):
+        path = self._devices.pop(fd, None)
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+        if path:
+            logging.info(f"evdev来源已关闭输入设备: {path}")
+
+    def _run(self):
+        next_scan = time.monotonic() + self.RESCAN_INTERVAL
+        while self.running:
+            if time.monotonic() >= next_scan:
+                self._open_devices()
+                next_scan = time.monotonic() + self.RESCAN_INTERVAL
+            if not self._devices:
+                time.sleep(self.SELECT_TIMEOUT)
+                continue
+
+            try:
+                ready, _, _ = select.select(list(self._devices), [], [], self.SELECT_TIMEOUT)
+            except (OSError, ValueError):
+                ready = []
+            moves = keys = other = clicks = 0
+            distance = 0.0
+            intervals = []
+            for fd in ready:
+                try:
+                    data = os.read(fd, self.EVENT_SIZE * self.READ_EVENTS)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    # 设备被拔出
+                    self._close_device(fd)
+                    continue
+                counts = self._count_events(data, intervals)
+                moves += counts[0]
+                keys += counts[1]
+                other += counts[2]
+                clicks += counts[3]
+                distance += counts[4]
+
+            if moves or keys or other or clicks:
+                self.monitor.add_events(mouse_moves=moves, key_presses=keys, other_events=other,
+                                        position=tuple(self._position),
+                                        mouse_distance=distance, mouse_clicks=clicks,
+                                        key_intervals=intervals)
+
+    def _count_events(self, data, key_intervals):
+        """统计一批原始事件，相邻按键的间隔追加到key_intervals
+
+        返回:
+            tuple: (鼠标移动次数, 按键次数, 其他输入次数, 鼠标点击次数, 移动距离)
+        """
+        moves = keys = other = clicks = 0
+        distance = 0.0
+        moved = False
+        group_start = tuple(self._position)
+        usable = len(data) - len(data) % self.EVENT_SIZE
+        for sec, usec, ev_type, code, value in struct.iter_unpack(self.EVENT_FORMAT, data[:usable]):
+            if ev_type == self.EV_SYN:
+                if moved:
+                    moves += 1
+                    distance += math.hypot(self._position[0] - group_start[0],
+                                           self._position[1] - group_start[1])
+                    moved = False
+                group_start = tuple(self._position)
+            elif ev_type == self.EV_REL:
+                if code in (self.AXIS_X, self.AXIS_Y):
+                    self._position[code] += value
+                    moved = True
+                elif code in (self.REL_WHEEL, self.REL_HWHEEL):
+                    other += 1
+            elif ev_type == self.EV_ABS:
+                if code in (self.AXIS_X, self.AXIS_Y):
+                    self._position[code] = value
+                    moved = True
+            elif ev_type == self.EV_KEY and value:  # 1=按下 2=自动重复，0=松开不计
+                if code < self.BTN_MISC:
+                    keys += 1
+                    event_time = sec + usec / 1e6
+                    if self._last_key_time is not None:
+                        key_intervals.append(event_time - self._last_key_time)
+                    self._last_key_time = event_time
+                elif self.BTN_MOUSE <= code < self.BTN_JOYSTICK:
+                    if value == 1:
+                        clicks += 1
+                else:
+                    other += 1
+        if moved:
+            moves += 1
+            distance += math.hypot(self._position[0] - group_start[0],
+                                   self._position[1] - group_start[1])
+        return moves, keys, other, clicks, distance
+
+class IdlePollerSource(_ThreadSource):
+    """每秒查询一次系统空闲时间
+
+    空闲时间比上次查询时缩短，说明期间有过输入，按最后一次输入的时间
+    上报一个未分类的输入事件。
+    """
+
+    name = "idle"
+
+    POLL_INTERVAL = 1.0
+
+    def __init__(self):
+        super().__init__()
+        self._query = None
+
+    def start(self, monitor):
+        self._query = self._create_idle_query()
+        super().start(monitor)
+
+    @staticmethod
+    def _create_idle_query():
+        """返回一个查询系统空闲秒数的函数，平台不支持时抛出RuntimeError"""
+        import ctypes
+
+        if sys.platform == "win32":
+            class LASTINPUTINFO(ctypes.Structure):
+                _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+            user32 = ctypes.windll.user32
+            kernel32 = ctypes.windll.kernel32
+            info = LASTINPUTINFO()
+            info.cbSize = ctypes.sizeof(info)
+
+            def query():
+                if not user32.GetLastInputInfo(ctypes.byref(info)):
+                    raise OSError("GetLastInputInfo调用失败")
+                # 两者都是32位毫秒计数，约49.7天回绕一次
+                return ((kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF) / 1000.0
+            return query
+
+        if sys.platform.startswith("linux"):
+            import ctypes.util
+
+            class XScreenSaverInfo(ctypes.Structure):
+                _fields_ = [("window", ctypes.c_ulong), ("state", ctypes.c_int),
+                            ("kind", ctypes.c_int), ("til_or_since", ctypes.c_ulong),
+                            ("idle", ctypes.c_ulong), ("eventMask", ctypes.c_ulong)]
+
+            xlib_name = ctypes.util.find_library("X11")
+            xss_name = ctypes.util.find_library("Xss")
+            if not xlib_name or not xss_name:
+                raise RuntimeError("idle来源需要libX11和libXss")
+            xlib = ctypes.cdll.LoadLibrary(xlib_name)
+            xss = ctypes.cdll.LoadLibrary(xss_name)
+            xlib.XOpenDisplay.restype = ctypes.c_void_p
+            xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+            xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+            xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(XScreenSaverInfo)
+            xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                                  ctypes.POINTER(XScreenSaverInfo)]
+
+            display = xlib.XOpenDisplay(None)
+            if not display:
+                raise RuntimeError("无法连接X显示服务器")
+            root = xlib.XDefaultRootWindow(display)
+            info = xss.XScreenSaverAllocInfo()
+
+            def query():
+                if not xss.XScreenSaverQueryInfo(display, root, info):
+                    raise OSError("XScreenSaverQueryInfo调用失败")
+                return info.contents.idle / 1000.0
+            return query
+
+        raise RuntimeError(f"idle来源不支持当前平台: {sys.platform}")
+
+    def _run(self):
+        last_input = time.monotonic() - self._query()
+        while self.running:
+            time.sleep(self.POLL_INTERVAL)
+            try:
+                idle = self._query()
+            except OSError as e:
+                logging.warning(f"查询系统空闲时间失败: {e}")
+                continue
+            input_time = time.monotonic() - idle
+            # 留出查询本身的误差，避免把同一次输入重复上报
+            if input_time > last_input + 0.05:
+                self.monitor.add_events(other_events=1, timestamp=input_time)
+                last_input = input_time
+
+class ScriptedSource(_ThreadSource):
+    """按预设序列回放输入事件，用于测试
+
+    参数:
+        events (iterable): (相对开始的秒数, 事件类型)元组，事件类型为
+            "mouse"、"click"、"key"或"input"，按时间顺序排列
+        speed (float): 回放速度倍数，0表示不等待、立即上报全部事件
+
+    也可以不调用start()回放，直接在测试线程中调用feed()注入事件，但两种方式
+    不能同时使用(每个计数器只能有一个写入线程)。
+    """
+
+    name = "scripted"
+
+    def __init__(self, events=(), speed=1.0):
+        super().__init__()
+        self.events = list(events)
+        self.speed = speed
+        self.finished = threading.Event()
+        self._mouse_x = 0
+
+    def _run(self):
+        start = time.monotonic()
+        for offset, kind in self.events:
+            if not self.running:
+                break
+            if self.speed:
+                delay = start + offset / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            self.feed(kind)
+        self.finished.set()
+
+    def feed(self, kind, count=1):
+        """立即上报count个指定类型的事件"""
+        if kind == "mouse":
+            for _ in range(count):
+                self._mouse_x += 1
+                self.monitor._on_mouse_move(self._mouse_x, 0)
+        elif kind == "click":
+            self.monitor.add_events(mouse_clicks=count)
+        elif kind == "key":
+            for _ in range(count):
+                self.monitor._on_key_press(None)
+        elif kind == "input":
+            self.monitor.add_events(other_events=count)
+        else:
+            raise ValueError(f"未知的事件类型: {kind}")
+
+# 可通过配置项ACTIVITY_SOURCE选择的来源
+SOURCES = {
+    PynputSource.name: PynputSource,
+    EvdevSource.name: EvdevSource,
+    IdlePollerSource.name: IdlePollerSource,
+}
+
+def create_source(name):
+    """按名称创建活动来源，未知名称时使用pynput
+
+    参数:
+        name (str): 来源名称，见SOURCES
+
+    返回:
+        ActivitySource: 活动来源实例
+    """
+    source_class = SOURCES.get(name)
+    if source_class is None:
+        logging.warning(f"未知的活动来源: {name}，改用pynput")
+        source_class = PynputSource
+    return source_class()
@@ -0,0 +1,263 @@
+"""
+提醒规则引擎 - 将配置中的提醒规则编译为按截止值排序的定时器
+
+本模块负责:
+1. 从config.ALERT_RULES(未配置时由CONTINUOUS_USAGE_ALERT等旧配置项生成)编译提醒规则
+2. 每个活跃节拍只比较各计数器的最近截止值，与配置的规则数量无关
+3. 生成监控窗口显示的预警文字，与实际提醒使用同一套规则
+
+规则按计数器分为两类: continuous(连续使用分钟数)和daily(今日使用分钟数)。
+每条规则由一组递增的阈值(at，可以是单个值或升级阶梯)和可选的重复间隔(repeat)组成，
+最后一级之后每隔repeat分钟重复一次。quiet_hours类型的规则不发送提醒，只在给定的
+时段内静音其他规则(计划照常推进，静音结束后不会补发)。
+
+配置示例(config.json):
+    "alert_rules": [
+        {"type": "continuous", "at": 45, "repeat": 45, "warn_before": 5},
+        {"type": "continuous", "at": [60, 75, 90], "repeat": 5,
+         "title": "持续工作提醒", "message": "您已连续工作{}分钟，请立即休息。"},
+        {"type": "daily", "at": 480, "repeat": 60, "message": "今日已使用电脑{}分钟。"},
+        {"type": "quiet_hours", "start": "12:00", "end": "13:00"}
+    ]
+
+同一节拍只发送一条提醒: 多条规则同时到期时按配置顺序发送排在前面的，其余的顺延到
+下一个活跃节拍，顺延后的下一次按实际发送时的分钟数加repeat计算。旧配置生成的两条
+规则因此与原来的取模判断和持续提醒逻辑完全一致，alert_replay按同样的规则批量回放；
+配置了ALERT_RULES时alert_replay无法还原这些规则，回放结果不代表实际的提醒。
+"""
+
+import heapq
+from bisect import bisect_right
+from collections import namedtuple
+
+import config
+import log_manager
+
+CONTINUOUS = "continuous"
+DAILY = "daily"
+QUIET_HOURS = "quiet_hours"
+COUNTERS = (CONTINUOUS, DAILY)
+
+MINUTES_PER_DAY = 24 * 60
+
+# 编译后的规则。ladder: 递增的阈值元组；repeat: 最后一级之后的重复间隔(0表示不重复)；
+# warn_before: 到达第一级阈值前多少分钟开始在界面上预警
+Rule = namedtuple("Rule", [
+    "name", "counter", "ladder", "repeat", "title", "message", "timeout", "warn_before",
+])
+
+# 一次到期的提醒: 规则、发送时计数器的值、是否处于静音时段
+Alert = namedtuple("Alert", ["rule", "value", "quiet"])
+
+# 界面预警文字: {计数器: (接近阈值, 已超过阈值)}
+_STATUS_TEXT = {
+    CONTINUOUS: ("还有{remaining}分钟达到连续使用{threshold}分钟提醒，请准备休息",
+                 "已连续使用{value}分钟，建议休息一下"),
+    DAILY: ("还有{remaining}分钟达到今日使用{threshold}分钟上限",
+            "今日已使用{value}分钟，超过{threshold}分钟上限"),
+}
+
+def default_rule_specs():
+    """由CONTINUOUS_USAGE_ALERT等旧配置项生成等价的规则配置
+
+    返回:
+        list: 规则配置字典的列表
+    """
+    alert = config.CONTINUOUS_USAGE_ALERT
+    specs = [{
+        "name": "usage_alert", "type": CONTINUOUS, "at": alert, "repeat": alert,
+        "title": config.NOTIFICATION_TITLE, "message": config.NOTIFICATION_MESSAGE,
+        "warn_before": 5,
+    }]
+    if config.ENABLE_CONTINUOUS_NOTIFICATION:
+        # 跟踪器每个活跃分钟只加一，间隔至少一分钟
+        interval = max(int(config.CONTINUOUS_NOTIFICATION_INTERVAL), 1)
+        specs.append({
+            "name": "continuous_notification", "type": CONTINUOUS,
+            "at": alert + interval, "repeat": interval,
+            "title": config.CONTINUOUS_NOTIFICATION_TITLE,
+            "message": config.CONTINUOUS_NOTIFICATION_MESSAGE, "timeout": 15,
+        })
+    return specs
+
+def _parse_clock(text):
+    """将"HH:MM"解析为当天的分钟数"""
+    hours, minutes = (int(part) for part in str(text).split(":"))
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"无效的时间: {text}")
+    return hours * 60 + minutes
+
+def compile_rules(specs):
+    """编译规则配置
+
+    无效的规则记录错误后跳过，不影响其他规则。
+
+    参数:
+        specs (list): 规则配置字典的列表
+
+    返回:
+        tuple: (Rule列表, 长度为1440的静音分钟表bytearray)
+    """
+    rules = []
+    quiet = bytearray(MINUTES_PER_DAY)
+    for number, spec in enumerate(specs or [], 1):
+        try:
+            kind = spec.get("type", CONTINUOUS)
+            if kind == QUIET_HOURS:
+                start, end = _parse_clock(spec["start"]), _parse_clock(spec["end"])
+                # 结束时间早于开始时间表示跨过午夜
+                length = (end - start) % MINUTES_PER_DAY or MINUTES_PER_DAY
+                for offset in range(length):
+                    quiet[(start + offset) % MINUTES_PER_DAY] = 1
+                continue
+            if kind not in COUNTERS:
+                raise ValueError(f"未知的规则类型: {kind}")
+            at = spec["at"]
+            ladder = tuple(sorted(int(value) for value in (at if isinstance(at, list) else [at])))
+            repeat = int(spec.get("repeat") or 0)
+            if not ladder or ladder[0] <= 0 or repeat < 0:
+                raise ValueError("阈值必须为正数，重复间隔不能为负数")
+            rules.append(Rule(
+                spec.get("name", f"rule{number}"), kind, ladder, repeat,
+                spec.get("title", config.NOTIFICATION_TITLE),
+                spec.get("message", config.NOTIFICATION_MESSAGE),
+                int(spec.get("timeout", 10)), int(spec.get("warn_before", 0)),
+            ))
+        except Exception as e:
+            log_manager.error(f"忽略无效的提醒规则(第{number}条): {spec} - {e}")
+    return rules, quiet
+
+class AlertEngine:
+    """按计数器维护下一截止值的提醒规则引擎
+
+    每个计数器一个按(截止值, 规则序号)排序的堆，节拍只需比较堆顶；
+    已到期但被顺延的规则放在按规则序号排序的待发送堆中。
+    本类不加锁，由TimeTracker在持有自身锁时调用。
+    """
+
+    def __init__(self, specs=None):
+        """编译规则
+
+        参数:
+            specs (list, optional): 规则配置，默认为config.ALERT_RULES，
+                未配置时由旧配置项生成
+        """
+        if specs is None:
+            specs = config.ALERT_RULES or default_rule_specs()
+        self.rules, self._quiet = compile_rules(specs)
+        # 每个计数器的初始堆，重置时复制即可
+        self._initial = {counter: [] for counter in COUNTERS}
+        for index, rule in enumerate(self.rules):
+            self._initial[rule.counter].append((rule.ladder[0], index))
+        for heap in self._initial.values():
+            heapq.heapify(heap)
+        # 每个计数器第一次提醒的阈值及其预警分钟数，用于界面文字
+        self._first = {}
+        for rule in self.rules:
+            current = self._first.get(rule.counter)
+            if current is None or rule.ladder[0] < current[0]:
+                self._first[rule.counter] = (rule.ladder[0], rule.warn_before)
+        self._heaps = {}
+        self._steps = [0] * len(self.rules)  # 每条规则已发送的阶梯级数
+        self._pending = []  # 已到期未发送的规则序号(堆)
+        for counter in COUNTERS:
+            self.reset(counter)
+        log_manager.info(f"已编译{len(self.rules)}条提醒规则, 静音{sum(self._quiet)}分钟/天")
+
+    def reset(self, counter):
+        """计数器清零时恢复其所有规则的初始计划
+
+        参数:
+            counter (str): CONTINUOUS或DAILY
+        """
+        self._heaps[counter] = list(self._initial[counter])
+        for index, rule in enumerate(self.rules):
+            if rule.counter == counter:
+                self._steps[index] = 0
+        if self._pending:
+            self._pending = [index for index in self._pending
+                             if self.rules[index].counter != counter]
+            heapq.heapify(self._pending)
+
+    def sync(self, continuous, daily):
+        """按恢复得到的计数器值重建计划，已经越过的阈值视为已提醒
+
+        参数:
+            continuous (int): 连续使用分钟数
+            daily (int): 今日使用分钟数
+        """
+        values = {CONTINUOUS: continuous, DAILY: daily}
+        self._heaps = {counter: [] for counter in COUNTERS}
+        self._pending = []
+        for index, rule in enumerate(self.rules):
+            value = values[rule.counter]
+            step = bisect_right(rule.ladder, value)
+            self._steps[index] = step
+            if step < len(rule.ladder):
+                deadline = rule.ladder[step]
+            elif rule.repeat:
+                last = rule.ladder[-1]
+                deadline = last + rule.repeat * ((value - last) // rule.repeat + 1)
+            else:
+                continue
+            self._heaps[rule.counter].append((deadline, index))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+
+    def evaluate(self, continuous, daily, minute_of_day):
+        """活跃节拍后检查到期的规则，最多返回一条提醒
+
+        参数:
+            continuous (int): 本节拍之后的连续使用分钟数
+            daily (int): 本节拍之后的今日使用分钟数
+            minute_of_day (int): 本节拍在当天的分钟数(0-1439)，用于静音时段
+
+        返回:
+            Alert: 要发送的提醒，没有到期规则时返回None
+        """
+        for counter, value in ((CONTINUOUS, continuous), (DAILY, daily)):
+            heap = self._heaps[counter]
+            while heap and heap[0][0] <= value:
+                heapq.heappush(self._pending, heapq.heappop(heap)[1])
+        if not self._pending:
+            return None
+
+        index = heapq.heappop(self._pending)
+        rule = self.rules[index]
+        value = continuous if rule.counter == CONTINUOUS else daily
+        step = self._steps[index] + 1
+        self._steps[index] = step
+        if step < len(rule.ladder):
+            deadline = max(rule.ladder[step], value + 1)
+        elif rule.repeat:
+            deadline = value + rule.repeat
+        else:
+            deadline = None
+        if deadline is not None:
+            heapq.heappush(self._heaps[rule.counter], (deadline, index))
+        return Alert(rule, value, bool(self._quiet[minute_of_day % MINUTES_PER_DAY]))
+
+    def exceeded(self, counter, value):
+        """计数器是否已达到其第一级提醒阈值"""
+        first = self._first.get(counter)
+        return first is not None and value >= first[0]
+
+    def status_text(self, continuous, daily):
+        """监控窗口显示的预警文字
+
+        连续使用优先于今日使用: 已超过第一级阈值时提示休息，距离第一级阈值不超过
+        规则的warn_before分钟时提前预警。
+
+        返回:
+            str: 预警文字，没有需要显示的内容时返回空字符串
+        """
+        for counter, value in ((CONTINUOUS, continuous), (DAILY, daily)):
+            if counter not in self._first:
+                continue
+            threshold, warn_before = self._first[counter]
+            approaching, exceeded = _STATUS_TEXT[counter]
+            if value >= threshold:
+                return exceeded.format(value=value, threshold=threshold)
+            if threshold - value <= warn_before:
+                return approaching.format(remaining=threshold - value, threshold=threshold)
+        return ""
@@ -0,0 +1,236 @@
+"""
+提醒策略回放模块 - 用NumPy批量重放TimeTracker的提醒规则
+
+本模块负责:
+1. 将每分钟是否活跃的数组一次性换算为连续使用时间、重置点和会话
+2. 按给定的(连续使用提醒, 不活跃重置, 持续提醒间隔)策略算出每次提醒的时间
+3. 从数据库的每日活动位图载入一段时间的活动，比较不同策略的提醒次数
+
+规则与TimeTracker的跟踪循环逐分钟的分支完全一致:
+- 活跃分钟: 连续使用时间C加一，不活跃计数清零；C是提醒阈值的整数倍时发送休息提醒，
+  C第一次等于阈值时(允许持续提醒的话)开始持续提醒；否则如果处于持续提醒状态且C比
+  上次持续提醒时多出间隔分钟，发送持续提醒
+- 不活跃分钟: 不活跃计数加一，达到重置阈值时C清零并停止持续提醒
+
+连续不活跃达到阈值的那一分钟就是重置点，可以由不活跃段的起点和长度直接算出；
+重置点把时间轴分成若干段，段内的C就是累计活跃分钟数之差。休息提醒只取决于C，
+持续提醒的C值序列对每一段都相同(从阈值起每隔间隔分钟一次，遇到休息提醒的那一分钟
+顺延一分钟)，预先算成按C索引的表即可，整个计算没有逐分钟的Python循环。
+
+与跟踪器一样，数组开头视为C = 0、没有持续提醒的初始状态；没有记录的分钟按不活跃计。
+
+局限: 只能回放由CONTINUOUS_USAGE_ALERT等旧配置项生成的两条规则(见
+alert_engine.default_rule_specs)。配置了ALERT_RULES(升级阶梯、今日使用规则、静音时段)
+时跟踪器按那些规则提醒，回放结果与其不一致；此时命令行需要用--policy明确指定要比较的
+旧格式策略，并会给出警告。
+
+用法:
+    python alert_replay.py --start 2026-07-01 --end 2026-09-30 --policy 45/10/3 --policy 60/10/3
+"""
+
+import argparse
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import config
+import activity_bitmap
+
+# 回放结果，除session_minutes外均为相对数组起点的分钟下标(numpy整数数组)
+# usage_alerts: 休息提醒；notifications: 持续提醒；resets: 连续使用时间被重置的分钟；
+# session_starts / session_ends / session_minutes: 每段连续使用(两次重置之间)的
+# 第一个和最后一个活跃分钟以及活跃分钟数
+ReplayResult = namedtuple("ReplayResult", [
+    "usage_alerts", "notifications", "resets",
+    "session_starts", "session_ends", "session_minutes",
+])
+
+def notification_table(max_minutes, alert, interval):
+    """按连续使用分钟数索引的持续提醒表
+
+    参数:
+        max_minutes (int): 表覆盖的最大连续使用分钟数
+        alert (int): 连续使用提醒阈值(分钟)
+        interval (int): 持续提醒间隔(分钟)
+
+    返回:
+        numpy.ndarray: 长度为max_minutes + 1的布尔数组，连续使用到第c分钟时发送持续提醒则为True
+    """
+    table = np.zeros(max_minutes + 1, dtype=bool)
+    if alert == 1:
+        return table  # 每个活跃分钟都走休息提醒的分支
+    # 跟踪器每个活跃分钟C只加一，C - 上次提醒 >= interval至少要隔一分钟
+    step = max(int(interval), 1)
+    minutes = alert + step
+    while minutes <= max_minutes:
+        if minutes % alert == 0:
+            minutes += 1  # 这一分钟走休息提醒的分支，持续提醒顺延到下一个活跃分钟
+            if minutes > max_minutes:
+                break
+        table[minutes] = True
+        minutes += step
+    return table
+
+def replay(active, alert=None, reset=None, interval=None, enable_continuous=None):
+    """重放一段连续时间内的提醒规则
+
+    参数:
+        active (array-like): 每分钟是否活跃的布尔数组，可以跨越多天
+        alert (int, optional): 连续使用提醒阈值(分钟)，默认config.CONTINUOUS_USAGE_ALERT
+        reset (int, optional): 不活跃重置阈值(分钟)，默认config.INACTIVITY_RESET
+        interval (int, optional): 持续提醒间隔(分钟)，默认config.CONTINUOUS_NOTIFICATION_INTERVAL
+        enable_continuous (bool, optional): 是否启用持续提醒，默认config.ENABLE_CONTINUOUS_NOTIFICATION
+
+    返回:
+        ReplayResult: 各类事件的分钟下标和会话长度
+    """
+    alert = int(config.CONTINUOUS_USAGE_ALERT if alert is None else alert)
+    reset = max(int(config.INACTIVITY_RESET if reset is None else reset), 1)
+    interval = config.CONTINUOUS_NOTIFICATION_INTERVAL if interval is None else interval
+    if enable_continuous is None:
+        enable_continuous = config.ENABLE_CONTINUOUS_NOTIFICATION
+    if alert <= 0:
+        raise ValueError(f"连续使用提醒阈值必须为正数: {alert}")
+
+    active = np.asarray(active, dtype=bool)
+    empty = np.zeros(0, dtype=np.int64)
+    active_index = np.flatnonzero(active)
+    if active_index.size == 0:
+        return ReplayResult(empty, empty, empty, empty, empty, empty)
+
+    # 不活跃段的起点和长度(两端补上活跃分钟，保证每段都有起止)
+    edges = np.diff(np.concatenate(([1], active.view(np.int8), [1])))
+    idle_starts = np.flatnonzero(edges == -1)
+    idle_lengths = np.flatnonzero(edges == 1) - idle_starts
+    # 只有前面有活跃分钟的不活跃段才会真正重置(开头的不活跃段C本来就是0)，
+    # 同一段里之后每reset分钟的重复重置不改变C
+    resetting = (idle_lengths >= reset) & (idle_starts > 0)
+    resets = idle_starts[resetting] + reset - 1
+
+    # 活跃分钟所在的段号 = 它之前的重置次数；C = 累计活跃分钟数 - 所在段起点的累计值
+    cumulative = np.cumsum(active, dtype=np.int64)
+    segment = np.searchsorted(resets, active_index)
+    base = np.concatenate(([0], cumulative[resets]))
+    continuous = cumulative[active_index] - base[segment]
+
+    usage_alerts = active_index[continuous % alert == 0]
+    if enable_continuous:
+        table = notification_table(int(continuous.max()), alert, interval)
+        notifications = active_index[table[continuous]]
+    else:
+        notifications = empty
+
+    _, first, counts = np.unique(segment, return_index=True, return_counts=True)
+    return ReplayResult(
+        usage_alerts.astype(np.int64), notifications.astype(np.int64), resets.astype(np.int64),
+        active_index[first].astype(np.int64), active_index[first + counts - 1].astype(np.int64),
+        counts.astype(np.int64),
+    )
+
+def load_activity(db_manager, start, end):
+    """从每日活动位图载入一段日期内每分钟是否活跃
+
+    位图随分钟记录增量维护，并且在原始分钟记录过期删除后仍然保留，一年只需读取约65KB。
+
+    参数:
+        db_manager (DatabaseManager): 数据库管理器
+        start (str/datetime): 起始日期 (YYYY-MM-DD)，包含当天
+        end (str/datetime): 结束日期 (YYYY-MM-DD)，包含当天
+
+    返回:
+        tuple: (起点datetime, 布尔数组)，数组长度为天数 * 1440，没有汇总记录的日期全部不活跃
+    """
+    first = _to_day(start)
+    days = (_to_day(end) - first).days + 1
+    if days <= 0:
+        return first, np.zeros(0, dtype=bool)
+    bitmaps = db_manager.get_activity_bitmaps(first, _to_day(end))
+    empty = activity_bitmap.empty()
+    data = b"".join(bitmaps.get((first + timedelta(days=i)).strftime("%Y-%m-%d"), empty)
+                    for i in range(days))
+    # 位图低位在前；unpackbits的bitorder参数需要NumPy 1.17，这里逐字节翻转高位在前的结果
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8)).reshape(-1, 8)[:, ::-1].ravel()
+    return first, bits.astype(bool)
+
+def _to_day(value):
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d")
+    return datetime(value.year, value.month, value.day)
+
+def to_times(start, minutes):
+    """将分钟下标转换为datetime列表
+
+    参数:
+        start (datetime): 数组起点
+        minutes (array-like): 分钟下标
+
+    返回:
+        list: 对应的datetime
+    """
+    return [start + timedelta(minutes=int(minute)) for minute in minutes]
+
+def summarize(result, days):
+    """汇总一次回放的结果
+
+    参数:
+        result (ReplayResult): 回放结果
+        days (int): 回放覆盖的天数
+
+    返回:
+        dict: usage_alerts / notifications / resets / sessions(次数)、
+            alerts_per_day(每天平均休息提醒次数)、mean_session / longest_session(分钟)
+    """
+    sessions = result.session_minutes
+    return {
+        "usage_alerts": int(result.usage_alerts.size),
+        "notifications": int(result.notifications.size),
+        "resets": int(result.resets.size),
+        "sessions": int(sessions.size),
+        "alerts_per_day": result.usage_alerts.size / days if days else 0.0,
+        "mean_session": float(sessions.mean()) if sessions.size else 0.0,
+        "longest_session": int(sessions.max()) if sessions.size else 0,
+    }
+
+def parse_policy(text):
+    """解析"提醒阈值/重置阈值/持续提醒间隔"格式的策略，如"45/10/3" """
+    alert, reset, interval = (int(part) for part in text.split("/"))
+    return alert, reset, interval
+
+if __name__ == "__main__":
+    from db_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="比较不同提醒策略在历史数据上的提醒次数")
+    parser.add_argument('--start', required=True, help='起始日期 (YYYY-MM-DD)')
+    parser.add_argument('--end', default=datetime.now().strftime("%Y-%m-%d"), help='结束日期 (YYYY-MM-DD)')
+    parser.add_argument('--db', default=config.DATABASE_PATH, help='数据库文件，默认为程序使用的数据库')
+    parser.add_argument('--policy', action='append', type=parse_policy,
+                        help='提醒阈值/重置阈值/持续提醒间隔(分钟)，如45/10/3，可重复指定')
+    args = parser.parse_args()
+    if config.ALERT_RULES:
+        if not args.policy:
+            parser.error("已配置alert_rules，回放只支持旧格式的提醒策略，"
+                         "无法还原当前的提醒规则；请用--policy指定要比较的策略")
+        print("警告: 已配置alert_rules，以下结果按--policy的旧格式策略计算，"
+              "与跟踪器当前的提醒规则不一致")
+    policies = args.policy or [(config.CONTINUOUS_USAGE_ALERT, config.INACTIVITY_RESET,
+                                config.CONTINUOUS_NOTIFICATION_INTERVAL)]
+
+    db_manager = DatabaseManager(args.db)
+    try:
+        start, active = load_activity(db_manager, args.start, args.end)
+    finally:
+        db_manager.close()
+    days = active.size // activity_bitmap.MINUTES_PER_DAY
+    print(f"{args.start} - {args.end}: {days}天, 活跃{int(active.sum())}分钟")
+
+    for alert, reset, interval in policies:
+        began = time.perf_counter()
+        stats = summarize(replay(active, alert, reset, interval), days)
+        elapsed = (time.perf_counter() - began) * 1000
+        print(f"策略{alert}/{reset}/{interval}: 休息提醒{stats['usage_alerts']}次"
+              f"(每天{stats['alerts_per_day']:.1f}次), 持续提醒{stats['notifications']}次, "
+              f"重置{stats['resets']}次, 连续使用{stats['sessions']}段"
+              f"(平均{stats['mean_session']:.0f}分钟, 最长{stats['longest_session']}分钟), "
+              f"耗时{elapsed:.1f}毫秒")
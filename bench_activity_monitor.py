@@ -0,0 +1,102 @@
+"""
+活动监控回调性能测试 - 比较加锁回调与无锁回调的单次耗时
+
+以固定速率(默认每秒1000次)调用鼠标/键盘回调，同时用一个线程模拟界面
+每秒轮询get_idle_time、用另一个线程模拟每分钟的check_activity_minute
+(为缩短测试时间按更高频率调用)，统计每次回调的耗时。
+
+用法:
+    python bench_activity_monitor.py [--rate 1000] [--seconds 5]
+
+用较高的速率(如--rate 8000)可以模拟游戏鼠标或按键连发，观察超出每秒预算后
+被丢弃的事件数和回调耗时。
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from activity_monitor import ActivityMonitor
+
+class LegacyActivityMonitor(ActivityMonitor):
+    """旧版回调实现: 每个事件都获取锁并调用time.time()"""
+
+    def __init__(self):
+        super().__init__()
+        self.mouse_position = None
+        self.mouse_move_count = 0
+        self.key_press_count = 0
+        self.last_activity_time = time.time()
+
+    def _on_mouse_move(self, x, y):
+        with self.lock:
+            self.mouse_position = (x, y)
+            self.mouse_move_count += 1
+            self.last_activity_time = time.time()
+
+    def _on_key_press(self, key):
+        with self.lock:
+            self.key_press_count += 1
+            self.last_activity_time = time.time()
+
+    def get_idle_time(self):
+        with self.lock:
+            return time.time() - self.last_activity_time
+
+def run(monitor, rate, seconds):
+    """按给定速率调用回调，返回每次回调耗时(纳秒)的列表"""
+    stop = threading.Event()
+
+    def poll_idle():
+        while not stop.wait(0.01):
+            monitor.get_idle_time()
+
+    def poll_minute():
+        while not stop.wait(0.05):
+            monitor.check_activity_minute()
+
+    pollers = [threading.Thread(target=poll_idle), threading.Thread(target=poll_minute)]
+    for thread in pollers:
+        thread.start()
+
+    timings = []
+    interval = 1.0 / rate
+    next_time = time.perf_counter()
+    clock = time.perf_counter_ns
+    for i in range(int(rate * seconds)):
+        begin = clock()
+        if i % 10:
+            monitor._on_mouse_move(i, i)
+        else:
+            monitor._on_key_press(None)
+        timings.append(clock() - begin)
+
+        next_time += interval
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    stop.set()
+    for thread in pollers:
+        thread.join()
+    return timings
+
+def report(name, timings):
+    """打印耗时统计"""
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"{name:<8} 次数={len(timings):>6}  平均={statistics.mean(timings):>7.0f}ns  "
+          f"中位数={statistics.median(timings):>6.0f}ns  P99={p99:>6}ns  最大={timings[-1]}ns")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="活动监控回调性能测试")
+    parser.add_argument('--rate', type=int, default=1000, help='每秒事件数')
+    parser.add_argument('--seconds', type=float, default=5, help='每种实现的测试时长(秒)')
+    args = parser.parse_args()
+
+    print(f"事件速率: {args.rate}/秒, 每种实现测试{args.seconds}秒")
+    report("加锁", run(LegacyActivityMonitor(), args.rate, args.seconds))
+    monitor = ActivityMonitor()
+    report("无锁", run(monitor, args.rate, args.seconds))
+    print(f"无锁实现的事件处理统计: {monitor.get_input_stats()}")
@@ -1,5 +1,6 @@
 import sqlite3
 import datetime
+from db_manager import DatabaseManager, from_minute_key
 
 # 连接数据库
 conn = sqlite3.connect('data/usage_data.db')
@@ -23,9 +24,9 @@ except Exception as e:
 
 # 获取最近的活动记录
 print("\n最近的活动记录:")
-cursor.execute("SELECT timestamp, is_active, mouse_moves, key_presses FROM minute_activity ORDER BY timestamp DESC LIMIT 10")
+cursor.execute("SELECT minute, is_active, mouse_moves, key_presses FROM minute_activity ORDER BY minute DESC LIMIT 10")
 for row in cursor.fetchall():
-    timestamp = row[0]
+    timestamp = from_minute_key(row[0]).strftime("%Y-%m-%d %H:%M")
     is_active = "活跃" if row[1] else "非活跃"
     mouse = row[2]
     keys = row[3]
@@ -52,5 +53,17 @@ try:
 except Exception as e:
     print(f"查询每日汇总时出错: {e}")
 
+# 检查热点查询是否命中索引
+print("\n热点查询执行计划:")
+cursor.execute("PRAGMA user_version")
+print(f"数据库结构版本: {cursor.fetchone()[0]}")
+try:
+    # 与程序启动时的检查使用同一份热点查询列表
+    for name, (uses_index, details) in DatabaseManager.explain_hot_queries(cursor).items():
+        status = "命中索引" if uses_index else "未命中索引"
+        print(f"- {name} ({status}): {'; '.join(details)}")
+except Exception as e:
+    print(f"获取执行计划时出错: {e}")
+
 # 关闭连接
 conn.close() 
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""
+时钟模块 - 为时间跟踪相关组件提供可替换的时钟
+
+TickScheduler、TimeTracker和ActivityMonitor的读取方通过时钟对象获取系统时间、
+单调时间和当前日期，并通过它等待。默认使用SystemClock；VirtualClock的时间只在
+调用advance/sleep/wait时前进，模拟运行(见simulation)用它在几秒内回放几天到
+几个月的活动。
+"""
+
+import time
+from datetime import datetime
+
+class SystemClock:
+    """系统时钟"""
+
+    def time(self):
+        """系统时间(自纪元起的秒数)"""
+        return time.time()
+
+    def monotonic(self):
+        """单调时钟(秒)"""
+        return time.monotonic()
+
+    def now(self):
+        """当前本地时间"""
+        return datetime.now()
+
+    def sleep(self, seconds):
+        """等待指定秒数"""
+        time.sleep(seconds)
+
+    def wait(self, event, timeout):
+        """等待event被设置，最多timeout秒
+
+        参数:
+            event (threading.Event): 要等待的事件，为None时只等待timeout秒
+            timeout (float): 最长等待时间(秒)
+
+        返回:
+            bool: event是否已被设置
+        """
+        if event is None:
+            time.sleep(timeout)
+            return False
+        return event.wait(timeout)
+
+class VirtualClock:
+    """虚拟时钟: 等待不会阻塞，而是直接把时间拨到等待结束的时刻
+
+    不是线程安全的，只应由驱动模拟的单个线程使用。
+    """
+
+    def __init__(self, start=None):
+        """初始化虚拟时钟
+
+        参数:
+            start (datetime, optional): 起始的本地时间，默认为现在
+        """
+        self._wall = (start or datetime.now()).timestamp()
+        self._monotonic = 0.0
+
+    def time(self):
+        return self._wall
+
+    def monotonic(self):
+        return self._monotonic
+
+    def now(self):
+        return datetime.fromtimestamp(self._wall)
+
+    def advance(self, seconds):
+        """系统时间和单调时钟一起前进seconds秒"""
+        self._wall += seconds
+        self._monotonic += seconds
+
+    def jump(self, seconds):
+        """只拨动系统时间(可为负)，模拟Linux睡眠唤醒或手动调整系统时间"""
+        self._wall += seconds
+
+    def sleep(self, seconds):
+        self.advance(max(0.0, seconds))
+
+    def wait(self, event, timeout):
+        if event is not None and event.is_set():
+            return True
+        self.advance(max(0.0, timeout))
+        return event is not None and event.is_set()
+
+# 默认使用的系统时钟
+SYSTEM_CLOCK = SystemClock()
@@ -8,12 +8,15 @@ from config_manager import config_manager, DEFAULT_CONFIG
 
 # 时间监控设置（分钟）
 ACTIVITY_CHECK_INTERVAL = config_manager.get("ACTIVITY_CHECK_INTERVAL", 1)  
+TRACKING_RESOLUTION = config_manager.get("TRACKING_RESOLUTION", 60)  # 采样分辨率（秒），小于60时按此间隔采样
 CONTINUOUS_USAGE_ALERT = config_manager.get("CONTINUOUS_USAGE_ALERT", 60)  
 INACTIVITY_RESET = config_manager.get("INACTIVITY_RESET", 10)  
 
 # 连续通知设置
 CONTINUOUS_NOTIFICATION_INTERVAL = config_manager.get("CONTINUOUS_NOTIFICATION_INTERVAL", 3)
 ENABLE_CONTINUOUS_NOTIFICATION = config_manager.get("ENABLE_CONTINUOUS_NOTIFICATION", True)
+# 提醒规则(每日上限、升级阶梯、静音时段等，格式见alert_engine)，为空时由上面两组配置生成
+ALERT_RULES = config_manager.get("ALERT_RULES", None)
 
 # 用户界面设置
 APP_NAME = config_manager.get("APP_NAME", "电脑使用时间监控工具")
@@ -22,8 +25,20 @@ NOTIFICATION_MESSAGE = config_manager.get("NOTIFICATION_MESSAGE", "您已连续
 CONTINUOUS_NOTIFICATION_TITLE = config_manager.get("CONTINUOUS_NOTIFICATION_TITLE", "持续工作提醒")
 CONTINUOUS_NOTIFICATION_MESSAGE = config_manager.get("CONTINUOUS_NOTIFICATION_MESSAGE", "您已连续工作{}分钟，建议适当休息。休息{}分钟后将停止提醒。")
 
+# 输入活动来源: pynput(默认)、evdev(直接读取Linux输入设备)、idle(每秒查询系统空闲时间)
+ACTIVITY_SOURCE = config_manager.get("ACTIVITY_SOURCE", "pynput")
+
 # 数据和报告设置
 DATABASE_PATH = config_manager.get("DATABASE_PATH", "usage_data.db")
+DB_FLUSH_INTERVAL = config_manager.get("DB_FLUSH_INTERVAL", 300)  # 写缓冲最长滞留时间（秒）
+DB_FLUSH_BATCH_SIZE = config_manager.get("DB_FLUSH_BATCH_SIZE", 30)  # 写缓冲批量提交条数
+DB_BUSY_TIMEOUT = config_manager.get("DB_BUSY_TIMEOUT", 5)  # 等待数据库锁的最长时间（秒）
+DB_READER_POOL_SIZE = config_manager.get("DB_READER_POOL_SIZE", 2)  # 只读连接池大小
+CHECKPOINT_FILE = config_manager.get("CHECKPOINT_FILE", "tracker_state.bin")  # 实时状态检查点文件(位于数据目录)
+
+# 数据保留设置（0表示永久保留，每日汇总始终永久保留）
+RAW_RETENTION_DAYS = config_manager.get("RAW_RETENTION_DAYS", 0)  # 原始分钟记录保留天数
+HOURLY_RETENTION_MONTHS = config_manager.get("HOURLY_RETENTION_MONTHS", 0)  # 小时汇总保留月数
 REPORTS_DIR = config_manager.get("REPORTS_DIR", "reports")
 REPORT_DAYS = config_manager.get("REPORT_DAYS", 30)
 
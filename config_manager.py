@@ -13,16 +13,26 @@ import log_manager
 # 默认配置
 DEFAULT_CONFIG = {
     "ACTIVITY_CHECK_INTERVAL": 1,
+    "TRACKING_RESOLUTION": 60,  # 活动采样分辨率（秒，需能整除60），小于60时每分钟内多次采样
     "CONTINUOUS_USAGE_ALERT": 60,
     "INACTIVITY_RESET": 10,
     "CONTINUOUS_NOTIFICATION_INTERVAL": 3,  # 连续通知间隔（分钟）
     "ENABLE_CONTINUOUS_NOTIFICATION": True,  # 是否启用连续通知
+    "ALERT_RULES": None,  # 提醒规则列表(见alert_engine)，为空时由上面的提醒配置生成
     "APP_NAME": "电脑使用时间监控工具",
     "NOTIFICATION_TITLE": "休息提醒",
     "NOTIFICATION_MESSAGE": "您已连续使用电脑{}分钟，建议休息一下眼睛和身体！",
     "CONTINUOUS_NOTIFICATION_TITLE": "持续工作提醒",  # 连续通知的标题
     "CONTINUOUS_NOTIFICATION_MESSAGE": "您已连续工作{}分钟，建议适当休息。休息{}分钟后将停止提醒。",  # 连续通知的内容
     "DATABASE_PATH": "usage_data.db",
+    "ACTIVITY_SOURCE": "pynput",  # 输入活动来源: pynput、evdev(Linux输入设备)或idle(系统空闲时间)
+    "DB_FLUSH_INTERVAL": 300,  # 数据库写缓冲最长滞留时间（秒）
+    "DB_FLUSH_BATCH_SIZE": 30,  # 数据库写缓冲累积多少条后立即提交
+    "DB_BUSY_TIMEOUT": 5,  # 等待数据库锁的最长时间（秒）
+    "DB_READER_POOL_SIZE": 2,  # 数据库只读连接池大小
+    "CHECKPOINT_FILE": "tracker_state.bin",  # 实时状态检查点文件，与数据库位于同一数据目录
+    "RAW_RETENTION_DAYS": 0,  # 原始分钟记录保留天数（0表示永久保留，默认不删除）
+    "HOURLY_RETENTION_MONTHS": 0,  # 小时汇总保留月数（0表示永久保留），每日汇总永久保留
     "REPORTS_DIR": "reports",
     "REPORT_DAYS": 30,
     "AUTO_REPORT_ENABLED": True,
@@ -86,6 +96,45 @@ class ConfigManager:
             self.config = DEFAULT_CONFIG.copy()
             log_manager.error(f"加载配置文件失败，使用默认配置: {e}")
             
+        self._validate_retention()
+        
+    def _validate_retention(self):
+        """校验数据保留设置
+        
+        小时汇总在原始分钟记录删除后是唯一的细粒度数据，保留时间不能短于原始记录，
+        否则修正为能覆盖原始记录的月数(原始记录永久保留时小时汇总也永久保留)。
+        启用数据压缩时记录日志，便于确认过期数据会被永久删除。
+        """
+        try:
+            raw_days = max(int(self.config.get("RAW_RETENTION_DAYS") or 0), 0)
+            hourly_months = max(int(self.config.get("HOURLY_RETENTION_MONTHS") or 0), 0)
+        except (TypeError, ValueError) as e:
+            log_manager.error(f"数据保留设置无效，不删除任何数据: {e}")
+            raw_days = hourly_months = 0
+            
+        # 按每月最少28天计算，保证小时汇总覆盖全部原始记录
+        if hourly_months and (not raw_days or hourly_months * 28 < raw_days):
+            adjusted = -(-raw_days // 28) if raw_days else 0
+            log_manager.warning(
+                f"小时汇总保留期({hourly_months}个月)短于原始记录保留期"
+                f"({self._retention_text(raw_days, '天')})，"
+                f"已调整为{self._retention_text(adjusted, '个月')}"
+            )
+            hourly_months = adjusted
+            
+        self.config["RAW_RETENTION_DAYS"] = raw_days
+        self.config["HOURLY_RETENTION_MONTHS"] = hourly_months
+        if raw_days or hourly_months:
+            log_manager.info(
+                f"已启用数据压缩: 原始分钟记录保留{self._retention_text(raw_days, '天')}, "
+                f"小时汇总保留{self._retention_text(hourly_months, '个月')}, 过期数据将被永久删除"
+            )
+            
+    @staticmethod
+    def _retention_text(value, unit):
+        """保留期的显示文字，0表示永久保留"""
+        return f"{value}{unit}" if value else "永久"
+            
     def save_config(self):
         """保存配置到文件"""
         try:
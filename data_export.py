@@ -0,0 +1,135 @@
+"""
+数据导出模块 - 将使用历史批量导出为CSV / JSONL / Parquet文件
+
+本模块负责:
+1. 从DatabaseManager流式读取分钟记录或每日汇总
+2. 按块写入目标文件，导出多年的历史数据时内存占用也保持不变
+3. 根据文件扩展名或参数选择导出格式
+
+Parquet格式需要安装pyarrow，未安装时只能导出CSV和JSONL。
+"""
+
+import os
+import csv
+import json
+import log_manager
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 支持的导出格式及对应的文件扩展名
+EXPORT_FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "parquet": ".parquet"}
+
+# 可导出的表: 名称 -> (DatabaseManager上的迭代方法名, 列名属性名, 各列的Parquet类型)
+EXPORT_TABLES = {
+    "minutes": ("iter_minutes", "MINUTE_EXPORT_COLUMNS",
+                ("string", "int64", "int64", "int64", "int64", "int64", "int64",
+                 "int64", "double", "double", "double", "int64", "int64")),
+    "daily": ("iter_daily_summaries", "DAILY_EXPORT_COLUMNS",
+              ("string", "int64", "int64", "int64", "string")),
+}
+
+def guess_format(path):
+    """根据文件扩展名推断导出格式，无法识别时返回csv"""
+    ext = os.path.splitext(path)[1].lower()
+    for fmt, fmt_ext in EXPORT_FORMATS.items():
+        if ext == fmt_ext:
+            return fmt
+    return "csv"
+
+def export_history(db_manager, path, table="minutes", fmt=None, start=None, end=None,
+                   chunk_size=5000):
+    """导出使用历史到文件
+
+    参数:
+        db_manager: 数据库管理器实例
+        path (str): 输出文件路径
+        table (str): 要导出的数据，"minutes"(分钟记录)或"daily"(每日汇总)
+        fmt (str): 导出格式，"csv"、"jsonl"或"parquet"，None时按扩展名推断
+        start (str): 起始日期 (YYYY-MM-DD)，包含当天，None表示不限
+        end (str): 结束日期 (YYYY-MM-DD)，包含当天，None表示不限
+        chunk_size (int): 每块读取和写入的行数
+
+    返回:
+        int: 导出的行数
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"不支持的导出数据: {table}")
+    fmt = fmt or guess_format(path)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    if fmt == "parquet" and not PYARROW_AVAILABLE:
+        raise RuntimeError("导出Parquet格式需要安装pyarrow")
+
+    # 先让写缓冲中的记录落盘，导出结果包含最新数据
+    db_manager.flush(timeout=10)
+
+    iter_name, columns_name, types = EXPORT_TABLES[table]
+    rows = getattr(db_manager, iter_name)(start, end, chunk_size)
+    columns = getattr(db_manager, columns_name)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    log_manager.info(f"开始导出{table}数据到 {path} (格式: {fmt})")
+    try:
+        if fmt == "parquet":
+            count = _write_parquet(path, columns, types, rows, chunk_size)
+        elif fmt == "jsonl":
+            count = _write_jsonl(path, columns, rows)
+        else:
+            count = _write_csv(path, columns, rows)
+    finally:
+        # 提前退出时也要归还只读连接
+        rows.close()
+    log_manager.info(f"导出完成，共{count}行")
+    return count
+
+def _write_csv(path, columns, rows):
+    """逐行写入CSV文件(带表头)"""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+def _write_jsonl(path, columns, rows):
+    """逐行写入JSON Lines文件，每行一个对象"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+def _write_parquet(path, columns, types, rows, chunk_size):
+    """按块写入Parquet文件，每块成为一个行组"""
+    schema = pa.schema([(name, pa.type_for_alias(type_name))
+                        for name, type_name in zip(columns, types)])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                _write_parquet_batch(writer, schema, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            _write_parquet_batch(writer, schema, batch)
+            count += len(batch)
+    return count
+
+def _write_parquet_batch(writer, schema, batch):
+    """将一块行数据转换为列式表并写入"""
+    columns = list(zip(*batch))
+    arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
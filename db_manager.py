@@ -7,20 +7,287 @@
 3. 提供数据检索和统计功能
 4. 汇总每日使用情况
 
+写入策略:
+活动记录和汇总更新先放入写缓冲队列，由单独的写线程按时间间隔或批量大小
+合并到一个事务中提交，close()时保证全部落盘。
+
+连接策略:
+数据库以WAL模式打开。写线程独占唯一的写连接；查询从一个有上限的只读
+连接池中借用连接，报表生成等读操作不会与写入互相阻塞。数据库被锁定时
+写线程按指数退避重试，不会丢弃数据。
+
 表结构:
-- minute_activity: 存储每分钟的详细活动数据
-- daily_summary: 存储每日汇总使用统计
+- minute_activity: 存储每分钟的详细活动数据(活跃标志、活跃秒数、鼠标采样次数、移动距离、
+  点击次数、按键次数)，以整数分钟键(本地时间自1970-01-01 00:00起的分钟数)为主键的
+  WITHOUT ROWID紧凑表，按日期/时间查询都是整数范围扫描
+- minute_activity的slot_mask和resolution列记录分钟内各采样点是否活跃及采样分辨率(秒)，
+  分辨率小于一分钟时也只写一行，解码方法见minute_slots
+- minute_activity和hourly_summary还保存按键间隔的流式统计(个数、均值、方差、最长间隔、
+  直方图，列定义见typing_stats)，小时汇总中的均值和方差由各分钟的统计合并得到
+- hourly_summary: 每小时汇总(与分钟记录相同的各项指标之和)，随分钟记录增量维护，
+  按小时的图表每天最多读取24行
+- daily_summary: 存储每日汇总使用统计，activity_bitmap列以1440位(180字节)记录当天
+  每分钟是否活跃，会话、每小时分布和休息间隔都可以直接在位图上计算(见activity_bitmap)
+- activity_gaps: 系统睡眠、程序停顿、系统时间跳变造成的采样间断，每次间断一行
+
+数据保留:
+原始分钟记录(及采样间断)保留raw_retention_days天，小时汇总保留hourly_retention_months个月，
+每日汇总永久保留。写线程空闲时分小步执行压缩任务(补齐汇总、按范围删除过期记录、
+增量回收空闲页)，每一步都是一个很小的事务，不会阻塞分钟记录的写入。
+
+结构版本:
+数据库结构版本记录在PRAGMA user_version中。启动时按SCHEMA_MIGRATIONS的顺序
+执行所有高于当前版本的迁移，每个迁移在独立事务中完成，旧数据库文件会被原地升级。
 """
 
 import sqlite3
 import os
+import pathlib
 import logging
 import threading
+import queue
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import sys
+import numpy as np
+import activity_bitmap
+import minute_slots
+import typing_stats
+
+# 数据库结构迁移列表: (目标版本, 说明, DatabaseManager中的迁移方法名)
+# 只能在末尾追加新迁移，已发布的迁移不能修改
+SCHEMA_MIGRATIONS = [
+    (1, "创建基础表结构", "_migrate_v1_base_tables"),
+    (2, "daily_summary添加current_session列", "_migrate_v2_session_state"),
+    (3, "旧格式索引(已由迁移4取代，不执行操作)", "_migrate_v3_minute_indexes"),
+    (4, "minute_activity改为整数分钟键的紧凑格式", "_migrate_v4_compact_minutes"),
+    (5, "创建并回填hourly_summary小时汇总表", "_migrate_v5_hourly_summary"),
+    (6, "启用增量空间回收(auto_vacuum=INCREMENTAL)", "_migrate_v6_incremental_vacuum"),
+    (7, "daily_summary添加每分钟活动位图列", "_migrate_v7_activity_bitmap"),
+    (8, "分钟/小时/每日记录添加活跃秒数列", "_migrate_v8_active_seconds"),
+    (9, "分钟/小时记录添加鼠标移动距离和点击次数列", "_migrate_v9_mouse_metrics"),
+    (10, "分钟/小时记录添加打字节奏统计列", "_migrate_v10_typing_stats"),
+    (11, "创建activity_gaps采样间断表", "_migrate_v11_activity_gaps"),
+    (12, "minute_activity添加分钟内采样位掩码和分辨率列", "_migrate_v12_minute_slots"),
+]
+
+# 分钟键的起点。分钟键基于本地时间(不含时区)，与日期字符串的划分保持一致
+_EPOCH = datetime(1970, 1, 1)
+
+def to_minute_key(timestamp):
+    """将本地时间转换为分钟键
+    
+    参数:
+        timestamp (datetime): 本地时间
+        
+    返回:
+        int: 自1970-01-01 00:00起的分钟数
+    """
+    return int((timestamp.replace(tzinfo=None) - _EPOCH).total_seconds() // 60)
+
+def from_minute_key(minute):
+    """将分钟键转换回本地时间
+    
+    参数:
+        minute (int): 分钟键
+        
+    返回:
+        datetime: 该分钟起始的本地时间
+    """
+    return _EPOCH + timedelta(minutes=minute)
+
+def day_minute_range(date_str):
+    """获取指定日期的分钟键范围
+    
+    参数:
+        date_str (str): 日期字符串 (YYYY-MM-DD)
+        
+    返回:
+        tuple: (起始分钟键, 结束分钟键)，左闭右开
+    """
+    start = to_minute_key(datetime.strptime(date_str, "%Y-%m-%d"))
+    return start, start + 1440
+
+def day_hour_range(date_str):
+    """获取指定日期的小时键范围(小时键 = 分钟键 // 60)
+    
+    参数:
+        date_str (str): 日期字符串 (YYYY-MM-DD)
+        
+    返回:
+        tuple: (起始小时键, 结束小时键)，左闭右开
+    """
+    start = day_minute_range(date_str)[0] // 60
+    return start, start + 24
 
 class DatabaseManager:
-    def __init__(self, db_path="usage_data.db"):
+    # 热点查询，check_query_plans()会检查它们是否命中索引
+    # 参数为(当日起始小时键, 次日起始小时键)，见day_hour_range()；用于没有活动位图的旧日期
+    DAY_ACTIVITY_SQL = """
+        SELECT hour - ?1, active_minutes
+        FROM hourly_summary
+        WHERE hour >= ?1 AND hour < ?2
+    """
+    # 参数为(当日起始分钟键, 次日起始分钟键)，见day_minute_range()
+    DAY_REBUILD_SQL = """
+        SELECT minute - ?1, is_active, active_seconds FROM minute_activity
+        WHERE minute >= ?1 AND minute < ?2
+        ORDER BY minute
+    """
+    # 参数为(起始小时键, 结束小时键, 每个桶的小时数)，用于整小时的桶
+    HOURLY_MATRIX_SQL = """
+        SELECT (hour - ?1) / ?3 AS slot, SUM(active_minutes)
+        FROM hourly_summary
+        WHERE hour >= ?1 AND hour < ?2
+        GROUP BY slot
+    """
+    # 参数为(起始分钟键, 结束分钟键, 每个桶的分钟数)
+    ACTIVITY_MATRIX_SQL = """
+        SELECT (minute - ?1) / ?3 AS slot, COUNT(*)
+        FROM minute_activity
+        WHERE minute >= ?1 AND minute < ?2 AND is_active = 1
+        GROUP BY slot
+    """
+    # 参数为(当日起始分钟键, 次日起始分钟键)，见day_minute_range()
+    DAY_SLOTS_SQL = """
+        SELECT minute - ?1, slot_mask, resolution FROM minute_activity
+        WHERE minute >= ?1 AND minute < ?2 AND slot_mask != 0
+    """
+    BITMAPS_SQL = """
+        SELECT date, activity_bitmap
+        FROM daily_summary
+        WHERE date >= ? AND date <= ?
+        ORDER BY date
+    """
+    # 启动恢复用: 按主键倒序读取最近一段时间的分钟记录，参数为(起始键, 结束键)
+    RECENT_MINUTES_SQL = """
+        SELECT minute, is_active FROM minute_activity
+        WHERE minute >= ? AND minute < ?
+        ORDER BY minute DESC
+    """
+    DAILY_SUMMARIES_SQL = """
+        SELECT date, total_active_minutes, longest_session 
+        FROM daily_summary
+        ORDER BY date DESC
+        LIMIT ?
+    """
+    # 导出用的流式查询，参数为(起始键, 结束键)，左闭右开
+    # 分钟键本身就是本地时间，按unixepoch格式化即得到本地时间字符串
+    MINUTE_EXPORT_SQL = """
+        SELECT strftime('%Y-%m-%d %H:%M:%S', minute * 60, 'unixepoch'),
+               is_active, mouse_moves, key_presses, active_seconds, mouse_distance, mouse_clicks,
+               key_intervals, key_interval_mean, key_interval_var, key_max_gap, slot_mask, resolution
+        FROM minute_activity
+        WHERE minute >= ?1 AND minute < ?2
+        ORDER BY minute
+    """
+    DAILY_EXPORT_SQL = """
+        SELECT date, total_active_minutes, total_active_seconds, longest_session, last_updated
+        FROM daily_summary
+        WHERE date >= ?1 AND date < ?2
+        ORDER BY date
+    """
+    # 导出列名，与上面两条查询的列一一对应
+    MINUTE_EXPORT_COLUMNS = ("timestamp", "is_active", "mouse_moves", "key_presses",
+                             "active_seconds", "mouse_distance", "mouse_clicks",
+                             "key_intervals", "key_interval_mean", "key_interval_var", "key_max_gap",
+                             "slot_mask", "resolution")
+    DAILY_EXPORT_COLUMNS = ("date", "total_active_minutes", "total_active_seconds",
+                            "longest_session", "last_updated")
+    
+    # 两条记录合并时按键间隔统计的赋值子句，均值和方差按个数加权合并，
+    # 分钟记录的upsert和小时汇总的upsert共用。引用的列均为更新前的旧值
+    TYPING_MERGE_SET = """
+            key_intervals = key_intervals + excluded.key_intervals,
+            key_interval_mean = COALESCE(
+                (key_intervals * key_interval_mean + excluded.key_intervals * excluded.key_interval_mean)
+                / NULLIF(key_intervals + excluded.key_intervals, 0), 0),
+            key_interval_var = COALESCE(MAX(0,
+                (key_intervals * (key_interval_var + key_interval_mean * key_interval_mean)
+                 + excluded.key_intervals * (excluded.key_interval_var
+                                             + excluded.key_interval_mean * excluded.key_interval_mean))
+                / NULLIF(key_intervals + excluded.key_intervals, 0)
+                - ((key_intervals * key_interval_mean + excluded.key_intervals * excluded.key_interval_mean)
+                   / NULLIF(key_intervals + excluded.key_intervals, 0))
+                * ((key_intervals * key_interval_mean + excluded.key_intervals * excluded.key_interval_mean)
+                   / NULLIF(key_intervals + excluded.key_intervals, 0))), 0),
+            key_max_gap = MAX(key_max_gap, excluded.key_max_gap),
+            """ + ",\n            ".join(
+        f"key_hist_{i} = key_hist_{i} + excluded.key_hist_{i}"
+        for i in range(typing_stats.HISTOGRAM_BUCKETS))
+    
+    # 写入一分钟记录。分钟键是主键，每分钟最多一行: 同一分钟再次写入时合并到已有的行
+    # (任一次活跃即活跃，计数相加，活跃秒数不超过60，相同分辨率的采样位掩码取并集)，
+    # 不会产生重复行，汇总表只累加变化量(见_insert_minute_activity)
+    MINUTE_UPSERT_SQL = """
+        INSERT INTO minute_activity
+        (minute, is_active, mouse_moves, key_presses, active_seconds, mouse_distance, mouse_clicks,
+         slot_mask, resolution, """ + ", ".join(typing_stats.COLUMNS) + """)
+        VALUES (""" + ", ".join("?" * (9 + len(typing_stats.COLUMNS))) + """)
+        ON CONFLICT(minute) DO UPDATE SET
+            is_active = MAX(is_active, excluded.is_active),
+            mouse_moves = mouse_moves + excluded.mouse_moves,
+            key_presses = key_presses + excluded.key_presses,
+            active_seconds = MIN(60, active_seconds + excluded.active_seconds),
+            mouse_distance = mouse_distance + excluded.mouse_distance,
+            mouse_clicks = mouse_clicks + excluded.mouse_clicks,
+            slot_mask = CASE WHEN resolution = excluded.resolution
+                             THEN slot_mask | excluded.slot_mask ELSE slot_mask END,
+            """ + TYPING_MERGE_SET + """
+    """
+    # 将一分钟记录累加到小时汇总，UPDATE子句中引用的列均为更新前的旧值
+    HOURLY_UPSERT_SQL = """
+        INSERT INTO hourly_summary
+        (hour, active_minutes, mouse_moves, key_presses, active_seconds, mouse_distance, mouse_clicks,
+         """ + ", ".join(typing_stats.COLUMNS) + """)
+        VALUES (""" + ", ".join("?" * (7 + len(typing_stats.COLUMNS))) + """)
+        ON CONFLICT(hour) DO UPDATE SET
+            active_minutes = active_minutes + excluded.active_minutes,
+            mouse_moves = mouse_moves + excluded.mouse_moves,
+            key_presses = key_presses + excluded.key_presses,
+            active_seconds = active_seconds + excluded.active_seconds,
+            mouse_distance = mouse_distance + excluded.mouse_distance,
+            mouse_clicks = mouse_clicks + excluded.mouse_clicks,
+            """ + TYPING_MERGE_SET + """
+    """
+    
+    # 由minute_activity按小时聚合出hourly_summary的一行，回填和压缩共用
+    # 按键间隔的均值和方差按个数加权合并: Var = Σn(var + mean²) / Σn - mean²
+    HOURLY_ROLLUP_COLUMNS = ("hour, active_minutes, mouse_moves, key_presses, active_seconds, "
+                             "mouse_distance, mouse_clicks, " + ", ".join(typing_stats.COLUMNS))
+    HOURLY_ROLLUP_SELECT = """
+        SELECT minute / 60, SUM(is_active), SUM(mouse_moves), SUM(key_presses),
+               SUM(active_seconds), SUM(mouse_distance), SUM(mouse_clicks),
+               SUM(key_intervals),
+               COALESCE(SUM(key_intervals * key_interval_mean) / NULLIF(SUM(key_intervals), 0), 0),
+               COALESCE(MAX(0, SUM(key_intervals * (key_interval_var + key_interval_mean * key_interval_mean))
+                               / NULLIF(SUM(key_intervals), 0)
+                               - (SUM(key_intervals * key_interval_mean) / NULLIF(SUM(key_intervals), 0))
+                                 * (SUM(key_intervals * key_interval_mean) / NULLIF(SUM(key_intervals), 0))),
+                        0),
+               MAX(key_max_gap), """ + ", ".join(
+        f"SUM(key_hist_{i})" for i in range(typing_stats.HISTOGRAM_BUCKETS)) + """
+        FROM minute_activity
+    """
+    
+    # get_activity_matrix支持的命名桶宽度(分钟)
+    MATRIX_BUCKETS = {"hour": 60, "minute": 1}
+    
+    # 数据库被锁定时单轮写入的最大重试次数及退避上限(秒)
+    BUSY_RETRY_ATTEMPTS = 5
+    BUSY_RETRY_MAX_DELAY = 2.0
+    
+    # 压缩任务: 启动后首次执行的延迟、两轮之间的间隔、两步之间的间隔(秒)
+    COMPACTION_START_DELAY = 60
+    COMPACTION_INTERVAL = 6 * 3600
+    COMPACTION_STEP_PAUSE = 0.2
+    # 每一步最多回收的空闲页数
+    VACUUM_PAGES_PER_STEP = 256
+    
+    def __init__(self, db_path="usage_data.db", flush_interval=300, flush_batch_size=30,
+                 busy_timeout=5.0, reader_pool_size=2, raw_retention_days=0,
+                 hourly_retention_months=0):
         """初始化数据库管理器
         
         创建数据库连接并确保所需表结构存在。如果数据库文件不存在，
@@ -28,6 +295,12 @@ class DatabaseManager:
         
         参数:
             db_path (str): 数据库文件路径，默认为当前目录下的usage_data.db
+            flush_interval (float): 写缓冲最长滞留时间(秒)，到期后提交一次事务
+            flush_batch_size (int): 写缓冲中累积多少条写操作后立即提交
+            busy_timeout (float): 单条语句等待数据库锁的最长时间(秒)
+            reader_pool_size (int): 只读连接池的最大连接数
+            raw_retention_days (int): 原始分钟记录保留天数，0表示永久保留
+            hourly_retention_months (int): 小时汇总保留月数，0表示永久保留
         """
         # 获取应用程序目录
         if getattr(sys, 'frozen', False):
@@ -46,74 +319,176 @@ class DatabaseManager:
         self.db_path = os.path.join(data_dir, db_path)
         logging.info(f"数据库路径: {self.db_path}")
         
-        self.local = threading.local()  # 创建线程局部存储对象
+        self.busy_timeout = busy_timeout
+        
+        # 唯一的写连接：初始化阶段在当前线程使用，之后只由写线程使用
+        self._writer_conn = self._connect()
+        
+        # 只读连接池，按需创建，最多reader_pool_size个
+        self._reader_pool_size = max(1, int(reader_pool_size))
+        self._reader_pool = queue.Queue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
         
-        # 初始化主线程的连接
+        # 初始化表结构
         self._initialize_db()
         
-    def _get_connection(self):
-        """获取当前线程的数据库连接
+        # 数据保留策略及压缩任务状态(只由写线程访问)
+        self.raw_retention_days = raw_retention_days
+        self.hourly_retention_months = hourly_retention_months
+        self._compaction_job = None
+        self._next_compaction = time.monotonic() + self.COMPACTION_START_DELAY
         
-        如果当前线程没有连接，则创建一个新连接。
-        这确保每个线程使用自己的SQLite连接。
+        # 写缓冲队列及唯一的写线程
+        self.flush_interval = flush_interval
+        self.flush_batch_size = max(1, int(flush_batch_size))
+        self._write_queue = queue.Queue()
+        self._closed = False
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="db-writer")
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
         
+    def _connect(self, read_only=False):
+        """创建一个新的数据库连接并应用连接参数
+        
+        写连接负责把数据库切换到WAL模式；只读连接以mode=ro方式打开，
+        无法意外写入。连接允许跨线程使用，由调用方保证同一时刻只有一个线程使用。
+        
+        参数:
+            read_only (bool): 是否创建只读连接
+            
         返回:
-            tuple: (connection, cursor) 数据库连接和游标对象
+            sqlite3.Connection: 数据库连接
         """
-        # 检查当前线程是否已有连接
-        if not hasattr(self.local, 'conn') or self.local.conn is None:
-            # 为当前线程创建新连接
-            self.local.conn = sqlite3.connect(self.db_path)
-            self.local.cursor = self.local.conn.cursor()
-            logging.debug(f"线程 {threading.get_ident()} 创建了新的数据库连接")
+        if read_only:
+            uri = pathlib.Path(self.db_path).as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=self.busy_timeout,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA cache_size = -2000")  # 约2MB
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                   check_same_thread=False)
+            journal_mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            if journal_mode.lower() != "wal":
+                logging.warning(f"无法启用WAL模式，当前日志模式: {journal_mode}")
+            # WAL模式下NORMAL只在检查点时同步，掉电最多丢失最近的事务但不会损坏数据库
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA cache_size = -8000")  # 约8MB
+            conn.execute("PRAGMA temp_store = MEMORY")
+        logging.debug(f"创建了新的{'只读' if read_only else '写'}数据库连接")
+        return conn
         
-        return self.local.conn, self.local.cursor
+    @contextmanager
+    def _read_connection(self):
+        """从只读连接池借用一个连接
         
-    def _initialize_db(self):
-        """初始化数据库连接和表结构
+        池中没有空闲连接且未达到上限时创建新连接，否则等待其他线程归还。
         
-        检查数据库文件是否存在，创建连接并初始化表结构(如需要)。
-        这是一个内部方法，由__init__方法调用。
+        用法:
+            with self._read_connection() as cursor:
+                cursor.execute(...)
         """
-        # 获取当前线程的连接
-        conn, cursor = self._get_connection()
-        
         try:
-            # 检查表是否存在
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='minute_activity'")
-            table_exists = cursor.fetchone() is not None
-            
-            # 如果表不存在，创建表结构
-            if not table_exists:
-                logging.info("数据库表不存在，正在创建表结构...")
-                self._create_tables(conn, cursor)
+            conn = self._reader_pool.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._reader_lock:
+                if self._reader_count < self._reader_pool_size:
+                    self._reader_count += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect(read_only=True)
+                except Exception:
+                    with self._reader_lock:
+                        self._reader_count -= 1
+                    raise
             else:
-                logging.info("数据库表已存在")
+                conn = self._reader_pool.get()
+                
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            self._reader_pool.put(conn)
+        
+    def _initialize_db(self):
+        """初始化数据库表结构
         
+        执行所有未应用的结构迁移，并检查热点查询是否命中索引。
+        这是一个内部方法，由__init__方法调用。
+        """
+        try:
+            self._run_migrations()
         except Exception as e:
-            logging.error(f"检查数据库表结构时出错: {e}")
-            # 如果发生错误，尝试创建表
-            try:
-                self._create_tables(conn, cursor)
-            except Exception as create_error:
-                logging.error(f"创建数据库表结构失败: {create_error}")
+            logging.error(f"升级数据库表结构时出错: {e}")
+            
+        try:
+            self.check_query_plans()
+        except Exception as e:
+            logging.warning(f"检查查询计划失败: {e}")
         
         logging.info(f"数据库初始化完成: {self.db_path}")
         
-    def _create_tables(self, conn, cursor):
-        """创建数据库表结构
+    def get_schema_version(self):
+        """获取数据库当前的结构版本
+        
+        返回:
+            int: PRAGMA user_version的值，未初始化的数据库为0
+        """
+        return self._writer_conn.execute("PRAGMA user_version").fetchone()[0]
+        
+    def _run_migrations(self):
+        """按顺序执行所有高于当前结构版本的迁移
+        
+        每个迁移与写入新版本号在同一个事务中完成，迁移失败时回滚并停止，
+        数据库保持在最后一个成功的版本，下次启动时重试。
+        """
+        conn = self._writer_conn
+        cursor = conn.cursor()
+        current_version = self.get_schema_version()
+        self._vacuum_after_migration = False
+        
+        for version, description, method_name in SCHEMA_MIGRATIONS:
+            if version <= current_version:
+                continue
+                
+            logging.info(f"升级数据库结构到版本{version}: {description}")
+            try:
+                cursor.execute("BEGIN")
+                getattr(self, method_name)(cursor)
+                # PRAGMA不支持参数绑定，版本号来自上面的常量列表
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                conn.commit()
+                current_version = version
+            except Exception as e:
+                self._rollback(conn)
+                logging.error(f"数据库结构升级到版本{version}失败: {e}")
+                raise
+                
+        logging.info(f"数据库结构版本: {current_version}")
+        
+        # 重写了大表的迁移完成后整理数据库文件(VACUUM不能在事务中执行)
+        if self._vacuum_after_migration:
+            logging.info("正在整理数据库文件以回收空间...")
+            cursor.execute("VACUUM")
+        
+    def _migrate_v1_base_tables(self, cursor):
+        """迁移1: 创建基础表结构
         
-        创建两个主要表:
+        创建两个主要表(已存在时跳过，兼容没有版本号的旧数据库):
         1. minute_activity: 记录每分钟的活动详情
         2. daily_summary: 记录每日使用汇总数据
         
         参数:
-            conn: 数据库连接
-            cursor: 数据库游标
+            cursor: 写连接的数据库游标
         """
         # 创建分钟活动记录表 - 存储每分钟的详细活动数据
         cursor.execute('''
-        CREATE TABLE minute_activity (
+        CREATE TABLE IF NOT EXISTS minute_activity (
             id INTEGER PRIMARY KEY AUTOINCREMENT,  -- 自增主键
             timestamp TEXT NOT NULL,               -- 时间戳(YYYY-MM-DD HH:MM:SS格式)
             date TEXT NOT NULL,                    -- 日期部分(YYYY-MM-DD格式)
@@ -126,7 +501,7 @@ class DatabaseManager:
         
         # 创建每日汇总数据表 - 存储每日使用统计
         cursor.execute('''
-        CREATE TABLE daily_summary (
+        CREATE TABLE IF NOT EXISTS daily_summary (
             date TEXT PRIMARY KEY,                 -- 日期(YYYY-MM-DD格式)
             total_active_minutes INTEGER NOT NULL, -- 当日总活跃分钟数
             longest_session INTEGER NOT NULL,      -- 最长连续使用会话(分钟)
@@ -134,184 +509,916 @@ class DatabaseManager:
         )
         ''')
         
-        conn.commit()
-        logging.info("数据库表结构创建完成")
+    def _migrate_v2_session_state(self, cursor):
+        """迁移2: daily_summary添加增量会话状态列
+        
+        旧版本每分钟都通过子查询重新计算最长会话，没有持久化当前会话长度。
+        升级时补充current_session列，并重建今日汇总以得到正确的起始状态。
+        迁移只能使用当时的表结构，因此这里不调用_rebuild_daily_summary。
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        cursor.execute("PRAGMA table_info(daily_summary)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if "current_session" not in columns:
+            cursor.execute(
+                "ALTER TABLE daily_summary ADD COLUMN current_session INTEGER NOT NULL DEFAULT 0"
+            )
+            
+        today = datetime.now().strftime("%Y-%m-%d")
+        cursor.execute(
+            "SELECT is_active FROM minute_activity WHERE date = ? ORDER BY timestamp, id",
+            (today,)
+        )
+        flags = [row[0] for row in cursor.fetchall()]
+        if flags:
+            active_minutes, longest_session, current_session = self._summarize_sessions(flags)
+            cursor.execute("""
+                INSERT OR REPLACE INTO daily_summary 
+                (date, total_active_minutes, longest_session, current_session, last_updated)
+                VALUES (?, ?, ?, ?, ?)
+            """, (today, active_minutes, longest_session, current_session,
+                  datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        
+    def _migrate_v3_minute_indexes(self, cursor):
+        """迁移3: 不执行任何操作，只保留版本号
+        
+        该版本原本为旧格式minute_activity的(date, ...)列建立覆盖索引，迁移4随即把表
+        改写为以分钟键为主键的格式并删除旧表及其索引，热点查询直接走主键范围查询。
+        在旧表上建索引对任何升级路径都没有意义，因此这里不再执行。
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        
+    def _migrate_v4_compact_minutes(self, cursor):
+        """迁移4: 将minute_activity改写为整数分钟键的紧凑格式
+        
+        旧格式每行保存三个重复的TEXT时间列和自增id，新格式以分钟键为主键
+        (WITHOUT ROWID)，只保留计数列。同一分钟有多条旧记录时合并为一条:
+        任一记录活跃即视为活跃，计数相加。
+        旧表及其索引被删除，迁移完成后执行VACUUM回收空间。
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        cursor.execute('''
+        CREATE TABLE minute_activity_compact (
+            minute INTEGER PRIMARY KEY,            -- 分钟键(本地时间自1970-01-01 00:00起的分钟数)
+            is_active INTEGER NOT NULL,            -- 是否活跃(1=活跃,0=不活跃)
+            mouse_moves INTEGER NOT NULL,          -- 鼠标移动次数
+            key_presses INTEGER NOT NULL           -- 按键次数
+        ) WITHOUT ROWID
+        ''')
+        
+        # strftime('%s')把不带时区的时间当作UTC处理，得到的正是本地时间的分钟键
+        cursor.execute("""
+            INSERT INTO minute_activity_compact (minute, is_active, mouse_moves, key_presses)
+            SELECT minute, MAX(is_active), SUM(mouse_moves), SUM(key_presses)
+            FROM (
+                SELECT CAST(strftime('%s', timestamp) AS INTEGER) / 60 AS minute,
+                       is_active, mouse_moves, key_presses
+                FROM minute_activity
+                WHERE strftime('%s', timestamp) IS NOT NULL
+            )
+            GROUP BY minute
+        """)
+        
+        cursor.execute("DROP TABLE minute_activity")  # 同时删除旧索引
+        cursor.execute("ALTER TABLE minute_activity_compact RENAME TO minute_activity")
+        self._vacuum_after_migration = True
+        
+    def _migrate_v5_hourly_summary(self, cursor):
+        """迁移5: 创建hourly_summary小时汇总表并从minute_activity回填
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        cursor.execute('''
+        CREATE TABLE hourly_summary (
+            hour INTEGER PRIMARY KEY,              -- 小时键(分钟键 // 60)
+            active_minutes INTEGER NOT NULL,       -- 该小时的活跃分钟数
+            mouse_moves INTEGER NOT NULL,          -- 该小时的鼠标移动次数
+            key_presses INTEGER NOT NULL           -- 该小时的按键次数
+        ) WITHOUT ROWID
+        ''')
+        # 迁移只能使用当时的表结构，因此这里不调用_backfill_hourly_summary
+        cursor.execute("""
+            INSERT INTO hourly_summary (hour, active_minutes, mouse_moves, key_presses)
+            SELECT minute / 60, SUM(is_active), SUM(mouse_moves), SUM(key_presses)
+            FROM minute_activity
+            GROUP BY minute / 60
+        """)
+        logging.info(f"已回填小时汇总: {cursor.rowcount}小时")
+        
+    def _migrate_v6_incremental_vacuum(self, cursor):
+        """迁移6: 启用增量空间回收
+        
+        auto_vacuum模式需要执行一次VACUUM才对已有数据库生效，之后压缩任务
+        可以用incremental_vacuum分小步归还删除记录后留下的空闲页。
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._vacuum_after_migration = True
+        
+    def _migrate_v7_activity_bitmap(self, cursor):
+        """迁移7: daily_summary添加activity_bitmap列并从minute_activity回填
+        
+        按分钟键顺序扫描一遍活跃分钟，逐日生成位图。已超出原始记录保留期的
+        日期没有分钟记录可用，位图保持为NULL(视为全部不活跃)。
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        cursor.execute("ALTER TABLE daily_summary ADD COLUMN activity_bitmap BLOB")
+        
+        cursor.execute("SELECT minute FROM minute_activity WHERE is_active = 1 ORDER BY minute")
+        bitmaps = []
+        day = None
+        value = 0
+        for (minute,) in cursor:
+            if minute // 1440 != day:
+                if day is not None:
+                    bitmaps.append((activity_bitmap.from_int(value), day))
+                day = minute // 1440
+                value = 0
+            value |= 1 << (minute % 1440)
+        if day is not None:
+            bitmaps.append((activity_bitmap.from_int(value), day))
+            
+        cursor.executemany(
+            "UPDATE daily_summary SET activity_bitmap = ? WHERE date = ?",
+            [(bitmap, from_minute_key(day * 1440).strftime("%Y-%m-%d")) for bitmap, day in bitmaps]
+        )
+        logging.info(f"已回填活动位图: {len(bitmaps)}天")
+        
+    def _migrate_v8_active_seconds(self, cursor):
+        """迁移8: 添加活跃秒数列
+        
+        minute_activity.active_seconds记录该分钟内有输入的秒数(0-60)，
+        hourly_summary和daily_summary分别累计每小时、每天的活跃秒数。
+        旧记录只有是否活跃的标志，按活跃分钟计60秒估算。
         
-    def record_minute_activity(self, timestamp, is_active, mouse_moves, key_presses):
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        cursor.execute(
+            "ALTER TABLE minute_activity ADD COLUMN active_seconds INTEGER NOT NULL DEFAULT 0"
+        )
+        cursor.execute("UPDATE minute_activity SET active_seconds = 60 WHERE is_active = 1")
+        cursor.execute(
+            "ALTER TABLE hourly_summary ADD COLUMN active_seconds INTEGER NOT NULL DEFAULT 0"
+        )
+        cursor.execute("UPDATE hourly_summary SET active_seconds = active_minutes * 60")
+        cursor.execute(
+            "ALTER TABLE daily_summary ADD COLUMN total_active_seconds INTEGER NOT NULL DEFAULT 0"
+        )
+        cursor.execute("UPDATE daily_summary SET total_active_seconds = total_active_minutes * 60")
+        
+    def _migrate_v9_mouse_metrics(self, cursor):
+        """迁移9: minute_activity和hourly_summary添加鼠标移动距离(像素)和点击次数列
+        
+        旧记录没有这两项数据，保持为0。
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        for table in ("minute_activity", "hourly_summary"):
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN mouse_distance INTEGER NOT NULL DEFAULT 0"
+            )
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN mouse_clicks INTEGER NOT NULL DEFAULT 0"
+            )
+        
+    def _migrate_v10_typing_stats(self, cursor):
+        """迁移10: minute_activity和hourly_summary添加按键间隔统计列
+        
+        旧记录没有按键间隔数据，个数为0。
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        column_types = {"key_intervals": "INTEGER", "key_interval_mean": "REAL",
+                        "key_interval_var": "REAL", "key_max_gap": "REAL"}
+        for table in ("minute_activity", "hourly_summary"):
+            for column in typing_stats.COLUMNS:
+                column_type = column_types.get(column, "INTEGER")
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {column} {column_type} NOT NULL DEFAULT 0"
+                )
+        
+    def _migrate_v11_activity_gaps(self, cursor):
+        """迁移11: 创建activity_gaps表
+        
+        系统睡眠、程序停顿或系统时间跳变期间没有分钟记录，每次间断只记一行，
+        不为间断中的每一分钟写入不活跃记录。
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        cursor.execute('''
+        CREATE TABLE activity_gaps (
+            start_minute INTEGER PRIMARY KEY,      -- 间断起点的分钟键
+            end_minute INTEGER NOT NULL,           -- 间断终点的分钟键(不含)
+            kind TEXT NOT NULL,                    -- 间断类型: suspend/stall/clock_back
+            jump_seconds REAL NOT NULL DEFAULT 0   -- 系统时间相对单调时钟多走(正)或少走(负)的秒数
+        ) WITHOUT ROWID
+        ''')
+        
+    def _migrate_v12_minute_slots(self, cursor):
+        """迁移12: minute_activity添加slot_mask和resolution列
+        
+        旧记录都是一分钟一个采样点: 分辨率为60秒，位掩码就是is_active。
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        cursor.execute(
+            "ALTER TABLE minute_activity ADD COLUMN slot_mask INTEGER NOT NULL DEFAULT 0"
+        )
+        cursor.execute(
+            "ALTER TABLE minute_activity ADD COLUMN resolution INTEGER NOT NULL DEFAULT 60"
+        )
+        cursor.execute("UPDATE minute_activity SET slot_mask = is_active WHERE is_active != 0")
+        
+    def check_query_plans(self):
+        """检查热点查询是否命中索引
+        
+        对每个热点查询执行EXPLAIN QUERY PLAN，如果出现未使用索引的全表扫描则记录警告。
+        
+        返回:
+            dict: 以查询名称为键，(是否命中索引, 查询计划描述列表)为值的字典
+        """
+        return self.explain_hot_queries(self._writer_conn.cursor())
+        
+    @classmethod
+    def explain_hot_queries(cls, cursor):
+        """用给定的游标检查热点查询是否命中索引
+        
+        不需要创建DatabaseManager实例，诊断脚本(check_db.py)可以直接对只读连接调用。
+        
+        参数:
+            cursor: 任意连接到数据库的游标
+            
+        返回:
+            dict: 同check_query_plans()
+        """
+        today = datetime.now().strftime("%Y-%m-%d")
+        queries = {
+            "get_day_activity": (cls.DAY_ACTIVITY_SQL, day_hour_range(today)),
+            "rebuild_daily_summary": (cls.DAY_REBUILD_SQL, day_minute_range(today)),
+            "get_daily_summaries": (cls.DAILY_SUMMARIES_SQL, (30,)),
+            "get_activity_bitmaps": (cls.BITMAPS_SQL, (today, today)),
+            "get_recent_minutes": (cls.RECENT_MINUTES_SQL, day_minute_range(today)),
+            "get_day_slots": (cls.DAY_SLOTS_SQL, day_minute_range(today)),
+        }
+        
+        results = {}
+        for name, (sql, params) in queries.items():
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            details = [row[-1] for row in cursor.fetchall()]
+            # "SCAN 表名"且没有"USING ... INDEX"说明是全表扫描
+            full_scan = any(
+                detail.startswith("SCAN") and "INDEX" not in detail and "TEMP B-TREE" not in detail
+                for detail in details
+            )
+            results[name] = (not full_scan, details)
+            if full_scan:
+                logging.warning(f"查询{name}未命中索引: {'; '.join(details)}")
+            else:
+                logging.debug(f"查询{name}的执行计划: {'; '.join(details)}")
+        return results
+        
+    def record_minute_activity(self, timestamp, is_active, mouse_moves, key_presses,
+                               active_seconds=None, mouse_distance=0, mouse_clicks=0, typing=None,
+                               slot_mask=None, resolution=60):
         """记录每分钟活动数据
         
-        将当前分钟的活动信息保存到数据库，并更新每日汇总。
+        将当前分钟的活动信息放入写缓冲队列，由写线程与每日汇总的增量更新
+        一起批量提交。调用方线程不会等待磁盘写入。
         
         参数:
             timestamp (datetime): 记录时间
             is_active (bool): 该分钟是否有活动
             mouse_moves (int): 鼠标移动次数
             key_presses (int): 按键次数
+            active_seconds (int, optional): 该分钟内有输入的秒数(0-60)，
+                未提供时活跃分钟按60秒计
+            mouse_distance (int): 鼠标移动距离(像素)
+            mouse_clicks (int): 鼠标点击次数
+            typing (TypingStats, optional): 该分钟的按键间隔统计
+            slot_mask (int, optional): 分钟内各采样点是否活跃的位掩码，
+                未提供时按一个采样点取is_active
+            resolution (int): 采样分辨率(秒)，见minute_slots
             
         返回:
-            bool: 操作是否成功
+            bool: 是否成功加入写缓冲
         """
-        # 获取当前线程的连接
-        conn, cursor = self._get_connection()
+        if active_seconds is None:
+            active_seconds = 60 if is_active else 0
+        if slot_mask is None:
+            slot_mask = 1 if is_active else 0
+        typing_row = typing.row() if typing is not None else typing_stats.TypingStats.empty_row()
+        return self._enqueue_write(
+            "minute", (timestamp, is_active, mouse_moves, key_presses, active_seconds,
+                       mouse_distance, mouse_clicks, typing_row, slot_mask, resolution)
+        )
         
-        # 格式化日期和时间
+    def _insert_minute_activity(self, cursor, timestamp, is_active, mouse_moves, key_presses,
+                                active_seconds, mouse_distance, mouse_clicks, typing_row,
+                                slot_mask=1, resolution=60):
+        """写入一条分钟活动记录并增量更新每日汇总(在写线程的事务中执行)
+        
+        同一分钟已有记录时按MINUTE_UPSERT_SQL合并，小时和每日汇总只累加合并前后的
+        变化量: 已经计为活跃的分钟不会被重复计入活跃分钟数和连续会话。
+        连续会话只能由当天最新的一分钟推进；写入早于当天最新记录的分钟(系统时间回拨、
+        夏令时结束、迟到的批次)时，改为按当天的分钟记录重建每日汇总。
+        
+        参数:
+            cursor: 数据库游标
+            timestamp (datetime): 记录时间
+            is_active (bool): 该分钟是否有活动
+            mouse_moves (int): 鼠标移动次数
+            key_presses (int): 按键次数
+            active_seconds (int): 该分钟内有输入的秒数
+            mouse_distance (int): 鼠标移动距离(像素)
+            mouse_clicks (int): 鼠标点击次数
+            typing_row (tuple): 按键间隔统计，按typing_stats.COLUMNS的顺序
+            slot_mask (int): 分钟内各采样点是否活跃的位掩码
+            resolution (int): 采样分辨率(秒)
+        """
         date_str = timestamp.strftime("%Y-%m-%d")  # 提取日期部分
-        time_str = timestamp.strftime("%H:%M:%S")  # 提取时间部分
-        timestamp_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")  # 完整时间戳
+        minute = to_minute_key(timestamp)
+        active = 1 if is_active else 0
         
-        try:
-            # 插入活动记录
+        # 按主键读出这一分钟已有的记录(通常没有)
+        cursor.execute(
+            "SELECT is_active, active_seconds FROM minute_activity WHERE minute = ?", (minute,)
+        )
+        existing = cursor.fetchone()
+        
+        # 当天是否已有更晚的分钟记录(主键范围查询，最多读一行)
+        day_end = minute - minute % 1440 + 1440
+        cursor.execute(
+            "SELECT 1 FROM minute_activity WHERE minute > ? AND minute < ? LIMIT 1",
+            (minute, day_end)
+        )
+        has_later = cursor.fetchone() is not None
+        
+        # 写入活动记录，同一分钟已有记录时合并
+        cursor.execute(
+            self.MINUTE_UPSERT_SQL,
+            (minute, active, mouse_moves, key_presses, active_seconds, mouse_distance, mouse_clicks,
+             slot_mask if active else 0, resolution) + tuple(typing_row)
+        )
+        
+        # 合并对活跃分钟数和活跃秒数的实际影响
+        if existing is None:
+            active_delta, seconds_delta = active, active_seconds
+        else:
+            active_delta = max(active - existing[0], 0)
+            seconds_delta = min(60, existing[1] + active_seconds) - existing[1]
+        
+        # 增量更新小时汇总
+        cursor.execute(
+            self.HOURLY_UPSERT_SQL,
+            (minute // 60, active_delta, mouse_moves, key_presses, seconds_delta, mouse_distance,
+             mouse_clicks) + tuple(typing_row)
+        )
+        
+        # 在同一事务中增量更新每日汇总数据
+        if (existing is None or active_delta) and has_later:
+            # 较早的分钟改变了当天的会话序列，增量的当前会话已不适用
+            self._rebuild_daily_summary(cursor, date_str)
+        elif existing is None or active_delta:
+            self._update_daily_summary(cursor, date_str, active_delta,
+                                       minute % 1440, seconds_delta)
+        elif seconds_delta:
             cursor.execute(
-                "INSERT INTO minute_activity (timestamp, date, time, is_active, mouse_moves, key_presses) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                (timestamp_str, date_str, time_str, 1 if is_active else 0, mouse_moves, key_presses)
+                "UPDATE daily_summary SET total_active_seconds = total_active_seconds + ? WHERE date = ?",
+                (seconds_delta, date_str)
             )
-            conn.commit()
+        
+    def record_gap(self, start, end, kind, jump_seconds=0.0, ends_session=True):
+        """记录一次采样间断
+        
+        经写缓冲与分钟记录按顺序提交。ends_session为True时间断结束当天正在进行的
+        连续会话，间断之后的第一个活跃分钟开始新的会话；较短的间断只留下记录，
+        会话继续累计(与跟踪器按INACTIVITY_RESET重置计时的规则一致)。
+        
+        参数:
+            start (datetime): 间断起点(整分钟)
+            end (datetime): 间断终点(整分钟，不含)
+            kind (str): 间断类型，见tick_scheduler中的GAP_*常量
+            jump_seconds (float): 系统时间相对单调时钟多走(正)或少走(负)的秒数
+            ends_session (bool): 间断是否结束当前的连续会话
             
-            # 更新每日汇总数据
-            self._update_daily_summary(date_str)
+        返回:
+            bool: 是否成功加入写缓冲
+        """
+        return self._enqueue_write("gap", (start, end, kind, jump_seconds, ends_session))
+        
+    def _insert_gap(self, cursor, start, end, kind, jump_seconds, ends_session=True):
+        """写入一条间断记录，需要时结束间断起点所在日期的当前会话(在写线程的事务中执行)
+        
+        参数:
+            cursor: 数据库游标
+            start (datetime): 间断起点
+            end (datetime): 间断终点
+            kind (str): 间断类型
+            jump_seconds (float): 系统时间跳变的秒数
+            ends_session (bool): 是否将当前会话清零
+        """
+        cursor.execute(
+            "INSERT OR REPLACE INTO activity_gaps (start_minute, end_minute, kind, jump_seconds) "
+            "VALUES (?, ?, ?, ?)",
+            (to_minute_key(start), to_minute_key(end), kind, jump_seconds)
+        )
+        if ends_session:
+            cursor.execute(
+                "UPDATE daily_summary SET current_session = 0 WHERE date = ?",
+                (start.strftime("%Y-%m-%d"),)
+            )
+        
+    def _enqueue_write(self, kind, payload):
+        """将写操作放入写缓冲队列
+        
+        参数:
+            kind (str): 写操作类型
+            payload (tuple): 写操作参数
             
-            return True
+        返回:
+            bool: 是否成功入队(数据库已关闭时返回False)
+        """
+        if self._closed:
+            logging.error(f"数据库已关闭，丢弃写操作: {kind} {payload}")
+            return False
+        self._write_queue.put((kind, payload))
+        return True
+        
+    def _writer_loop(self):
+        """写线程主循环
+        
+        从写缓冲队列中取出写操作并累积成批，满足以下任一条件时在一个事务中提交:
+        1. 累积的写操作数达到flush_batch_size
+        2. 批次中最早的写操作已等待flush_interval秒
+        3. 收到flush()或close()请求
+        
+        没有待提交的写操作且压缩任务到期时，执行一步压缩任务。
+        """
+        pending = []
+        waiters = []
+        batch_started = 0.0
+        stopping = False
+        
+        while not stopping:
+            deadlines = []
+            if pending:
+                deadlines.append(batch_started + self.flush_interval)
+            # 压缩只在没有待提交数据时执行，有待提交批次时不能按压缩时间唤醒，否则会空转
+            elif self._retention_enabled():
+                deadlines.append(self._next_compaction)
+            timeout = None
+            if deadlines:
+                timeout = max(0.0, min(deadlines) - time.monotonic())
+                
+            try:
+                kind, payload = self._write_queue.get(timeout=timeout)
+            except queue.Empty:
+                kind, payload = None, None  # 等待时间到期
+                
+            if kind == "stop":
+                stopping = True
+            elif kind == "flush":
+                waiters.append(payload)
+            elif kind == "compact":
+                self._next_compaction = time.monotonic()
+            elif kind is not None:
+                if not pending:
+                    batch_started = time.monotonic()
+                pending.append((kind, payload))
+                
+            batch_due = (kind in ("stop", "flush")
+                         or len(pending) >= self.flush_batch_size
+                         or time.monotonic() >= batch_started + self.flush_interval)
+            if pending and batch_due:
+                if self._write_batch(pending):
+                    pending = []
+                else:
+                    # 数据库持续被锁定：保留批次，等待下一个提交周期重试
+                    batch_started = time.monotonic()
+                    
+            # 批次提交后通知等待flush的调用方
+            if not pending:
+                for event in waiters:
+                    event.set()
+                waiters = []
+                
+            # 写入优先：只有在没有待提交数据时才推进压缩任务
+            if (not stopping and not pending and self._retention_enabled()
+                    and time.monotonic() >= self._next_compaction):
+                self._run_compaction_step()
+                
+        # 退出前最后再尝试几轮提交剩余数据
+        for _ in range(3):
+            if not pending or self._write_batch(pending):
+                pending = []
+                break
+        if pending:
+            logging.error(f"数据库持续被锁定，退出时有{len(pending)}条写操作未能写入")
+        for event in waiters:
+            event.set()
+        
+    def _retention_enabled(self):
+        """是否配置了任何数据保留期限"""
+        return bool(self.raw_retention_days) or bool(self.hourly_retention_months)
+        
+    def request_compaction(self):
+        """请求写线程尽快开始一轮压缩任务(不等待完成)"""
+        self._enqueue_write("compact", None)
+        
+    def _run_compaction_step(self):
+        """执行压缩任务的一步，并安排下一步或下一轮的时间"""
+        if self._compaction_job is None:
+            self._compaction_job = self._compaction_steps()
+            
+        try:
+            next(self._compaction_job)
+            self._next_compaction = time.monotonic() + self.COMPACTION_STEP_PAUSE
+        except StopIteration:
+            self._compaction_job = None
+            self._next_compaction = time.monotonic() + self.COMPACTION_INTERVAL
         except Exception as e:
-            logging.error(f"记录活动数据失败: {e}")
+            self._rollback(self._writer_conn)
+            logging.error(f"数据压缩任务失败，将在下一轮重试: {e}")
+            self._compaction_job = None
+            self._next_compaction = time.monotonic() + self.COMPACTION_INTERVAL
+            
+    def _compaction_steps(self):
+        """压缩任务生成器，每次迭代执行并提交一个小事务
+        
+        1. 原始分钟记录超过保留期: 按小时对齐的区间(最多一天)先补齐小时汇总，再删除；
+           之后删除同样过期的采样间断
+        2. 小时汇总超过保留期: 按区间(最多31天)删除，每日汇总不受影响
+        3. 有空闲页时: 每步用incremental_vacuum回收VACUUM_PAGES_PER_STEP页
+        """
+        conn = self._writer_conn
+        cursor = conn.cursor()
+        today = self._to_day(datetime.now())
+        deleted_minutes = 0
+        deleted_hours = 0
+        
+        if self.raw_retention_days:
+            cutoff = to_minute_key(today - timedelta(days=self.raw_retention_days))
+            while True:
+                cursor.execute("SELECT MIN(minute) FROM minute_activity")
+                first = cursor.fetchone()[0]
+                if first is None or first >= cutoff:
+                    break
+                chunk_end = min((first // 60 + 24) * 60, cutoff)
+                # 降采样: 已存在的小时汇总由增量更新维护，这里只补齐缺失的小时
+                cursor.execute(
+                    f"INSERT OR IGNORE INTO hourly_summary ({self.HOURLY_ROLLUP_COLUMNS}) "
+                    f"{self.HOURLY_ROLLUP_SELECT} WHERE minute >= ? AND minute < ? GROUP BY minute / 60",
+                    (first, chunk_end)
+                )
+                cursor.execute(
+                    "DELETE FROM minute_activity WHERE minute >= ? AND minute < ?",
+                    (first, chunk_end)
+                )
+                deleted_minutes += cursor.rowcount
+                conn.commit()
+                yield
+            # 间断记录与原始分钟记录同期保留，行数很少，一条语句即可删完
+            cursor.execute("DELETE FROM activity_gaps WHERE end_minute <= ?", (cutoff,))
+            conn.commit()
+            yield
+                
+        if self.hourly_retention_months:
+            month_index = today.year * 12 + today.month - 1 - self.hourly_retention_months
+            cutoff_day = datetime(month_index // 12, month_index % 12 + 1, 1)
+            cutoff = to_minute_key(cutoff_day) // 60
+            while True:
+                cursor.execute("SELECT MIN(hour) FROM hourly_summary")
+                first = cursor.fetchone()[0]
+                if first is None or first >= cutoff:
+                    break
+                chunk_end = min(first + 24 * 31, cutoff)
+                cursor.execute(
+                    "DELETE FROM hourly_summary WHERE hour >= ? AND hour < ?",
+                    (first, chunk_end)
+                )
+                deleted_hours += cursor.rowcount
+                conn.commit()
+                yield
+                
+        # 只有auto_vacuum=INCREMENTAL(2)时incremental_vacuum才有效
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] == 2:
+            while True:
+                cursor.execute("PRAGMA freelist_count")
+                if cursor.fetchone()[0] == 0:
+                    break
+                cursor.execute(f"PRAGMA incremental_vacuum({int(self.VACUUM_PAGES_PER_STEP)})")
+                cursor.fetchall()  # 逐行执行完才会真正释放页面
+                conn.commit()
+                yield
+                
+        if deleted_minutes or deleted_hours:
+            logging.info(f"数据压缩完成: 删除过期分钟记录{deleted_minutes}条, 过期小时汇总{deleted_hours}条")
+        
+    def _write_batch(self, batch):
+        """在一个事务中提交一批写操作
+        
+        数据库被锁定(SQLITE_BUSY)时回滚并按指数退避重试；其他错误时回滚后逐条提交，
+        只放弃出错的写操作，不影响同一批次中的其他数据。
+        
+        参数:
+            batch (list): (写操作类型, 参数)元组的列表；逐条提交时已提交的写操作
+                会从列表中移除
+            
+        返回:
+            bool: 批次是否已处理完毕；重试后仍被锁定时返回False，由调用方保留批次
+        """
+        conn = self._writer_conn
+        cursor = conn.cursor()
+        delay = 0.05
+        
+        for attempt in range(1, self.BUSY_RETRY_ATTEMPTS + 1):
             try:
-                conn.rollback()  # 发生错误时回滚事务
-            except Exception as rollback_error:
-                logging.error(f"回滚事务失败: {rollback_error}")
+                for kind, payload in batch:
+                    self._apply_write(cursor, kind, payload)
+                conn.commit()
+                logging.debug(f"写缓冲已提交 {len(batch)} 条写操作")
+                return True
+            except sqlite3.OperationalError as e:
+                self._rollback(conn)
+                if not self._is_busy_error(e):
+                    logging.error(f"批量写入活动数据失败({len(batch)}条)，改为逐条写入: {e}")
+                    return self._write_each(batch)
+                logging.warning(f"数据库被锁定，{delay:.2f}秒后第{attempt}次重试写入({len(batch)}条): {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.BUSY_RETRY_MAX_DELAY)
+            except Exception as e:
+                self._rollback(conn)
+                logging.error(f"批量写入活动数据失败({len(batch)}条)，改为逐条写入: {e}")
+                return self._write_each(batch)
+                
+        logging.error(f"数据库持续被锁定，保留{len(batch)}条写操作稍后重试")
+        return False
+        
+    def _write_each(self, batch):
+        """每个写操作单独一个事务提交，放弃出错的写操作
+        
+        参数:
+            batch (list): (写操作类型, 参数)元组的列表，已处理的写操作会从列表中移除
+            
+        返回:
+            bool: 是否全部处理完毕；某条写操作重试后仍被锁定时返回False，列表中保留未处理的部分
+        """
+        if len(batch) == 1:
+            # 单条写操作已经出错过一次，直接放弃
+            logging.error(f"放弃写操作: {batch[0][0]}")
+            del batch[:]
+            return True
+        while batch:
+            if not self._write_batch(batch[:1]):
+                return False
+            del batch[0]
+        return True
+        
+    def _apply_write(self, cursor, kind, payload):
+        """在当前事务中执行一个写操作"""
+        if kind == "minute":
+            self._insert_minute_activity(cursor, *payload)
+        elif kind == "daily_total":
+            self._set_daily_total(cursor, *payload)
+        elif kind == "gap":
+            self._insert_gap(cursor, *payload)
+        elif kind == "rebuild":
+            self._rebuild_daily_summary(cursor, *payload)
+        elif kind == "backfill_hourly":
+            self._backfill_hourly_summary(cursor)
+        else:
+            logging.warning(f"未知的写操作类型: {kind}")
+            
+    @staticmethod
+    def _is_busy_error(error):
+        """判断异常是否为数据库被锁定(SQLITE_BUSY/SQLITE_LOCKED)"""
+        message = str(error).lower()
+        return "locked" in message or "busy" in message
+        
+    @staticmethod
+    def _rollback(conn):
+        """回滚当前事务，回滚失败时只记录日志"""
+        try:
+            conn.rollback()  # 发生错误时回滚事务
+        except Exception as rollback_error:
+            logging.error(f"回滚事务失败: {rollback_error}")
+                
+    def flush(self, timeout=None):
+        """立即提交写缓冲中的所有写操作并等待完成
+        
+        参数:
+            timeout (float, optional): 最长等待时间(秒)，默认一直等待
+            
+        返回:
+            bool: 写缓冲是否已在超时前提交
+        """
+        if self._closed or not self._writer_thread.is_alive():
             return False
+        done = threading.Event()
+        self._write_queue.put(("flush", done))
+        return done.wait(timeout)
             
     def update_daily_summary(self, date_str, total_minutes=None):
         """更新每日汇总数据
         
-        计算并更新指定日期的使用统计数据，包括总活跃分钟数和最长连续会话。
+        最长连续会话由record_minute_activity增量维护，这里不再重新计算。
         
         参数:
             date_str (str): 日期字符串 (YYYY-MM-DD)
-            total_minutes (int, optional): 如果提供，直接使用此值作为总使用分钟数
+            total_minutes (int, optional): 如果提供，直接使用此值作为总使用分钟数；
+                否则从minute_activity完整重建当日汇总
         """
         if total_minutes is not None:
-            # 如果提供了total_minutes参数，直接更新数据库
-            conn, cursor = self._get_connection()
-            try:
-                # 获取最长会话 - 这个我们仍然需要计算
-                cursor.execute("""
-                    SELECT COUNT(*) AS session_length
-                    FROM (
-                        SELECT 
-                            id,
-                            timestamp,
-                            is_active,
-                            (
-                                SELECT COUNT(*) 
-                                FROM minute_activity AS m2 
-                                WHERE m2.is_active = 0 AND m2.timestamp <= m1.timestamp
-                                AND m2.date = ?
-                            ) AS reset_group
-                        FROM minute_activity AS m1
-                        WHERE m1.date = ?
-                        AND m1.is_active = 1
-                    ) AS active_with_reset
-                    GROUP BY reset_group
-                    ORDER BY session_length DESC
-                    LIMIT 1
-                """, (date_str, date_str))
-                
-                result = cursor.fetchone()
-                longest_session = result[0] if result else 0
-                
-                # 更新或插入每日汇总记录
-                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                cursor.execute("""
-                    INSERT OR REPLACE INTO daily_summary 
-                    (date, total_active_minutes, longest_session, last_updated)
-                    VALUES (?, ?, ?, ?)
-                """, (date_str, total_minutes, longest_session, now))
-                
-                conn.commit()
-            except Exception as e:
-                logging.error(f"使用提供的总分钟数更新每日汇总失败: {e}")
-                try:
-                    conn.rollback()
-                except Exception as rollback_err:
-                    logging.error(f"回滚事务失败: {rollback_err}")
+            # 如果提供了total_minutes参数，经写缓冲覆盖总使用分钟数，保证与分钟记录的写入顺序一致
+            self._enqueue_write("daily_total", (date_str, total_minutes))
         else:
-            # 否则使用内部方法计算并更新
-            self._update_daily_summary(date_str)
+            # 否则走完整重建路径
+            self.rebuild_daily_summary(date_str)
+            
+    def _set_daily_total(self, cursor, date_str, total_minutes):
+        """覆盖指定日期的总使用分钟数，保留增量维护的会话状态(在写线程的事务中执行)
         
-    def _update_daily_summary(self, date_str):
-        """更新每日汇总数据
+        参数:
+            cursor: 数据库游标
+            date_str (str): 日期字符串 (YYYY-MM-DD)
+            total_minutes (int): 总使用分钟数
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cursor.execute("""
+            INSERT INTO daily_summary 
+            (date, total_active_minutes, longest_session, current_session, last_updated)
+            VALUES (?, ?, 0, 0, ?)
+            ON CONFLICT(date) DO UPDATE SET
+                total_active_minutes = excluded.total_active_minutes,
+                last_updated = excluded.last_updated
+        """, (date_str, total_minutes, now))
+        
+    def _update_daily_summary(self, cursor, date_str, is_active, minute_of_day, active_seconds):
+        """增量更新每日汇总数据
         
-        计算并更新指定日期的使用统计数据，包括总活跃分钟数和最长连续会话。
-        这是一个内部方法，在每次记录分钟活动后调用。
+        daily_summary中持久化了当前连续会话长度(current_session)，每记录当天最新的一分钟
+        只需O(1)地更新总活跃分钟数、当前会话和最长会话，不再扫描当日所有记录。
+        活动位图按主键读出180字节，修改对应的一位后随汇总一起写回。
+        这是一个内部方法，由写线程在写入分钟记录的同一事务中调用。
         
         参数:
+            cursor: 数据库游标
             date_str (str): 日期字符串 (YYYY-MM-DD)
+            is_active (bool): 新记录的分钟是否活跃
+            minute_of_day (int): 新记录是当天的第几分钟 (0-1439)
+            active_seconds (int): 新记录的分钟内有输入的秒数
         """
-        # 获取当前线程的连接
-        conn, cursor = self._get_connection()
+        active = 1 if is_active else 0
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        try:
-            # 获取当日活跃分钟总数 - 计算is_active=1的记录数
-            cursor.execute(
-                "SELECT COUNT(*) FROM minute_activity WHERE date = ? AND is_active = 1",
-                (date_str,)
-            )
-            active_minutes = cursor.fetchone()[0]
+        cursor.execute("SELECT activity_bitmap FROM daily_summary WHERE date = ?", (date_str,))
+        row = cursor.fetchone()
+        bitmap = activity_bitmap.set_minute(row[0] if row else None, minute_of_day, active)
+        
+        # UPDATE子句中引用的列均为更新前的旧值
+        cursor.execute("""
+            INSERT INTO daily_summary 
+            (date, total_active_minutes, longest_session, current_session, last_updated,
+             activity_bitmap, total_active_seconds)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(date) DO UPDATE SET
+                total_active_minutes = total_active_minutes + excluded.total_active_minutes,
+                total_active_seconds = total_active_seconds + excluded.total_active_seconds,
+                current_session = CASE WHEN ? THEN current_session + 1 ELSE 0 END,
+                longest_session = MAX(longest_session,
+                                      CASE WHEN ? THEN current_session + 1 ELSE 0 END),
+                last_updated = excluded.last_updated,
+                activity_bitmap = excluded.activity_bitmap
+        """, (date_str, active, active, active, now, bitmap, active_seconds, active, active))
+        
+    def rebuild_daily_summary(self, date_str):
+        """从minute_activity完整重建指定日期的汇总数据
+        
+        仅用于修复(如汇总表缺失或与明细不一致)，正常记录流程使用增量更新。
+        重建操作经写缓冲排在所有未提交的分钟记录之后执行，并等待其完成。
+        
+        参数:
+            date_str (str): 日期字符串 (YYYY-MM-DD)
             
-            # 计算最长会话 - 这是一个复杂查询，找出连续活跃记录的最长序列
-            cursor.execute("""
-                SELECT COUNT(*) AS session_length
-                FROM (
-                    SELECT 
-                        id,
-                        timestamp,
-                        is_active,
-                        (
-                            SELECT COUNT(*) 
-                            FROM minute_activity AS m2 
-                            WHERE m2.is_active = 0 AND m2.timestamp <= m1.timestamp
-                            AND m2.date = ?
-                        ) AS reset_group
-                    FROM minute_activity AS m1
-                    WHERE m1.date = ?
-                    AND m1.is_active = 1
-                ) AS active_with_reset
-                GROUP BY reset_group
-                ORDER BY session_length DESC
-                LIMIT 1
-            """, (date_str, date_str))
-            
-            result = cursor.fetchone()
-            longest_session = result[0] if result else 0
-            
-            # 更新或插入每日汇总记录
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cursor.execute("""
-                INSERT OR REPLACE INTO daily_summary 
-                (date, total_active_minutes, longest_session, last_updated)
-                VALUES (?, ?, ?, ?)
-            """, (date_str, active_minutes, longest_session, now))
+        返回:
+            bool: 重建是否已提交
+        """
+        if not self._enqueue_write("rebuild", (date_str,)):
+            return False
+        return self.flush()
+        
+    def _rebuild_daily_summary(self, cursor, date_str):
+        """按时间顺序线性扫描当日记录，重新计算总活跃分钟数、最长会话和当前会话
+        
+        参数:
+            cursor: 写连接的数据库游标
+            date_str (str): 日期字符串 (YYYY-MM-DD)
+        """
+        cursor.execute(self.DAY_REBUILD_SQL, day_minute_range(date_str))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        
+        flags = [row[1] for row in rows]
+        active_minutes, longest_session, current_session = self._summarize_sessions(flags)
+        bitmap = activity_bitmap.from_minutes(row[0] for row in rows if row[1])
+        active_seconds = sum(row[2] for row in rows)
+        
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cursor.execute("""
+            INSERT OR REPLACE INTO daily_summary 
+            (date, total_active_minutes, longest_session, current_session, last_updated,
+             activity_bitmap, total_active_seconds)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (date_str, active_minutes, longest_session, current_session, now, bitmap,
+              active_seconds))
+        logging.info(f"已重建每日汇总: {date_str}, 活跃{active_minutes}分钟, 最长会话{longest_session}分钟")
             
-            conn.commit()
-        except Exception as e:
-            logging.error(f"更新每日汇总失败: {e}")
-            try:
-                conn.rollback()  # 发生错误时回滚事务
-            except Exception as rollback_error:
-                logging.error(f"回滚事务失败: {rollback_error}")
+    def backfill_hourly_summary(self):
+        """从minute_activity重新生成仍有原始分钟记录的各小时汇总
+        
+        用于修复或为旧数据库补建汇总。操作经写缓冲在写线程中执行，并等待其完成。
+        
+        返回:
+            bool: 回填是否已提交
+        """
+        if not self._enqueue_write("backfill_hourly", ()):
+            return False
+        return self.flush()
+        
+    def _backfill_hourly_summary(self, cursor):
+        """按分钟键顺序流式扫描一遍minute_activity，重建hourly_summary
+        
+        只重建仍有原始分钟记录的小时: 最早的分钟记录之前的小时汇总是原始记录
+        过期删除后保留下来的唯一数据，保持不变。
+        
+        参数:
+            cursor: 写连接的数据库游标
+        """
+        cursor.execute("SELECT MIN(minute) FROM minute_activity")
+        first = cursor.fetchone()[0]
+        if first is None:
+            logging.info("没有分钟记录，跳过回填小时汇总")
+            return
+        cursor.execute("DELETE FROM hourly_summary WHERE hour >= ?", (first // 60,))
+        cursor.execute(
+            f"INSERT INTO hourly_summary ({self.HOURLY_ROLLUP_COLUMNS}) "
+            f"{self.HOURLY_ROLLUP_SELECT} GROUP BY minute / 60"
+        )
+        logging.info(f"已回填小时汇总: {cursor.rowcount}小时")
+        
+    @staticmethod
+    def _summarize_sessions(flags):
+        """线性扫描按时间排序的活跃标志，计算总活跃分钟数、最长会话和当前会话
+        
+        参数:
+            flags (list): 按时间排序的is_active值
             
+        返回:
+            tuple: (总活跃分钟数, 最长会话, 当前会话)
+        """
+        active_minutes = 0
+        longest_session = 0
+        current_session = 0
+        for is_active in flags:
+            if is_active:
+                active_minutes += 1
+                current_session += 1
+                longest_session = max(longest_session, current_session)
+            else:
+                current_session = 0
+        return active_minutes, longest_session, current_session
+        
     def get_day_activity(self, date=None):
         """获取指定日期的每小时活动数据
         
+        按主键读出当天180字节的活动位图，用位运算统计每小时的活跃分钟数
+        (activity_bitmap.hourly_counts)；位图为NULL的旧日期(迁移7之前原始记录已过期)
+        改为读取小时汇总表。
+        
         参数:
             date (str, optional): 日期字符串 (YYYY-MM-DD)，默认为今天
             
         返回:
             list: 包含24个元素的列表，每个元素表示对应小时的活跃分钟数
         """
-        # 获取当前线程的连接
-        conn, cursor = self._get_connection()
-        
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
             
@@ -319,16 +1426,18 @@ class DatabaseManager:
         hourly_data = [0] * 24
         
         try:
-            # 按小时分组统计活跃分钟数
-            cursor.execute("""
-                SELECT strftime('%H', time) AS hour, COUNT(*) 
-                FROM minute_activity 
-                WHERE date = ? AND is_active = 1
-                GROUP BY hour
-            """, (date,))
+            with self._read_connection() as cursor:
+                cursor.execute(self.BITMAPS_SQL, (date, date))
+                row = cursor.fetchone()
+                if row and row[1]:
+                    return activity_bitmap.hourly_counts(bytes(row[1]))
+                    
+                # 从小时汇总表读取当日最多24行
+                cursor.execute(self.DAY_ACTIVITY_SQL, day_hour_range(date))
+                rows = cursor.fetchall()
             
             # 填充结果数组
-            for row in cursor.fetchall():
+            for row in rows:
                 hour = int(row[0])  # 小时(0-23)
                 count = row[1]      # 该小时的活跃分钟数
                 hourly_data[hour] = count
@@ -338,6 +1447,33 @@ class DatabaseManager:
             logging.error(f"获取日活动数据失败: {e}")
             return hourly_data  # 返回空数组(全0)
             
+    def get_day_slots(self, date=None, resolution=60):
+        """获取指定日期按采样分辨率划分的活动数组
+        
+        一次主键范围查询读出当天有活跃采样点的分钟，每行按写入时的分辨率解码，
+        历史中修改过分辨率的日期同样适用(规则见minute_slots.decode_day)。
+        
+        参数:
+            date (str, optional): 日期字符串 (YYYY-MM-DD)，默认为今天
+            resolution (int): 目标分辨率(秒)，能整除一天的秒数即可，默认每分钟一个
+            
+        返回:
+            numpy.ndarray: 长度为86400 // resolution的布尔数组，查询失败时全为False
+        """
+        if date is None:
+            date = datetime.now().strftime("%Y-%m-%d")
+        if resolution <= 0 or minute_slots.SECONDS_PER_DAY % resolution:
+            raise ValueError(f"不支持的分辨率: {resolution}")
+            
+        try:
+            with self._read_connection() as cursor:
+                cursor.execute(self.DAY_SLOTS_SQL, day_minute_range(date))
+                rows = cursor.fetchall()
+        except Exception as e:
+            logging.error(f"获取日采样数据失败: {e}")
+            rows = []
+        return minute_slots.decode_day(rows, resolution)
+        
     def get_weekly_heatmap_data(self, end_date=None):
         """获取周热力图数据
         
@@ -356,19 +1492,121 @@ class DatabaseManager:
         # 计算开始日期(往前6天，总共获取7天数据)
         start_date = end_date - timedelta(days=6)
         
-        # 初始化结果字典
-        result = {}
-        current_date = start_date
+        # 一次范围查询取得7天的小时矩阵
+        matrix = self.get_activity_matrix(start_date, end_date, bucket="hour")
         
-        # 获取每一天的数据
-        while current_date <= end_date:
-            date_str = current_date.strftime("%Y-%m-%d")
-            # 调用get_day_activity获取该日的小时活动数据
-            result[date_str] = self.get_day_activity(date_str)
-            current_date += timedelta(days=1)
+        result = {}
+        for row_index, row in enumerate(matrix):
+            date_str = (start_date + timedelta(days=row_index)).strftime("%Y-%m-%d")
+            result[date_str] = row.tolist()
             
         return result
         
+    def get_activity_matrix(self, start, end, bucket="hour"):
+        """获取日期范围内的活跃分钟矩阵
+        
+        只执行一次主键范围查询并在SQL中按桶聚合，365天的范围也只返回
+        天数×桶数行，适合热力图和更长周期的视图直接使用。整小时的桶
+        直接读取hourly_summary，更细的桶读取minute_activity。
+        
+        参数:
+            start (str/datetime): 起始日期 (YYYY-MM-DD)，包含当天
+            end (str/datetime): 结束日期 (YYYY-MM-DD)，包含当天
+            bucket (str/int): 桶宽度，"hour"(24列)、"minute"(1440列)，
+                或能整除1440的分钟数
+                
+        返回:
+            numpy.ndarray: 形状为(天数, 每天桶数)的int32数组，第i行对应start之后第i天，
+                每个元素是该时间桶内的活跃分钟数；查询失败时返回全0数组
+        """
+        bucket_minutes = self.MATRIX_BUCKETS.get(bucket, bucket)
+        if not isinstance(bucket_minutes, int) or bucket_minutes <= 0 or 1440 % bucket_minutes:
+            raise ValueError(f"不支持的桶宽度: {bucket}")
+            
+        start_date = self._to_day(start)
+        end_date = self._to_day(end)
+        days = max(0, (end_date - start_date).days + 1)
+        buckets_per_day = 1440 // bucket_minutes
+        matrix = np.zeros((days, buckets_per_day), dtype=np.int32)
+        if days == 0:
+            return matrix
+            
+        start_key = to_minute_key(start_date)
+        end_key = start_key + days * 1440
+        if bucket_minutes % 60 == 0:
+            query = (self.HOURLY_MATRIX_SQL, (start_key // 60, end_key // 60, bucket_minutes // 60))
+        else:
+            query = (self.ACTIVITY_MATRIX_SQL, (start_key, end_key, bucket_minutes))
+        
+        try:
+            with self._read_connection() as cursor:
+                cursor.execute(*query)
+                rows = cursor.fetchall()
+        except Exception as e:
+            logging.error(f"获取活动矩阵失败: {e}")
+            return matrix
+            
+        if rows:
+            slots, counts = np.array(rows, dtype=np.int64).T
+            # 每天的桶数相同，按行展开后桶序号就是扁平索引
+            matrix.ravel()[slots] = counts
+        return matrix
+        
+    @staticmethod
+    def _to_day(value):
+        """将日期字符串或datetime规整为当天零点的datetime"""
+        if isinstance(value, str):
+            return datetime.strptime(value, "%Y-%m-%d")
+        return datetime(value.year, value.month, value.day)
+        
+    def get_activity_bitmaps(self, start, end):
+        """获取日期范围内每天的活动位图
+        
+        每天180字节，一年约65KB，可一次载入后用activity_bitmap模块分析。
+        
+        参数:
+            start (str/datetime): 起始日期 (YYYY-MM-DD)，包含当天
+            end (str/datetime): 结束日期 (YYYY-MM-DD)，包含当天
+            
+        返回:
+            dict: {日期字符串: 180字节位图}，只包含有汇总记录的日期
+        """
+        start_str = self._to_day(start).strftime("%Y-%m-%d")
+        end_str = self._to_day(end).strftime("%Y-%m-%d")
+        try:
+            with self._read_connection() as cursor:
+                cursor.execute(self.BITMAPS_SQL, (start_str, end_str))
+                return {date: bytes(bitmap) if bitmap else activity_bitmap.empty()
+                        for date, bitmap in cursor.fetchall()}
+        except Exception as e:
+            logging.error(f"获取活动位图失败: {e}")
+            return {}
+
+    def get_activity_gaps(self, start, end):
+        """获取与日期范围重叠的采样间断
+
+        参数:
+            start (str/datetime): 起始日期 (YYYY-MM-DD)，包含当天
+            end (str/datetime): 结束日期 (YYYY-MM-DD)，包含当天
+
+        返回:
+            list: (起点datetime, 终点datetime, 间断类型, 时间跳变秒数)元组的列表，按起点排序
+        """
+        range_start = to_minute_key(self._to_day(start))
+        range_end = to_minute_key(self._to_day(end) + timedelta(days=1))
+        try:
+            with self._read_connection() as cursor:
+                cursor.execute("""
+                    SELECT start_minute, end_minute, kind, jump_seconds FROM activity_gaps
+                    WHERE start_minute < ? AND end_minute > ?
+                    ORDER BY start_minute
+                """, (range_end, range_start))
+                return [(from_minute_key(gap_start), from_minute_key(gap_end), kind, jump)
+                        for gap_start, gap_end, kind, jump in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"获取采样间断失败: {e}")
+            return []
+
     def get_daily_summaries(self, days=30):
         """获取最近N天的汇总数据
         
@@ -378,31 +1616,130 @@ class DatabaseManager:
         返回:
             list: 包含(日期,总活跃分钟数,最长会话)元组的列表
         """
-        # 获取当前线程的连接
-        conn, cursor = self._get_connection()
+        try:
+            with self._read_connection() as cursor:
+                # 查询daily_summary表获取最近的记录
+                cursor.execute(self.DAILY_SUMMARIES_SQL, (days,))
+                
+                return cursor.fetchall()
+        except Exception as e:
+            logging.error(f"获取每日汇总失败: {e}")
+            return []
+            
+    def get_daily_total(self, date_str):
+        """按主键读取某一天的总活跃分钟数和活跃秒数
         
+        参数:
+            date_str (str): 日期字符串 (YYYY-MM-DD)
+            
+        返回:
+            tuple: (总活跃分钟数, 总活跃秒数)，没有汇总记录时为(0, 0)
+        """
         try:
-            # 查询daily_summary表获取最近的记录
-            cursor.execute("""
-                SELECT date, total_active_minutes, longest_session 
-                FROM daily_summary
-                ORDER BY date DESC
-                LIMIT ?
-            """, (days,))
+            with self._read_connection() as cursor:
+                cursor.execute(
+                    "SELECT total_active_minutes, total_active_seconds FROM daily_summary WHERE date = ?",
+                    (date_str,)
+                )
+                row = cursor.fetchone()
+                return tuple(row) if row else (0, 0)
+        except Exception as e:
+            logging.error(f"获取每日总计失败: {e}")
+            return (0, 0)
             
-            return cursor.fetchall()
+    def get_recent_minutes(self, end, minutes):
+        """获取end之前若干分钟内的分钟记录，按时间倒序
+        
+        主键范围倒序扫描，最多读取minutes行，耗时与历史数据量无关。
+        
+        参数:
+            end (datetime): 结束时间(不含)
+            minutes (int): 向前读取的分钟数
+            
+        返回:
+            list: (记录时间datetime, 是否活跃)元组的列表，最新的在前
+        """
+        end_key = to_minute_key(end)
+        try:
+            with self._read_connection() as cursor:
+                cursor.execute(self.RECENT_MINUTES_SQL, (end_key - minutes, end_key))
+                return [(from_minute_key(minute), bool(is_active))
+                        for minute, is_active in cursor.fetchall()]
         except Exception as e:
-            logging.error(f"获取每日汇总失败: {e}")
+            logging.error(f"获取最近分钟记录失败: {e}")
             return []
             
+    def iter_minutes(self, start=None, end=None, chunk_size=5000):
+        """流式读取分钟活动记录
+        
+        按分钟键顺序用fetchmany分块读取，内存占用只与chunk_size有关，
+        适合导出多年的历史数据。迭代期间会占用一个只读连接，迭代结束
+        或生成器被关闭时归还。
+        
+        参数:
+            start (str/datetime): 起始日期 (YYYY-MM-DD)，包含当天，None表示不限
+            end (str/datetime): 结束日期 (YYYY-MM-DD)，包含当天，None表示不限
+            chunk_size (int): 每次从数据库取出的行数
+            
+        生成:
+            tuple: (时间戳, 是否活跃, 鼠标移动次数, 按键次数, 活跃秒数, 鼠标移动距离, 鼠标点击次数,
+                按键间隔个数, 间隔均值, 间隔方差, 最长间隔, 采样位掩码, 采样分辨率)，
+                列名见MINUTE_EXPORT_COLUMNS
+        """
+        start_key = to_minute_key(self._to_day(start)) if start is not None else -(1 << 62)
+        end_key = (to_minute_key(self._to_day(end)) + 1440) if end is not None else 1 << 62
+        yield from self._iter_query(self.MINUTE_EXPORT_SQL, (start_key, end_key), chunk_size)
+        
+    def iter_daily_summaries(self, start=None, end=None, chunk_size=5000):
+        """流式读取每日汇总记录
+        
+        参数:
+            start (str/datetime): 起始日期 (YYYY-MM-DD)，包含当天，None表示不限
+            end (str/datetime): 结束日期 (YYYY-MM-DD)，包含当天，None表示不限
+            chunk_size (int): 每次从数据库取出的行数
+            
+        生成:
+            tuple: (日期, 总活跃分钟数, 总活跃秒数, 最长会话, 最后更新时间)，列名见DAILY_EXPORT_COLUMNS
+        """
+        start_str = self._to_day(start).strftime("%Y-%m-%d") if start is not None else ""
+        # 日期字符串按字典序比较，"9999"大于任何合法日期
+        end_str = ((self._to_day(end) + timedelta(days=1)).strftime("%Y-%m-%d")
+                   if end is not None else "9999")
+        yield from self._iter_query(self.DAILY_EXPORT_SQL, (start_str, end_str), chunk_size)
+        
+    def _iter_query(self, sql, params, chunk_size):
+        """在只读连接上执行查询并用fetchmany逐块生成结果行"""
+        with self._read_connection() as cursor:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+            
     def close(self):
         """关闭数据库连接
         
-        安全关闭数据库连接，应在程序退出前调用。
+        先提交写缓冲中尚未写入的数据并停止写线程，再关闭写连接和空闲的只读连接。
+        应在程序退出前调用，可重复调用。
         """
-        # 关闭当前线程的连接
-        if hasattr(self.local, 'conn') and self.local.conn is not None:
-            self.local.conn.close()
-            self.local.conn = None
-            self.local.cursor = None
-            logging.info(f"线程 {threading.get_ident()} 的数据库连接已关闭") 
\ No newline at end of file
+        if self._closed:
+            return
+        self._closed = True
+        
+        # 停止标记排在所有未处理写操作之后，写线程会先提交它们再退出
+        self._write_queue.put(("stop", None))
+        self._writer_thread.join(timeout=30)
+        if self._writer_thread.is_alive():
+            logging.error("等待数据库写线程退出超时，部分数据可能未写入")
+        else:
+            logging.info("数据库写缓冲已全部提交")
+            self._writer_conn.close()
+            
+        # 关闭空闲的只读连接
+        while True:
+            try:
+                self._reader_pool.get_nowait().close()
+            except queue.Empty:
+                break
+        logging.info("数据库连接已关闭")
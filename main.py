@@ -17,9 +17,11 @@ from datetime import datetime
 import config
 import log_manager
 from activity_monitor import ActivityMonitor
+from activity_sources import create_source
 from time_tracker import TimeTracker
 from notification import NotificationSystem
 from db_manager import DatabaseManager
+from state_checkpoint import StateCheckpoint
 from visualization import UsageVisualizer
 
 # 版本信息
@@ -40,6 +42,17 @@ from ui_monitor import MonitorWindow, set_tray_available
 # 设置UI模块中的系统托盘状态
 set_tray_available(TRAY_AVAILABLE)
 
+def create_db_manager():
+    """按当前配置创建数据库管理器"""
+    return DatabaseManager(
+        flush_interval=config.DB_FLUSH_INTERVAL,
+        flush_batch_size=config.DB_FLUSH_BATCH_SIZE,
+        busy_timeout=config.DB_BUSY_TIMEOUT,
+        reader_pool_size=config.DB_READER_POOL_SIZE,
+        raw_retention_days=config.RAW_RETENTION_DAYS,
+        hourly_retention_months=config.HOURLY_RETENTION_MONTHS
+    )
+
 class ComputerUsageMonitor:
     def __init__(self):
         """初始化电脑使用时间监控工具"""
@@ -111,13 +124,15 @@ class ComputerUsageMonitor:
         
         # 初始化组件
         log_manager.info("正在初始化系统组件...")
-        self.db_manager = DatabaseManager()  # 数据库管理器
+        self.db_manager = create_db_manager()  # 数据库管理器
         self.notification_system = NotificationSystem()  # 通知系统
-        self.activity_monitor = ActivityMonitor()  # 活动监控器
+        self.activity_monitor = ActivityMonitor(create_source(config.ACTIVITY_SOURCE))  # 活动监控器
         self.time_tracker = TimeTracker(  # 时间跟踪器
             self.activity_monitor, 
             self.notification_system,
-            self.db_manager  # 传入数据库管理器以记录活动
+            self.db_manager,  # 传入数据库管理器以记录活动
+            StateCheckpoint(os.path.join(os.path.dirname(self.db_manager.db_path),
+                                         config.CHECKPOINT_FILE))  # 实时状态检查点
         )
         self.visualizer = UsageVisualizer(  # 数据可视化器
             self.db_manager,
@@ -339,16 +354,22 @@ class ComputerUsageMonitor:
         
         # 停止时间跟踪
         if hasattr(self, 'time_tracker'):
-            self.time_tracker.stop()
+            try:
+                self.time_tracker.stop()
+            except Exception as e:
+                log_manager.error(f"停止时间跟踪失败: {e}")
             
         # 停止监视器窗口
         if hasattr(self, 'monitor_window'):
-            self.monitor_window.stop()
+            try:
+                self.monitor_window.stop()
+            except Exception as e:
+                log_manager.error(f"停止UI监视器窗口失败: {e}")
             
         # 等待所有线程完成
         time.sleep(1)
             
-        # 关闭数据库连接
+        # 提交写缓冲并关闭数据库连接(前面的步骤出错也必须执行，避免丢失未落盘的数据)
         if hasattr(self, 'db_manager'):
             self.db_manager.close()
             
@@ -364,6 +385,14 @@ def parse_arguments():
     parser.add_argument('--debug', action='store_true', help='启用调试模式')
     parser.add_argument('--report', action='store_true', help='生成并显示使用报告')
     parser.add_argument('--version', action='store_true', help='显示版本信息')
+    parser.add_argument('--backfill-rollups', action='store_true', help='从分钟记录重建小时汇总后退出')
+    parser.add_argument('--export', metavar='PATH', help='导出使用历史到文件后退出')
+    parser.add_argument('--export-table', choices=['minutes', 'daily'], default='minutes',
+                        help='导出的数据: minutes(分钟记录)或daily(每日汇总)，默认minutes')
+    parser.add_argument('--format', choices=['csv', 'jsonl', 'parquet'],
+                        help='导出格式，默认按文件扩展名推断')
+    parser.add_argument('--start', metavar='YYYY-MM-DD', help='导出的起始日期(包含)')
+    parser.add_argument('--end', metavar='YYYY-MM-DD', help='导出的结束日期(包含)')
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -379,6 +408,32 @@ if __name__ == "__main__":
     if args.debug:
         config.DEBUG = True
     
+    # 如果指定了回填参数，只重建汇总数据，不启动监控
+    if args.backfill_rollups:
+        log_manager.setup_logger(debug_mode=config.DEBUG)
+        db_manager = create_db_manager()
+        success = db_manager.backfill_hourly_summary()
+        db_manager.close()
+        print("小时汇总回填完成" if success else "小时汇总回填失败，请查看日志")
+        sys.exit(0 if success else 1)
+    
+    # 如果指定了导出参数，只导出历史数据，不启动监控
+    if args.export:
+        import data_export
+        log_manager.setup_logger(debug_mode=config.DEBUG)
+        db_manager = create_db_manager()
+        try:
+            count = data_export.export_history(db_manager, args.export, table=args.export_table,
+                                               fmt=args.format, start=args.start, end=args.end)
+            print(f"已导出{count}行到 {args.export}")
+        except Exception as e:
+            log_manager.error(f"导出使用历史失败: {e}")
+            print(f"导出失败: {e}")
+            sys.exit(1)
+        finally:
+            db_manager.close()
+        sys.exit(0)
+    
     # 创建监控器
     monitor = ComputerUsageMonitor()
     
@@ -0,0 +1,142 @@
+"""
+分钟内采样模块 - 支持比一分钟更细的活动采样分辨率
+
+本模块负责:
+1. 校验采样分辨率(秒)，分辨率必须能整除60
+2. 在一分钟内逐个采样点累积活动数据，分钟结束时合成一条分钟记录
+3. 将分钟记录中的采样位掩码解码为一天内任意分辨率的活动数组
+
+存储格式: 每分钟仍然只有一行minute_activity记录，slot_mask列的第i位表示这一分钟内
+第i个采样点是否活跃，resolution列记录写入时的分辨率(秒)。10秒分辨率每分钟只多一个
+6位整数，而不是每个采样点一行。每行自带分辨率，历史中途修改分辨率后各行仍能正确解码。
+分钟级的汇总(活跃分钟数、会话、小时汇总、每日位图)只取决于这一分钟是否有任何活跃的
+采样点，与分辨率无关。
+"""
+
+import numpy as np
+
+from typing_stats import TypingStats
+
+SECONDS_PER_MINUTE = 60
+SECONDS_PER_DAY = 24 * 3600
+
+# 支持的分辨率(秒)，均能整除60
+SUPPORTED_RESOLUTIONS = (5, 6, 10, 12, 15, 20, 30, 60)
+
+def normalize_resolution(value):
+    """校验采样分辨率
+
+    参数:
+        value: 配置的分辨率(秒)
+
+    返回:
+        int: 有效的分辨率，不受支持的值返回60
+    """
+    try:
+        resolution = int(value)
+    except (TypeError, ValueError):
+        return SECONDS_PER_MINUTE
+    return resolution if resolution in SUPPORTED_RESOLUTIONS else SECONDS_PER_MINUTE
+
+def full_mask(resolution):
+    """一分钟内全部采样点都活跃时的位掩码"""
+    return (1 << (SECONDS_PER_MINUTE // resolution)) - 1
+
+class MinuteSlots:
+    """在一分钟内累积各采样点的活动数据"""
+
+    def __init__(self, resolution):
+        """
+        参数:
+            resolution (int): 采样分辨率(秒)，应已经过normalize_resolution校验
+        """
+        self.resolution = resolution
+        self.slots = SECONDS_PER_MINUTE // resolution
+        self.clear()
+
+    def clear(self):
+        """清空累积的数据"""
+        self.minute = None  # 正在累积的整分钟datetime
+        self.mask = 0
+        self.mouse_moves = 0
+        self.key_presses = 0
+        self.active_seconds = 0
+        self.mouse_distance = 0
+        self.mouse_clicks = 0
+        self.typing = TypingStats()
+
+    def add(self, timestamp, activity_data):
+        """加入一个采样点
+
+        参数:
+            timestamp (datetime): 采样区间的起始时间
+            activity_data (dict): ActivityMonitor.check_activity_minute()的结果
+
+        返回:
+            bool: 这是否是该分钟的最后一个采样点
+        """
+        slot = timestamp.second // self.resolution
+        if self.minute is None:
+            self.minute = timestamp.replace(second=0, microsecond=0)
+        if activity_data["is_active"]:
+            self.mask |= 1 << slot
+        self.mouse_moves += activity_data["mouse_moves"]
+        self.key_presses += activity_data["key_presses"]
+        self.active_seconds += activity_data["active_seconds"]
+        self.mouse_distance += activity_data["mouse_distance"]
+        self.mouse_clicks += activity_data["mouse_clicks"]
+        self.typing.merge(activity_data["typing"])
+        return slot == self.slots - 1
+
+    def belongs(self, timestamp):
+        """采样点是否属于正在累积的分钟(没有累积任何采样点时也返回True)"""
+        return self.minute is None or timestamp.replace(second=0, microsecond=0) == self.minute
+
+    @property
+    def empty(self):
+        return self.minute is None
+
+    def take(self):
+        """取出累积的分钟数据并清空
+
+        返回:
+            tuple: (整分钟datetime, 与check_activity_minute()格式相同的字典，另含slot_mask)
+        """
+        minute = self.minute
+        data = {
+            "is_active": self.mask != 0,
+            "mouse_moves": self.mouse_moves,
+            "key_presses": self.key_presses,
+            "active_seconds": min(self.active_seconds, SECONDS_PER_MINUTE),
+            "mouse_distance": self.mouse_distance,
+            "mouse_clicks": self.mouse_clicks,
+            "typing": self.typing,
+            "slot_mask": self.mask,
+        }
+        self.clear()
+        return minute, data
+
+def decode_day(rows, resolution):
+    """将一天的分钟记录解码为指定分辨率的活动数组
+
+    先按各行自己的分辨率展开到逐秒的网格，再按目标分辨率分块:
+    块内任一秒被采样为活跃则该块活跃。目标分辨率比记录更粗时相当于取"或"，
+    与分钟记录的is_active一致；比记录更细时，一个活跃采样点覆盖的各块都视为活跃。
+
+    参数:
+        rows (list): (当天第几分钟, slot_mask, 记录的分辨率)元组的列表
+        resolution (int): 目标分辨率(秒)，应能整除一天的秒数
+
+    返回:
+        numpy.ndarray: 长度为86400 // resolution的布尔数组
+    """
+    seconds = np.zeros((SECONDS_PER_DAY // SECONDS_PER_MINUTE, SECONDS_PER_MINUTE), dtype=bool)
+    if rows:
+        data = np.array(rows, dtype=np.int64)
+        for stored in np.unique(data[:, 2]):
+            stored = int(stored)
+            selected = data[data[:, 2] == stored]
+            slots = SECONDS_PER_MINUTE // stored
+            bits = (selected[:, 1:2] >> np.arange(slots)) & 1
+            seconds[selected[:, 0]] = np.repeat(bits.astype(bool), stored, axis=1)
+    return seconds.reshape(-1, resolution).any(axis=1)
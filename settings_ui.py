@@ -6,6 +6,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import logging
 import config
+import minute_slots
 
 class SettingsWindow:
     def __init__(self, parent=None):
@@ -72,6 +73,15 @@ class SettingsWindow:
             1, 10
         )
         
+        # 采样分辨率，只能选择能整除60的值
+        self._add_choice_setting(
+            time_tab,
+            "采样分辨率(秒, 重启后生效):",
+            "TRACKING_RESOLUTION",
+            minute_slots.SUPPORTED_RESOLUTIONS,
+            minute_slots.normalize_resolution(config.TRACKING_RESOLUTION)
+        )
+        
         # 连续使用提醒时间
         self._add_number_setting(
             time_tab, 
@@ -249,6 +259,34 @@ class SettingsWindow:
         
         spinbox.pack(side=tk.RIGHT, padx=5)
         
+    def _add_choice_setting(self, parent, label_text, variable_name, choices, current_value):
+        """添加只能从给定数值中选择的设置控件
+        
+        参数:
+            parent: 父容器
+            label_text: 标签文本
+            variable_name: 配置键名
+            choices: 可选的整数值
+            current_value: 当前显示的值，应是choices之一
+        """
+        row_frame = ttk.Frame(parent)
+        row_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(row_frame, text=label_text).pack(side=tk.LEFT, padx=5)
+        
+        var = tk.IntVar(value=current_value)
+        self.settings_vars[variable_name] = var
+        
+        # 只读下拉框，不能输入列表之外的值
+        combobox = ttk.Combobox(
+            row_frame,
+            values=list(choices),
+            textvariable=var,
+            state="readonly",
+            width=8
+        )
+        combobox.pack(side=tk.RIGHT, padx=5)
+        
     def _add_text_setting(self, parent, label_text, config_key, is_multiline=False):
         """添加文本设置控件
         
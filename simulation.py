@@ -0,0 +1,228 @@
+"""
+模拟运行模块 - 在虚拟时钟上用预设的活动轨迹驱动时间跟踪
+
+TimeTracker、ActivityMonitor和DatabaseManager按正常流程工作，只是时钟换成
+VirtualClock: 每个节拍之前把轨迹中这一分钟的输入事件按秒注入活动监控器，
+节拍的等待直接把虚拟时间拨到下一个整分钟。一个月的活动几秒内即可回放完毕，
+用于检验提醒阈值、日期变更和不活跃重置等配置，以及按真实的写入节奏压测存储层。
+
+活动轨迹可以是内置的合成工作日模式，也可以是data_export导出的分钟记录CSV
+(--export-table minutes --format csv)。
+
+用法:
+    python simulation.py [--days 30] [--start 2026-09-01] [--trace minutes.csv]
+                         [--db /tmp/sim.db] [--alert 45] [--reset 10] [--interval 3]
+"""
+
+import argparse
+import csv
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import config
+from activity_monitor import ActivityMonitor
+from activity_sources import ScriptedSource
+from clock import VirtualClock
+from db_manager import DatabaseManager
+from time_tracker import TimeTracker
+
+# 可以在模拟时覆盖的配置项: 命令行参数名 -> config中的属性名
+CONFIG_OVERRIDES = {
+    "alert": "CONTINUOUS_USAGE_ALERT",
+    "reset": "INACTIVITY_RESET",
+    "interval": "CONTINUOUS_NOTIFICATION_INTERVAL",
+}
+
+class RecordingNotifier:
+    """只记录不显示的通知系统，记下每条通知的虚拟时间和标题"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.sent = []
+
+    def send_notification(self, title, message, timeout=10):
+        self.sent.append((self.clock.now(), title))
+        return True
+
+def synthetic_trace(start, days, seed=0):
+    """生成合成的工作日活动轨迹
+
+    工作日上午、下午各一段工作时间，晚上有一半的概率再用一会儿；周末只有零星使用。
+    每段工作时间由15-90分钟的连续使用和短休息(不足以重置)或长休息交替组成。
+
+    参数:
+        start (datetime): 起始日期
+        days (int): 天数
+        seed (int): 随机种子，相同的种子生成相同的轨迹
+
+    返回:
+        generator: 按时间顺序生成(整分钟datetime, 活跃秒数, 鼠标移动次数, 按键次数)
+    """
+    rng = random.Random(seed)
+    first_day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    for day_index in range(days):
+        day = first_day + timedelta(days=day_index)
+        if day.weekday() < 5:
+            blocks = [(9 * 60, 12 * 60), (13 * 60 + 30, 18 * 60)]
+            if rng.random() < 0.5:
+                blocks.append((20 * 60, 22 * 60))
+        else:
+            blocks = [(10 * 60, 12 * 60)] if rng.random() < 0.5 else []
+        for block_start, block_end in blocks:
+            minute = block_start + rng.randint(0, 15)
+            while minute < block_end:
+                run = rng.randint(15, 90)
+                for offset in range(min(run, block_end - minute)):
+                    yield (day + timedelta(minutes=minute + offset), rng.randint(20, 60),
+                           rng.randint(10, 300), rng.randint(0, 200))
+                minute += run
+                minute += rng.randint(1, 5) if rng.random() < 0.6 else rng.randint(10, 20)
+
+def load_trace(path):
+    """读取data_export导出的分钟记录CSV作为活动轨迹
+
+    参数:
+        path (str): CSV文件路径
+
+    返回:
+        generator: 按文件顺序生成(整分钟datetime, 活跃秒数, 鼠标移动次数, 按键次数)，
+            跳过没有输入的分钟
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            moves = int(row["mouse_moves"])
+            keys = int(row["key_presses"])
+            if not int(row["is_active"]) and not (moves or keys):
+                continue
+            seconds = int(row.get("active_seconds") or 0) or 60
+            yield datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S"), seconds, moves, keys
+
+def _inject_minute(monitor, base, active_seconds, mouse_moves, key_presses):
+    """把一分钟的活动按活跃秒数均匀分散上报给活动监控器
+
+    参数:
+        monitor (ActivityMonitor): 活动监控器
+        base (float): 这一分钟开始时的单调时钟时间
+        active_seconds (int): 有输入的秒数
+        mouse_moves (int): 鼠标移动次数
+        key_presses (int): 按键次数
+    """
+    seconds = max(1, min(60, active_seconds))
+    for i in range(seconds):
+        moves = mouse_moves * (i + 1) // seconds - mouse_moves * i // seconds
+        keys = key_presses * (i + 1) // seconds - key_presses * i // seconds
+        timestamp = base + i * 60 // seconds
+        # 跟踪器只把位置发生变化的鼠标移动算作活动，每次上报一个新位置
+        monitor.add_events(mouse_moves=moves, key_presses=keys,
+                           other_events=0 if moves or keys else 1,
+                           position=(int(timestamp), 0) if moves else None,
+                           timestamp=timestamp)
+
+def simulate(trace, start, days, db_path=None, overrides=None):
+    """在虚拟时钟上回放活动轨迹
+
+    参数:
+        trace (iterable): 按时间顺序的(整分钟datetime, 活跃秒数, 鼠标移动次数, 按键次数)
+        start (datetime): 模拟起始时间，取整到分钟
+        days (int): 模拟天数
+        db_path (str, optional): 数据库文件的绝对路径，为None时不写数据库
+        overrides (dict, optional): 模拟期间临时覆盖的配置，{config属性名: 值}
+
+    返回:
+        dict: ticks(节拍数)、elapsed(实际耗时秒数)、usage_alerts / continuous_notifications
+            (两种提醒的次数)、notifications((虚拟时间, 标题)列表)、
+            daily((日期, 活跃分钟数, 最长会话)列表，不写数据库时最长会话为None)
+    """
+    start = start.replace(second=0, microsecond=0)
+    end = start + timedelta(days=days)
+    saved_config = {name: getattr(config, name) for name in (overrides or {})}
+    for name, value in (overrides or {}).items():
+        setattr(config, name, value)
+
+    clock = VirtualClock(start)
+    monitor = ActivityMonitor(ScriptedSource(), clock)
+    notifier = RecordingNotifier(clock)
+    db_manager = DatabaseManager(db_path) if db_path else None
+    tracker = TimeTracker(monitor, notifier, db_manager, clock=clock)
+
+    began = time.perf_counter()
+    ticks = 0
+    try:
+        trace = iter(trace)
+        pending = next(trace, None)
+        while clock.now() < end:
+            minute = clock.now()
+            while pending is not None and pending[0] < minute:
+                pending = next(trace, None)
+            if pending is not None and pending[0] == minute:
+                _inject_minute(monitor, clock.monotonic(), *pending[1:])
+                pending = next(trace, None)
+            tracker.step()
+            ticks += 1
+
+        # 与停止跟踪时一样结算最后一天
+        with tracker.lock:
+            tracker._save_daily_usage()
+        if db_manager:
+            db_manager.flush()
+            daily = sorted(db_manager.get_daily_summaries(days + 1))
+        else:
+            daily = [(date, minutes, None) for date, minutes in sorted(tracker.usage_log.items())]
+    finally:
+        if db_manager:
+            db_manager.close()
+        for name, value in saved_config.items():
+            setattr(config, name, value)
+
+    return {
+        "ticks": ticks,
+        "elapsed": time.perf_counter() - began,
+        "usage_alerts": sum(1 for _, title in notifier.sent if title == config.NOTIFICATION_TITLE),
+        "continuous_notifications": sum(1 for _, title in notifier.sent
+                                        if title == config.CONTINUOUS_NOTIFICATION_TITLE),
+        "notifications": notifier.sent,
+        "daily": daily,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在虚拟时钟上回放活动轨迹")
+    parser.add_argument('--days', type=int, default=30, help='模拟天数')
+    parser.add_argument('--start', help='起始日期 (YYYY-MM-DD)，默认为days天前')
+    parser.add_argument('--trace', help='data_export导出的分钟记录CSV，默认使用合成轨迹')
+    parser.add_argument('--seed', type=int, default=0, help='合成轨迹的随机种子')
+    parser.add_argument('--db', help='写入的数据库文件，默认在临时目录中新建')
+    parser.add_argument('--no-db', action='store_true', help='不写数据库')
+    parser.add_argument('--alert', type=int, help='覆盖CONTINUOUS_USAGE_ALERT(分钟)')
+    parser.add_argument('--reset', type=int, help='覆盖INACTIVITY_RESET(分钟)')
+    parser.add_argument('--interval', type=int, help='覆盖CONTINUOUS_NOTIFICATION_INTERVAL(分钟)')
+    parser.add_argument('--verbose', action='store_true', help='输出跟踪器的日志(默认只输出错误)')
+    args = parser.parse_args()
+
+    if args.start:
+        start = datetime.strptime(args.start, "%Y-%m-%d")
+    else:
+        start = (datetime.now() - timedelta(days=args.days)).replace(hour=0, minute=0)
+    trace = load_trace(args.trace) if args.trace else synthetic_trace(start, args.days, args.seed)
+    db_path = None
+    if not args.no_db:
+        db_path = os.path.abspath(args.db or os.path.join(tempfile.mkdtemp(), "simulation.db"))
+    overrides = {name: getattr(args, option) for option, name in CONFIG_OVERRIDES.items()
+                 if getattr(args, option) is not None}
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    result = simulate(trace, start, args.days, db_path, overrides)
+    logging.disable(logging.NOTSET)
+
+    print(f"模拟{args.days}天: {result['ticks']}个节拍, 耗时{result['elapsed']:.2f}秒 "
+          f"({result['ticks'] / result['elapsed']:.0f}节拍/秒)")
+    if db_path:
+        print(f"数据库: {db_path}")
+    print(f"休息提醒{result['usage_alerts']}次, 持续工作提醒{result['continuous_notifications']}次")
+    for date, minutes, longest in result["daily"]:
+        longest_text = "" if longest is None else f", 最长连续{longest}分钟"
+        print(f"  {date}: 活跃{minutes}分钟{longest_text}")
@@ -0,0 +1,174 @@
+"""
+状态检查点模块 - 用内存映射文件保存时间跟踪器的实时状态
+
+本模块负责:
+1. 定义固定布局的检查点记录(魔数、版本、序号、CRC32校验和各项计数器)
+2. 每个节拍通过mmap原地写入，不经过SQLite写线程，一次写入只需几微秒
+3. 启动时读取并校验检查点，程序崩溃或被强制结束后按原状态继续
+
+文件中有两个槽位轮流写入: 写到一半被中断的槽位校验失败，另一个槽位仍是完整的
+上一次状态，读取时取校验通过且序号最大的槽位。进程崩溃时已写入映射的数据由
+操作系统写回文件，因此每个节拍不调用flush，只在正常退出时flush一次。
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import namedtuple
+
+MAGIC = b"UMCK"
+VERSION = 1
+
+# 检查点中保存的状态
+CheckpointState = namedtuple("CheckpointState", [
+    "saved_at",                         # 写入时的系统时间(自纪元起的秒数)
+    "date",                             # 当前统计日期 (YYYY-MM-DD)
+    "continuous_usage_minutes",
+    "inactive_minutes",
+    "daily_usage_minutes",
+    "daily_active_seconds",
+    "continuous_notification_active",
+    "last_notification_time",
+])
+
+# 槽位布局(小端): 魔数、版本、序号、保存时间、日期、四个计数器、通知开关、上次通知时间，
+# 之后是前面所有字节的CRC32
+_BODY = struct.Struct("<4sHxxQd10sxxiiiiBxxxi")
+_CRC = struct.Struct("<I")
+SLOT_SIZE = _BODY.size + _CRC.size
+FILE_SIZE = 2 * SLOT_SIZE
+
+class StateCheckpoint:
+    """双槽位的内存映射检查点文件"""
+
+    def __init__(self, path):
+        """打开(必要时创建)检查点文件并建立内存映射
+
+        打开失败时只记录日志，之后的读写都不做任何操作。
+
+        参数:
+            path (str): 检查点文件路径
+        """
+        self.path = path
+        self._file = None
+        self._map = None
+        self._sequence = 0
+        # 序号递增、槽位写入和关闭映射互斥，并发的两次写入不会落在同一个槽位
+        self._lock = threading.Lock()
+        try:
+            self._open()
+        except Exception as e:
+            logging.error(f"打开状态检查点文件失败({path}): {e}")
+            self.close()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        mode = "r+b" if os.path.exists(self.path) else "w+b"
+        self._file = open(self.path, mode)
+        self._file.seek(0, os.SEEK_END)
+        if self._file.tell() != FILE_SIZE:
+            # 新文件或旧版本布局: 调整为当前大小，旧内容会在读取时校验失败
+            self._file.truncate(FILE_SIZE)
+            self._file.flush()
+        self._map = mmap.mmap(self._file.fileno(), FILE_SIZE)
+        latest = self._read_latest()
+        if latest:
+            self._sequence = latest[0]
+
+    @property
+    def available(self):
+        """检查点文件是否可用"""
+        return self._map is not None
+
+    def _read_slot(self, index):
+        """读取并校验一个槽位，返回(序号, CheckpointState)，无效时返回None"""
+        offset = index * SLOT_SIZE
+        body = self._map[offset:offset + _BODY.size]
+        (crc,) = _CRC.unpack_from(self._map, offset + _BODY.size)
+        if zlib.crc32(body) != crc:
+            return None
+        (magic, version, sequence, saved_at, date, continuous, inactive, daily_minutes,
+         daily_seconds, notification_active, last_notification) = _BODY.unpack(body)
+        if magic != MAGIC or version != VERSION or sequence == 0:
+            return None
+        state = CheckpointState(saved_at, date.decode("ascii"), continuous, inactive,
+                                daily_minutes, daily_seconds, bool(notification_active),
+                                last_notification)
+        return sequence, state
+
+    def _read_latest(self):
+        slots = [slot for slot in (self._read_slot(0), self._read_slot(1)) if slot]
+        return max(slots, key=lambda slot: slot[0]) if slots else None
+
+    def load(self):
+        """读取最近一次完整写入的状态
+
+        返回:
+            CheckpointState: 校验通过的最新状态，没有有效检查点时返回None
+        """
+        with self._lock:
+            if self._map is None:
+                return None
+            try:
+                latest = self._read_latest()
+            except Exception as e:
+                logging.error(f"读取状态检查点失败: {e}")
+                return None
+        return latest[1] if latest else None
+
+    def save(self, state):
+        """将状态写入下一个槽位
+
+        参数:
+            state (CheckpointState): 要保存的状态
+
+        返回:
+            bool: 是否已写入
+        """
+        with self._lock:
+            if self._map is None:
+                return False
+            try:
+                sequence = self._sequence + 1
+                body = _BODY.pack(
+                    MAGIC, VERSION, sequence, state.saved_at, state.date.encode("ascii"),
+                    state.continuous_usage_minutes, state.inactive_minutes,
+                    state.daily_usage_minutes, state.daily_active_seconds,
+                    1 if state.continuous_notification_active else 0, state.last_notification_time
+                )
+                offset = (sequence % 2) * SLOT_SIZE
+                self._map[offset:offset + _BODY.size] = body
+                _CRC.pack_into(self._map, offset + _BODY.size, zlib.crc32(body))
+                self._sequence = sequence
+                return True
+            except Exception as e:
+                logging.error(f"写入状态检查点失败: {e}")
+                return False
+
+    def flush(self):
+        """将映射的内容同步到磁盘"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._map is not None:
+            try:
+                self._map.flush()
+            except Exception as e:
+                logging.error(f"同步状态检查点失败: {e}")
+
+    def close(self):
+        """同步并关闭检查点文件"""
+        with self._lock:
+            self._flush()
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,163 @@
+"""
+定时调度模块 - 按整分钟边界产生无漂移的定时节拍
+
+本模块负责:
+1. 将第一个节拍对齐到系统时间的整分钟(或整间隔)边界
+2. 之后的截止时间在单调时钟上按固定间隔累加，处理耗时不会累积成漂移
+3. 统计每个节拍相对截止时间的延迟(抖动)
+4. 发现因系统睡眠、长时间停顿等原因错过的节拍，并如实报告错过的个数
+5. 比较单调时钟和系统时间的走时，发现睡眠/唤醒和系统时间跳变造成的间断
+
+time.sleep(间隔)的写法每一轮都会多出处理耗时，节拍落在任意秒上，
+分钟时间戳会慢慢漂移，偶尔两个采样落在同一分钟。
+
+Linux睡眠期间单调时钟停止计时，唤醒后节拍按单调时钟"准时"触发，但系统时间已经
+过去了几个小时；Windows的单调时钟在睡眠期间继续计时，唤醒后表现为节拍大幅延迟。
+每个节拍只需比较一次两个时钟的增量(O(1))就能区分这几种情况，发现间断后以系统
+时间为准重新对齐，并把间断作为一个Gap报告给调用方。
+"""
+
+import math
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from clock import SYSTEM_CLOCK
+
+# 一个节拍: timestamp为本节拍所统计区间的起始时间(整分钟)，missed为本节拍之前
+# 错过的节拍数，lateness为实际触发时间比截止时间晚了多少秒，gap为本节拍之前
+# 检测到的间断(没有间断时为None)
+Tick = namedtuple("Tick", ["timestamp", "missed", "lateness", "gap"])
+
+# 一次间断: [start, end)期间没有采样(整间隔边界)，kind为间断类型，
+# jump为系统时间相对单调时钟多走(正)或少走(负)的秒数
+Gap = namedtuple("Gap", ["start", "end", "kind", "jump"])
+
+# 间断类型
+GAP_SUSPEND = "suspend"        # 系统时间比单调时钟多走: Linux睡眠唤醒或系统时间被调快
+GAP_STALL = "stall"            # 单调时钟延迟超过一个间隔: Windows睡眠唤醒或程序长时间停顿
+GAP_CLOCK_BACK = "clock_back"  # 系统时间比单调时钟少走: 系统时间被调慢
+
+class TickScheduler:
+    """按固定间隔、对齐到整间隔边界的节拍调度器"""
+
+    # 两个时钟的增量相差超过该值(秒)视为时间跳变，NTP的微调远小于此
+    JUMP_TOLERANCE = 5.0
+
+    def __init__(self, interval=60.0, clock=None):
+        """初始化调度器
+
+        参数:
+            interval (float): 节拍间隔(秒)，应能整除一天，默认一分钟
+            clock (SystemClock/VirtualClock, optional): 时钟，默认为系统时钟
+        """
+        self.interval = float(interval)
+        self.clock = clock or SYSTEM_CLOCK
+        self._deadline = None       # 下一个节拍的单调时钟截止时间
+        self._boundary = None       # 下一个节拍对应的系统时间边界(自纪元起的秒数)
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """清空抖动统计"""
+        with self._stats_lock:
+            self._ticks = 0
+            self._missed = 0
+            self._lateness_total = 0.0
+            self._lateness_max = 0.0
+            self._last_lateness = 0.0
+            self._gaps = 0
+
+    def _align(self):
+        """以当前系统时间为准，将下一个截止时间对齐到下一个整间隔边界"""
+        wall = self.clock.time()
+        self._boundary = (math.floor(wall / self.interval) + 1) * self.interval
+        self._deadline = self.clock.monotonic() + (self._boundary - wall)
+
+    def wait(self, stop_event=None):
+        """等待下一个节拍
+
+        参数:
+            stop_event (threading.Event, optional): 等待期间被设置时立即返回None
+
+        返回:
+            Tick: 本次节拍，stop_event被设置时返回None
+        """
+        if self._deadline is None:
+            self._align()
+
+        clock = self.clock
+        while True:
+            remaining = self._deadline - clock.monotonic()
+            if remaining <= 0:
+                break
+            if clock.wait(stop_event, remaining):
+                return None
+
+        monotonic_now = clock.monotonic()
+        wall_now = clock.time()
+        lateness = monotonic_now - self._deadline
+        # 没有间断时，系统时间应当恰好比边界晚lateness秒
+        jump = wall_now - (self._boundary + lateness)
+        if lateness >= self.interval or abs(jump) > self.JUMP_TOLERANCE:
+            return self._resync(monotonic_now, wall_now, lateness, jump)
+
+        start = datetime.fromtimestamp(self._boundary) - timedelta(seconds=self.interval)
+        self._deadline += self.interval
+        self._boundary += self.interval
+        self._record(lateness, 0, False)
+        return Tick(start, 0, lateness, None)
+
+    def _resync(self, monotonic_now, wall_now, lateness, jump):
+        """发生间断后以系统时间为准重新对齐，返回带Gap的节拍
+
+        本节拍统计刚过去的那个整间隔；原本待统计的区间起点到该间隔起点之间
+        没有采样，作为间断报告。间断前积累的少量活动计入本节拍。
+        """
+        if jump > self.JUMP_TOLERANCE:
+            kind = GAP_SUSPEND
+        elif jump < -self.JUMP_TOLERANCE:
+            kind = GAP_CLOCK_BACK
+        else:
+            kind = GAP_STALL
+
+        pending_start = self._boundary - self.interval
+        boundary = math.floor(wall_now / self.interval) * self.interval
+        start = boundary - self.interval
+        # 系统时间被调慢时间断长度为负，不算错过节拍
+        missed = max(0, int(round((start - pending_start) / self.interval)))
+        gap = Gap(datetime.fromtimestamp(pending_start),
+                  datetime.fromtimestamp(max(start, pending_start)), kind, jump)
+
+        lateness = wall_now - boundary
+        self._boundary = boundary + self.interval
+        self._deadline = monotonic_now + (self._boundary - wall_now)
+        self._record(lateness, missed, True)
+        return Tick(datetime.fromtimestamp(start), missed, lateness, gap)
+
+    def _record(self, lateness, missed, gap):
+        with self._stats_lock:
+            self._ticks += 1
+            self._missed += missed
+            self._gaps += gap
+            self._lateness_total += lateness
+            self._lateness_max = max(self._lateness_max, lateness)
+            self._last_lateness = lateness
+
+    def get_stats(self):
+        """获取节拍抖动统计
+
+        返回:
+            dict: ticks(节拍数)、missed(错过的节拍数)、gaps(检测到的间断次数)、
+                mean_lateness_ms / max_lateness_ms /
+                last_lateness_ms(触发时间相对截止时间的平均、最大、最近一次延迟，毫秒)
+        """
+        with self._stats_lock:
+            mean = self._lateness_total / self._ticks if self._ticks else 0.0
+            return {
+                "ticks": self._ticks,
+                "missed": self._missed,
+                "gaps": self._gaps,
+                "mean_lateness_ms": mean * 1000,
+                "max_lateness_ms": self._lateness_max * 1000,
+                "last_lateness_ms": self._last_lateness * 1000
+            }
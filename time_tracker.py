@@ -2,33 +2,61 @@
 时间跟踪模块 - 负责统计活动时间并触发相应事件
 """
 
-import time
 import threading
-from datetime import datetime
+import time
 import config
 import log_manager
+from tick_scheduler import TickScheduler
+from clock import SYSTEM_CLOCK
+from state_checkpoint import CheckpointState
+from alert_engine import AlertEngine, CONTINUOUS, DAILY
+from minute_slots import MinuteSlots, normalize_resolution
 
 class TimeTracker:
-    def __init__(self, activity_monitor, notification_system, db_manager=None):
-        """初始化时间跟踪器"""
+    # 启动恢复时最多向前读取的分钟记录数，连续使用时间按此上限计算
+    RESTORE_WINDOW_MINUTES = 24 * 60
+    # 启动时从每日汇总恢复到usage_log的天数
+    USAGE_LOG_DAYS = 30
+    
+    def __init__(self, activity_monitor, notification_system, db_manager=None, checkpoint=None,
+                 clock=None):
+        """初始化时间跟踪器
+        
+        clock用于注入虚拟时钟(见clock和simulation模块)，默认为系统时钟。
+        """
+        self.clock = clock or SYSTEM_CLOCK
         self.activity_monitor = activity_monitor
         self.notification_system = notification_system
         self.db_manager = db_manager  # 数据库管理器
+        self.checkpoint = checkpoint  # 状态检查点(StateCheckpoint)，每个节拍写入一次
         self.continuous_usage_minutes = 0
         self.inactive_minutes = 0
         self.running = False
         self.lock = threading.Lock()
         self.thread = None
+        self._stop_event = threading.Event()
+        # 采样分辨率小于一分钟时每个采样点一个节拍，分钟内的采样点累积成一条分钟记录；
+        # 否则每ACTIVITY_CHECK_INTERVAL分钟一个节拍
+        self.resolution = normalize_resolution(config.TRACKING_RESOLUTION)
+        if self.resolution != config.TRACKING_RESOLUTION:
+            log_manager.warning(f"不支持的采样分辨率{config.TRACKING_RESOLUTION}秒，改用{self.resolution}秒")
+        if self.resolution < 60:
+            self.scheduler = TickScheduler(self.resolution, self.clock)
+            self._slots = MinuteSlots(self.resolution)
+        else:
+            self.scheduler = TickScheduler(config.ACTIVITY_CHECK_INTERVAL * 60, self.clock)
+            self._slots = None
+        self._last_input_stats = None  # 上次输出的输入事件统计，用于计算每小时的增量
         self.daily_usage_minutes = 0
+        self.daily_active_seconds = 0  # 今日实际有输入的秒数，比活跃分钟数更精确
         self.usage_log = {}  # 格式: {日期: 使用分钟数}
         # 在初始化时获取当前日期
-        self.today = datetime.now().strftime("%Y-%m-%d")
-        # 上次检查的日期，用于确保日期变更检测的可靠性
-        self.last_check_date = self.today
+        self.today = self.clock.now().strftime("%Y-%m-%d")
         
-        # 连续通知相关属性
-        self.continuous_notification_active = False  # 是否当前启用了连续通知
-        self.last_notification_time = 0  # 上次发送通知的时间点（分钟）
+        # 提醒规则引擎，规则在此编译一次，设置变更后由reload_alert_rules重新编译
+        self.alert_engine = AlertEngine()
+        self.continuous_notification_active = False  # 本次连续使用是否已发送过提醒
+        self.last_notification_time = 0  # 上次发送连续使用提醒时的连续使用分钟数
         
         log_manager.info("时间跟踪器初始化完成")
         
@@ -38,141 +66,371 @@ class TimeTracker:
             return
             
         self.running = True
+        self._stop_event.clear()
         # 确保启动时获取最新日期
-        self.today = datetime.now().strftime("%Y-%m-%d")
-        self.last_check_date = self.today
+        self.today = self.clock.now().strftime("%Y-%m-%d")
+        self._restore_state()
+        self._resume_from_checkpoint()
         self.activity_monitor.start()
         self.thread = threading.Thread(target=self._tracking_loop)
         self.thread.daemon = True
         self.thread.start()
         log_manager.info("时间跟踪已启动")
         
+    def _restore_state(self):
+        """从数据库恢复今日使用时间和当前连续使用状态
+        
+        今日总计按主键读取daily_summary，连续使用和不活跃时间由最近
+        RESTORE_WINDOW_MINUTES分钟的记录倒序重放得到，读取量有上限，
+        与数据库中的历史数据量无关。
+        """
+        if not self.db_manager:
+            return
+        begin = time.perf_counter()
+        try:
+            end = self.clock.now().replace(second=0, microsecond=0)
+            total_minutes, total_seconds = self.db_manager.get_daily_total(self.today)
+            recent = self.db_manager.get_recent_minutes(end, self.RESTORE_WINDOW_MINUTES)
+            usage_log = {date: minutes for date, minutes, _ in
+                         self.db_manager.get_daily_summaries(self.USAGE_LOG_DAYS)}
+        except Exception as e:
+            log_manager.error(f"从数据库恢复使用状态失败: {e}")
+            return
+        continuous, inactive = self._replay_recent_minutes(end, recent)
+        
+        with self.lock:
+            self.usage_log.update(usage_log)
+            self.daily_usage_minutes = total_minutes
+            self.daily_active_seconds = total_seconds
+            self.continuous_usage_minutes = continuous
+            self.inactive_minutes = inactive
+            # 已越过的提醒阈值视为已提醒，从下一个阈值继续
+            self.alert_engine.sync(continuous, total_minutes)
+            if self.alert_engine.exceeded(CONTINUOUS, continuous):
+                self.continuous_notification_active = True
+                self.last_notification_time = continuous
+        
+        elapsed = (time.perf_counter() - begin) * 1000
+        log_manager.info(
+            f"已从数据库恢复使用状态: 今日{total_minutes}分钟, 连续使用{continuous}分钟, "
+            f"不活跃{inactive}分钟, 耗时{elapsed:.1f}毫秒"
+        )
+        
+    def _resume_from_checkpoint(self):
+        """从状态检查点恢复上次运行的实时状态
+        
+        检查点每个节拍写入一次，比数据库(写缓冲最多滞留DB_FLUSH_INTERVAL秒)
+        更新，并且保存了通知状态，因此有效时覆盖_restore_state的结果。
+        停机期间按不活跃计入，超过INACTIVITY_RESET时连续使用计时随之重置。
+        每日统计只在检查点属于今天时恢复。
+        """
+        if not self.checkpoint:
+            return
+        state = self.checkpoint.load()
+        if state is None:
+            return
+        interval = max(self.scheduler.interval, 60)
+        downtime = max(0, int((self.clock.time() - state.saved_at) // interval))
+        
+        with self.lock:
+            if state.date == self.today:
+                self.daily_usage_minutes = state.daily_usage_minutes
+                self.daily_active_seconds = state.daily_active_seconds
+            self.continuous_usage_minutes = state.continuous_usage_minutes
+            self.inactive_minutes = state.inactive_minutes + downtime
+            self.continuous_notification_active = state.continuous_notification_active
+            self.last_notification_time = state.last_notification_time
+            self.alert_engine.sync(self.continuous_usage_minutes, self.daily_usage_minutes)
+            if self.inactive_minutes >= config.INACTIVITY_RESET:
+                self._reset_usage_timer()
+            
+        log_manager.info(
+            f"已从状态检查点恢复: 保存日期{state.date}, 停机{downtime}分钟, "
+            f"连续使用{self.continuous_usage_minutes}分钟, 今日{self.daily_usage_minutes}分钟"
+        )
+        
+    def _save_checkpoint(self):
+        """将当前状态写入检查点(只写内存映射，不经过数据库)
+        
+        跟踪线程和界面的重置都会调用，状态的读取和写入在同一次持锁中完成，
+        后写入的检查点一定是较新的状态。
+        """
+        with self.lock:
+            state = CheckpointState(
+                self.clock.time(), self.today, self.continuous_usage_minutes, self.inactive_minutes,
+                self.daily_usage_minutes, self.daily_active_seconds,
+                self.continuous_notification_active, self.last_notification_time
+            )
+            self.checkpoint.save(state)
+        
+    @staticmethod
+    def _replay_recent_minutes(end, recent):
+        """由最近的分钟记录倒序推算连续使用分钟数和当前不活跃分钟数
+        
+        与跟踪循环的规则一致: 活跃分钟累加连续使用时间，连续INACTIVITY_RESET分钟
+        不活跃则重置。没有记录的分钟(程序未运行、采样间断)按不活跃计。
+        
+        参数:
+            end (datetime): 当前整分钟，尚未记录
+            recent (list): (记录时间, 是否活跃)元组的列表，最新的在前
+            
+        返回:
+            tuple: (连续使用分钟数, 最后一个活跃分钟之后的不活跃分钟数)
+        """
+        continuous = 0
+        inactive = None
+        streak = 0  # 当前向前累计的连续不活跃分钟数
+        expected = end
+        for timestamp, is_active in recent:
+            streak += int((expected - timestamp).total_seconds() // 60) - 1
+            if streak >= config.INACTIVITY_RESET:
+                break
+            if is_active:
+                if inactive is None:
+                    inactive = streak
+                continuous += 1
+                streak = 0
+            else:
+                streak += 1
+            expected = timestamp
+        
+        if inactive is None:
+            # 重置阈值内没有活跃分钟，连续使用已被重置
+            return 0, 0
+        return continuous, inactive
+        
     def stop(self):
         """停止时间跟踪"""
         self.running = False
+        self._stop_event.set()
         if self.thread:
             self.thread.join(timeout=1.0)
+        # 记录最后一个不完整分钟内已有的采样点；跟踪线程未能及时退出时它可能仍在
+        # 处理节拍并读写self._slots，此时不在这里补记
+        thread_stopped = self.thread is None or not self.thread.is_alive()
+        if thread_stopped and self._slots is not None and not self._slots.empty:
+            self._process_minute(*self._slots.take())
         self.activity_monitor.stop()
+        if self.checkpoint:
+            self._save_checkpoint()
+            self.checkpoint.close()
         log_manager.info("时间跟踪已停止")
         
     def _tracking_loop(self):
-        """主时间跟踪循环"""
+        """主时间跟踪循环
+        
+        由TickScheduler在整分钟边界触发，每个节拍统计刚结束的一个检查间隔。
+        """
         while self.running:
-            # 等待固定的检查间隔
-            time.sleep(config.ACTIVITY_CHECK_INTERVAL * 60)
-            
-            # 检查当前日期，如果是新的一天则重置每日统计
-            current_date = datetime.now().strftime("%Y-%m-%d")
-            
-            # 日期变更处理
-            if current_date != self.today:
-                log_manager.info(f"检测到日期变更: {self.today} -> {current_date}")
+            if self.step() is None:
+                break
                 
-                # 保存前一天的使用数据
-                self._save_daily_usage()
+    def step(self):
+        """等待下一个节拍并处理它
+        
+        跟踪线程循环调用本方法；模拟运行时由模拟器在虚拟时钟上直接调用，
+        不启动跟踪线程。
+        
+        返回:
+            Tick: 已处理的节拍，停止时返回None
+        """
+        # 等待下一个整分钟节拍
+        tick = self.scheduler.wait(self._stop_event)
+        if tick is None:
+            return None
+        self._log_tick(tick)
+        
+        # 日期以本节拍统计的区间为准，跨过午夜的第一个节拍负责结算前一天
+        with self.lock:
+            self._handle_date_change(tick.timestamp.strftime("%Y-%m-%d"))
+        
+        # 睡眠/停顿/时间跳变期间没有采样，记一条间断并按不活跃的间隔计入；
+        # 间断之前不完整的分钟按已有的采样点记录
+        if tick.gap:
+            if self._slots is not None and not self._slots.empty:
+                self._process_minute(*self._slots.take())
+            self._account_gap(tick.gap, tick.missed)
+        
+        # 检查活动状态
+        activity_data = self.activity_monitor.check_activity_minute()
+        timestamp = tick.timestamp
+        if self._slots is not None:
+            if not self._slots.belongs(timestamp):
+                self._process_minute(*self._slots.take())
+            if not self._slots.add(timestamp, activity_data):
+                return tick  # 这一分钟还有后续采样点
+            timestamp, activity_data = self._slots.take()
+        self._process_minute(timestamp, activity_data)
+        return tick
+        
+    def _process_minute(self, timestamp, activity_data):
+        """记录一分钟的活动并更新计时、发送提醒
+        
+        参数:
+            timestamp (datetime): 这一分钟(检查间隔)的起始时间
+            activity_data (dict): check_activity_minute()的结果，分钟内多次采样时
+                另含slot_mask
+        """
+        is_active = activity_data["is_active"]
+        
+        # 记录到数据库
+        if self.db_manager:
+            self.db_manager.record_minute_activity(
+                timestamp,
+                is_active,
+                activity_data["mouse_moves"],
+                activity_data["key_presses"],
+                activity_data["active_seconds"],
+                activity_data["mouse_distance"],
+                activity_data["mouse_clicks"],
+                activity_data["typing"],
+                activity_data.get("slot_mask"),
+                self.resolution
+            )
+        
+        with self.lock:
+            self.daily_active_seconds += activity_data["active_seconds"]
+            
+            if is_active:
+                # 用户活跃，增加连续使用时间
+                self.continuous_usage_minutes += 1
+                self.daily_usage_minutes += 1
+                self.inactive_minutes = 0
                 
-                # 更新日期并重置计数器
-                self.today = current_date
-                self.last_check_date = current_date
-                self.daily_usage_minutes = 0
+                # 记录调试信息
+                log_manager.debug(f"检测到活动：日期={self.today}, 连续使用={self.continuous_usage_minutes}分钟, 今日使用={self.daily_usage_minutes}分钟")
                 
-                # 确保活动监控器在新的一天正常工作
-                self.activity_monitor.reset()
+                # 检查是否有到期的提醒规则，没有到期规则时只比较两个截止值
+                alert = self.alert_engine.evaluate(
+                    self.continuous_usage_minutes, self.daily_usage_minutes,
+                    timestamp.hour * 60 + timestamp.minute
+                )
+                if alert:
+                    self._send_alert(alert)
+                    
+            else:
+                # 用户不活跃，增加不活跃时间
+                self.inactive_minutes += 1
                 
-                log_manager.info(f"已重置每日使用统计，新日期: {current_date}")
+                # 检查是否需要重置计时器
+                if self.inactive_minutes >= config.INACTIVITY_RESET:
+                    self._reset_usage_timer()
+                    
+        if self.checkpoint:
+            self._save_checkpoint()
             
-            # 检查活动状态
-            activity_data = self.activity_monitor.check_activity_minute()
-            is_active = activity_data["is_active"]
+        log_manager.debug(f"连续使用: {self.continuous_usage_minutes}分钟, 不活跃: {self.inactive_minutes}分钟, 今日使用: {self.daily_usage_minutes}分钟")
+                
+    def _log_tick(self, tick):
+        """记录节拍延迟，每小时输出一次抖动统计和输入事件统计"""
+        if tick.lateness > 1.0:
+            log_manager.warning(f"定时节拍延迟{tick.lateness:.2f}秒")
+        stats = self.scheduler.get_stats()
+        if stats["ticks"] % max(int(3600 // self.scheduler.interval), 1) == 0:
+            log_manager.info(
+                f"定时节拍统计: 共{stats['ticks']}次, 错过{stats['missed']}次, "
+                f"平均延迟{stats['mean_lateness_ms']:.1f}毫秒, 最大延迟{stats['max_lateness_ms']:.1f}毫秒"
+            )
+            self._log_input_stats()
             
-            # 记录到数据库
-            if self.db_manager:
-                self.db_manager.record_minute_activity(
-                    datetime.now(),
-                    is_active,
-                    activity_data["mouse_moves"],
-                    activity_data["key_presses"]
-                )
+    def _log_input_stats(self):
+        """输出上次输出以来的输入事件处理统计，有事件因超出每秒预算被丢弃时记为警告"""
+        stats = self.activity_monitor.get_input_stats()
+        last = self._last_input_stats or dict.fromkeys(stats, 0)
+        delta = {key: stats[key] - last[key] for key in stats}
+        self._last_input_stats = stats
+        message = (
+            f"输入事件统计: 鼠标采样{delta['mouse_samples']}次, 合并{delta['mouse_coalesced']}次, "
+            f"丢弃{delta['mouse_dropped']}次; 按键{delta['key_presses']}次, 丢弃{delta['key_dropped']}次"
+        )
+        if delta["mouse_dropped"] or delta["key_dropped"]:
+            log_manager.warning(message + "(超出每秒事件预算)")
+        else:
+            log_manager.info(message)
             
-            with self.lock:
-                # 再次检查日期，确保在长时间暂停后恢复时能正确处理日期变更
-                check_date = datetime.now().strftime("%Y-%m-%d")
-                if check_date != self.last_check_date:
-                    log_manager.info(f"锁内检测到日期变更: {self.last_check_date} -> {check_date}")
-                    # 如果日期已变更但还未处理，先保存昨日数据
-                    if self.today != check_date:
-                        self._save_daily_usage()
-                        self.today = check_date
-                        self.daily_usage_minutes = 0
-                        # 确保活动监控器在新的一天正常工作
-                        self.activity_monitor.reset()
-                        log_manager.info(f"锁内已重置每日使用统计，新日期: {check_date}")
-                    self.last_check_date = check_date
+    def _account_gap(self, gap, missed):
+        """处理采样间断: 写入一条间断记录，将错过的节拍计为不活跃的间隔
+        
+        间断只记一行，不为其中每一分钟写入不活跃记录。不足一整分钟的间断(细分辨率下
+        个别采样点迟到)不记录也不计入。间断达到INACTIVITY_RESET时连续使用计时随之
+        重置，数据库中当天的当前会话也只在这时清零。
+        
+        参数:
+            gap (Gap): 调度器报告的间断
+            missed (int): 错过的节拍数
+        """
+        log_manager.warning(
+            f"检测到采样间断({gap.kind}): {gap.start:%Y-%m-%d %H:%M} - {gap.end:%Y-%m-%d %H:%M}, "
+            f"错过{missed}个检查节拍, 系统时间跳变{gap.jump:.1f}秒"
+        )
+        if self._slots is not None:
+            missed = missed * self.resolution // 60  # 错过的采样点换算为整分钟
+        if not missed:
+            return
+        with self.lock:
+            self.inactive_minutes += missed
+            ends_session = self.inactive_minutes >= config.INACTIVITY_RESET
+            if ends_session:
+                self._reset_usage_timer()
+        if self.db_manager and gap.end > gap.start:
+            self.db_manager.record_gap(gap.start, gap.end, gap.kind, gap.jump,
+                                       ends_session=ends_session)
                 
-                if is_active:
-                    # 用户活跃，增加连续使用时间
-                    self.continuous_usage_minutes += 1
-                    self.daily_usage_minutes += 1
-                    self.inactive_minutes = 0
-                    
-                    # 记录调试信息
-                    log_manager.debug(f"检测到活动：日期={self.today}, 连续使用={self.continuous_usage_minutes}分钟, 今日使用={self.daily_usage_minutes}分钟")
-                    
-                    # 检查是否需要发送提醒
-                    if (self.continuous_usage_minutes > 0 and 
-                        self.continuous_usage_minutes % config.CONTINUOUS_USAGE_ALERT == 0):
-                        self._send_usage_alert()
-                        # 第一次达到阈值时，启用连续通知（如果配置允许）
-                        if (config.ENABLE_CONTINUOUS_NOTIFICATION and 
-                            not self.continuous_notification_active and 
-                            self.continuous_usage_minutes == config.CONTINUOUS_USAGE_ALERT):
-                            self.continuous_notification_active = True
-                            self.last_notification_time = self.continuous_usage_minutes
-                            log_manager.info("已启用连续通知功能")
-                    
-                    # 检查是否需要发送连续通知
-                    elif (self.continuous_notification_active and 
-                         (self.continuous_usage_minutes - self.last_notification_time) >= config.CONTINUOUS_NOTIFICATION_INTERVAL):
-                        self._send_continuous_notification()
-                        self.last_notification_time = self.continuous_usage_minutes
-                        
-                else:
-                    # 用户不活跃，增加不活跃时间
-                    self.inactive_minutes += 1
-                    
-                    # 检查是否需要重置计时器
-                    if self.inactive_minutes >= config.INACTIVITY_RESET:
-                        self._reset_usage_timer()
-                        
-            log_manager.debug(f"连续使用: {self.continuous_usage_minutes}分钟, 不活跃: {self.inactive_minutes}分钟, 今日使用: {self.daily_usage_minutes}分钟")
+    def _handle_date_change(self, date_str):
+        """切换到新的日期: 保存前一天的使用数据并重置每日统计(调用方需持有self.lock)
+        
+        只由跟踪循环按节拍统计区间的日期调用，日期只会前进；系统时间被调慢时
+        回到已结算日期的节拍仍计入当前日期的统计。
+        
+        参数:
+            date_str (str): 本节拍所属的日期 (YYYY-MM-DD)
+        """
+        if date_str <= self.today:
+            return
+        log_manager.info(f"检测到日期变更: {self.today} -> {date_str}")
+        
+        # 保存前一天的使用数据
+        self._save_daily_usage()
+        
+        # 更新日期并重置计数器
+        self.today = date_str
+        self.daily_usage_minutes = 0
+        self.daily_active_seconds = 0
+        self.alert_engine.reset(DAILY)
+        
+        # 不重置活动监控器: 本节拍要记录的正是新一天第一个间隔内的活动
+        log_manager.info(f"已重置每日使用统计，新日期: {date_str}")
                 
-    def _send_usage_alert(self):
-        """发送使用时间提醒"""
-        message = config.NOTIFICATION_MESSAGE.format(self.continuous_usage_minutes)
-        self.notification_system.send_notification(
-            config.NOTIFICATION_TITLE, 
-            message
-        )
-        log_manager.log_activity_alert(self.continuous_usage_minutes)
+    def _send_alert(self, alert):
+        """发送一条到期的提醒(调用方需持有self.lock)
+        
+        消息模板的第一个占位符是规则计数器的分钟数，第二个是INACTIVITY_RESET。
+        静音时段内的提醒只记录日志。
         
-    def _send_continuous_notification(self):
-        """发送连续通知提醒"""
+        参数:
+            alert (Alert): 提醒引擎返回的到期提醒
+        """
+        rule = alert.rule
+        if rule.counter == CONTINUOUS:
+            if not self.continuous_notification_active:
+                self.continuous_notification_active = True
+                log_manager.info("已启用连续通知功能")
+            self.last_notification_time = alert.value
+            log_manager.log_activity_alert(alert.value)
+        if alert.quiet:
+            log_manager.info(f"静音时段内跳过提醒({rule.name}): {alert.value}分钟")
+            return False
         try:
-            # 使用配置中的消息模板
-            message = config.CONTINUOUS_NOTIFICATION_MESSAGE.format(
-                self.continuous_usage_minutes,
-                config.INACTIVITY_RESET
-            )
-            
+            message = rule.message.format(alert.value, config.INACTIVITY_RESET)
             result = self.notification_system.send_notification(
-                config.CONTINUOUS_NOTIFICATION_TITLE, 
+                rule.title,
                 message,
-                timeout=15  # 延长通知显示时间
+                timeout=rule.timeout
             )
-            log_manager.info(f"发送连续通知: 已连续使用{self.continuous_usage_minutes}分钟")
+            log_manager.info(f"发送提醒({rule.name}): {alert.value}分钟")
             return result
         except Exception as e:
-            log_manager.error(f"发送连续通知失败: {e}")
+            log_manager.error(f"发送提醒({rule.name})失败: {e}")
             return False
         
     def _reset_usage_timer(self):
@@ -181,6 +439,8 @@ class TimeTracker:
         self.continuous_usage_minutes = 0
         self.inactive_minutes = 0
         
+        self.alert_engine.reset(CONTINUOUS)
+        
         # 停用连续通知
         if self.continuous_notification_active:
             self.continuous_notification_active = False
@@ -204,39 +464,40 @@ class TimeTracker:
             log_manager.info(f"已更新数据库每日汇总: {self.today}")
         
     def get_usage_stats(self):
-        """获取使用统计数据"""
+        """获取使用统计数据
+        
+        日期变更只在跟踪循环中处理，午夜之后的第一个节拍(最多一分钟)之前
+        返回的仍是前一天的统计。
+        """
         with self.lock:
-            # 确保返回最新日期的数据
-            current_date = datetime.now().strftime("%Y-%m-%d")
-            if current_date != self.today:
-                log_manager.info(f"获取统计数据时检测到日期变更: {self.today} -> {current_date}")
-                self._save_daily_usage()
-                self.today = current_date
-                self.daily_usage_minutes = 0
-            
             return {
                 "continuous_usage_minutes": self.continuous_usage_minutes,
                 "inactive_minutes": self.inactive_minutes,
                 "daily_usage_minutes": self.daily_usage_minutes,
+                "daily_active_seconds": self.daily_active_seconds,
                 "usage_log": self.usage_log.copy(),
                 "continuous_notification_active": self.continuous_notification_active,
-                "current_date": self.today
+                "alert_text": self.alert_engine.status_text(
+                    self.continuous_usage_minutes, self.daily_usage_minutes
+                ),
+                "current_date": self.today,
+                "tick_stats": self.scheduler.get_stats()
             }
         
+    def reload_alert_rules(self):
+        """设置变更后重新编译提醒规则，按当前计数器继续计划"""
+        engine = AlertEngine()
+        with self.lock:
+            engine.sync(self.continuous_usage_minutes, self.daily_usage_minutes)
+            self.alert_engine = engine
+        
     def reset(self):
         """重置所有计时器"""
         with self.lock:
             prev_continuous = self.continuous_usage_minutes
             self.continuous_usage_minutes = 0
             self.inactive_minutes = 0
-            
-            # 确保当前日期是最新的
-            current_date = datetime.now().strftime("%Y-%m-%d")
-            if current_date != self.today:
-                self._save_daily_usage()
-                self.today = current_date
-                self.daily_usage_minutes = 0
-                log_manager.info(f"重置时检测到日期变更: {self.today}")
+            self.alert_engine.reset(CONTINUOUS)
             
             # 停用连续通知
             if self.continuous_notification_active:
@@ -246,4 +507,8 @@ class TimeTracker:
                 
             self.activity_monitor.reset() 
             log_manager.log_activity_reset("用户手动重置")
-            log_manager.info(f"已重置连续使用时间，之前为 {prev_continuous} 分钟") 
\ No newline at end of file
+            log_manager.info(f"已重置连续使用时间，之前为 {prev_continuous} 分钟")
+            
+        # 立即写入检查点，避免崩溃后恢复成重置前的状态
+        if self.checkpoint:
+            self._save_checkpoint() 
\ No newline at end of file
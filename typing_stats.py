@@ -0,0 +1,75 @@
+"""
+打字节奏统计模块 - 以常数内存流式统计相邻两次按键的间隔
+
+本模块负责:
+1. 用Welford算法流式计算按键间隔的个数、均值和方差
+2. 记录最长间隔和固定分桶的间隔直方图
+3. 定义这些统计量在数据库中的列名
+
+连续打字时间隔集中在几百毫秒以内，偶尔敲一下键则间隔以秒计，
+直方图可以直接区分这两种情况，不需要保存原始按键事件。
+"""
+
+from bisect import bisect_right
+
+# 直方图分桶的上界(秒)，共len(HISTOGRAM_BOUNDS) + 1个桶，最后一个桶收集5秒以上的间隔
+HISTOGRAM_BOUNDS = (0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0)
+HISTOGRAM_BUCKETS = len(HISTOGRAM_BOUNDS) + 1
+
+# 超过该间隔(秒)的两次按键不计入统计，视为两段独立的输入
+MAX_INTERVAL = 60.0
+
+# 数据库中的列: 间隔个数、均值(秒)、总体方差(秒²)、最长间隔(秒)、各直方图桶的计数
+COLUMNS = (("key_intervals", "key_interval_mean", "key_interval_var", "key_max_gap")
+           + tuple(f"key_hist_{i}" for i in range(HISTOGRAM_BUCKETS)))
+
+class TypingStats:
+    """一段时间内按键间隔的流式统计"""
+
+    __slots__ = ("count", "mean", "m2", "max_gap", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # 与均值之差的平方和
+        self.max_gap = 0.0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, interval):
+        """加入一个按键间隔(秒)，超过MAX_INTERVAL的间隔被忽略"""
+        if interval < 0 or interval > MAX_INTERVAL:
+            return
+        self.count += 1
+        delta = interval - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (interval - self.mean)
+        if interval > self.max_gap:
+            self.max_gap = interval
+        self.histogram[bisect_right(HISTOGRAM_BOUNDS, interval)] += 1
+
+    def merge(self, other):
+        """并入另一段时间的统计(Chan等人的并行合并公式)"""
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+        if other.max_gap > self.max_gap:
+            self.max_gap = other.max_gap
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+
+    @property
+    def variance(self):
+        """总体方差(秒²)"""
+        return self.m2 / self.count if self.count else 0.0
+
+    def row(self):
+        """按COLUMNS的顺序返回要写入数据库的值"""
+        return (self.count, self.mean, self.variance, self.max_gap) + tuple(self.histogram)
+
+    @classmethod
+    def empty_row(cls):
+        """没有按键间隔时写入数据库的值"""
+        return cls().row()
@@ -51,7 +51,7 @@ class MonitorWindow:
         # 创建主窗口
         self.root = tk.Tk()
         self.root.title("电脑使用时间监控")
-        self.root.geometry("430x600")  # 增加窗口高度以容纳所有内容
+        self.root.geometry("430x625")  # 增加窗口高度以容纳所有内容
         # self.root.resizable(False, False)
         self.root.resizable(True, True)  # 允许用户调整窗口大小
 
@@ -110,6 +110,14 @@ class MonitorWindow:
         self.activity_label = ttk.Label(activity_frame, text="刚刚", style="Data.TLabel")
         self.activity_label.pack(side=tk.RIGHT)
         
+        # 最近一小时内有输入的时间
+        recent_frame = ttk.Frame(status_frame)
+        recent_frame.pack(fill=tk.X)
+        
+        ttk.Label(recent_frame, text="近一小时输入:", style="Header.TLabel").pack(side=tk.LEFT)
+        self.recent_active_label = ttk.Label(recent_frame, text="0分0秒", style="Data.TLabel")
+        self.recent_active_label.pack(side=tk.RIGHT)
+        
         # 提醒信息
         self.alert_label = ttk.Label(status_frame, text="", style="Warning.TLabel")
         self.alert_label.pack(fill=tk.X, pady=(10, 0))
@@ -123,7 +131,7 @@ class MonitorWindow:
         check_interval_frame.pack(fill=tk.X, pady=2)
         ttk.Label(check_interval_frame, text="活动检查间隔:", style="Config.TLabel").pack(side=tk.LEFT)
         self.check_interval_label = ttk.Label(check_interval_frame, 
-                                     text=f"每{config.ACTIVITY_CHECK_INTERVAL}分钟检查一次活动状态", 
+                                     text=self._check_interval_text(), 
                                      style="Config.TLabel")
         self.check_interval_label.pack(side=tk.RIGHT)
         
@@ -196,9 +204,16 @@ class MonitorWindow:
         copyright_label.pack(side=tk.BOTTOM, pady=(15, 0))
         
         self.root.update_idletasks()  # 更新所有挂起的任务
-        self.root.geometry("430x600")  # 让窗口根据内容自动调整大小
+        self.root.geometry("430x625")  # 让窗口根据内容自动调整大小
         log_manager.info("UI界面元素创建完成")
         
+    def _check_interval_text(self):
+        """活动检查间隔的显示文字，分钟内多次采样时显示跟踪器实际使用的分辨率"""
+        resolution = self.time_tracker.resolution
+        if resolution < 60:
+            return f"每{resolution}秒采样一次活动状态"
+        return f"每{config.ACTIVITY_CHECK_INTERVAL}分钟检查一次活动状态"
+        
     def start(self):
         """启动监视器窗口"""
         if self.running:
@@ -272,20 +287,20 @@ class MonitorWindow:
                 activity_text = f"{int(idle_time // 3600)}小时前"
             self.activity_label.config(text=activity_text)
             
+            # 更新最近一小时内有输入的时间(逐秒统计，比按分钟计的使用时间更能反映实际强度)
+            recent_seconds = self.time_tracker.activity_monitor.get_active_seconds(3600)
+            self.recent_active_label.config(text=f"{recent_seconds // 60}分{recent_seconds % 60}秒")
+            
             # 更新配置显示
-            self.check_interval_label.config(text=f"每{config.ACTIVITY_CHECK_INTERVAL}分钟检查一次活动状态")
+            self.check_interval_label.config(text=self._check_interval_text())
             self.usage_alert_label.config(text=f"连续使用{config.CONTINUOUS_USAGE_ALERT}分钟后提醒")
             self.inactivity_label.config(text=f"无活动{config.INACTIVITY_RESET}分钟后重置计时器")
             
-            # 更新提醒信息
-            if continuous_mins >= 55 and continuous_mins < 60:
-                self.alert_label.config(text=f"即将达到1小时连续使用，请准备休息")
-                log_manager.debug("显示即将达到连续使用预警")
-            elif continuous_mins >= 60:
-                self.alert_label.config(text=f"已连续使用{continuous_mins}分钟，建议休息一下")
-                log_manager.debug(f"显示连续使用警告: {continuous_mins}分钟")
-            else:
-                self.alert_label.config(text="")
+            # 更新提醒信息(由跟踪器的提醒规则引擎生成，与实际提醒的阈值一致)
+            alert_text = stats["alert_text"]
+            self.alert_label.config(text=alert_text)
+            if alert_text:
+                log_manager.debug(f"显示提醒信息: {alert_text}")
                 
             # 更新下次报告时间
             if self.next_report_time:
@@ -404,21 +419,10 @@ class MonitorWindow:
                 else:
                     log_manager.debug(f"后台更新: 连续使用{stats['continuous_usage_minutes']}分钟，今日总计{stats['daily_usage_minutes']}分钟")
                 
-                # 关键：确保活动监控器继续检测活动 - 修复方法调用
-                activity_data = self.time_tracker.activity_monitor.check_activity_minute()
-                
-                # Windows 10系统上，强制更新数据库以确保活动记录
-                if is_windows10 and activity_data["is_active"] and self.time_tracker.db_manager:
-                    # 强制数据库记录当前活动，确保即使在后台也能记录
-                    try:
-                        self.time_tracker.db_manager.record_minute_activity(
-                            datetime.now(),
-                            activity_data["is_active"],
-                            activity_data["mouse_moves"],
-                            activity_data["key_presses"]
-                        )
-                    except Exception as db_err:
-                        log_manager.error(f"强制记录活动数据失败: {db_err}")
+                # 只读取活动快照: 采样由跟踪器的节拍取走并写入数据库，
+                # 这里调用check_activity_minute会清空跟踪器下一个节拍要统计的数据
+                activity = self.time_tracker.activity_monitor.snapshot()
+                log_manager.debug(f"后台活动快照: 活跃={activity['is_active']}, 空闲{activity['idle_seconds']:.0f}秒")
                 
                 # 没必要太频繁更新，每5秒更新一次即可
                 # 在Windows 10上使用稍快的更新间隔
@@ -551,8 +555,11 @@ class MonitorWindow:
             settings_window.run()
             log_manager.info("设置窗口已关闭")
             
+            # 按新的设置重新编译提醒规则
+            self.time_tracker.reload_alert_rules()
+            
             # 刷新UI显示的配置
-            self.check_interval_label.config(text=f"每{config.ACTIVITY_CHECK_INTERVAL}分钟检查一次活动状态")
+            self.check_interval_label.config(text=self._check_interval_text())
             self.usage_alert_label.config(text=f"连续使用{config.CONTINUOUS_USAGE_ALERT}分钟后提醒")
             self.inactivity_label.config(text=f"无活动{config.INACTIVITY_RESET}分钟后重置计时器")
             
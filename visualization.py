@@ -17,7 +17,10 @@ import numpy as np
 from datetime import datetime, timedelta
 import seaborn as sns
 from matplotlib.colors import LinearSegmentedColormap
+import activity_bitmap
+import config
 import log_manager
+import minute_slots
 
 class UsageVisualizer:
     def __init__(self, db_manager, output_dir="reports"):
@@ -74,10 +77,23 @@ class UsageVisualizer:
             date = datetime.now().strftime("%Y-%m-%d")
             
         log_manager.info(f"开始生成{date}的每日使用报告...")
+        # 提交数据库写缓冲，确保报表包含最近几分钟的数据
+        self.db_manager.flush(timeout=10)
         hourly_data = self.db_manager.get_day_activity(date)
-        
-        # 创建图形
-        fig, ax = plt.subplots(figsize=(12, 6))
+        # 按当前采样分辨率读取当天的活动时间线
+        resolution = minute_slots.normalize_resolution(config.TRACKING_RESOLUTION)
+        day_slots = self.db_manager.get_day_slots(date, resolution)
+        # 由当天的活动位图计算最长连续使用和休息次数
+        bitmap = self.db_manager.get_activity_bitmaps(date, date).get(date, activity_bitmap.empty())
+        longest = activity_bitmap.longest_run(bitmap)
+        rest_breaks = activity_bitmap.breaks(bitmap, config.INACTIVITY_RESET)
+        # 休眠、程序卡顿等原因造成的采样间断，这些时段没有数据而不是没有使用
+        gaps = self.db_manager.get_activity_gaps(date, date)
+        
+        # 创建图形: 上方为每小时柱状图，下方为活动时间线
+        fig, (ax, timeline_ax) = plt.subplots(
+            2, 1, figsize=(12, 7), gridspec_kw={'height_ratios': [6, 1]}
+        )
         
         # X轴为小时 (0-23)
         hours = list(range(24))
@@ -92,7 +108,11 @@ class UsageVisualizer:
                        str(count), ha='center', va='bottom')
         
         # 设置图表标题和标签
-        ax.set_title(f"每小时电脑使用情况 ({date})", fontsize=14)
+        ax.set_title(
+            f"每小时电脑使用情况 ({date})\n"
+            f"最长连续使用{longest}分钟, 休息{len(rest_breaks)}次(≥{config.INACTIVITY_RESET}分钟)",
+            fontsize=14
+        )
         ax.set_xlabel("小时", fontsize=12)
         ax.set_ylabel("活跃分钟数", fontsize=12)
         
@@ -107,6 +127,28 @@ class UsageVisualizer:
         # 添加网格线
         ax.grid(True, linestyle='--', alpha=0.7)
         
+        # 活动时间线，每个色块为一个采样点
+        timeline_ax.imshow(
+            day_slots[np.newaxis, :], aspect='auto', cmap='Blues', vmin=0, vmax=1,
+            extent=(0, 24, 0, 1), interpolation='nearest'
+        )
+        # 休息时段用浅色标出
+        for start, length in rest_breaks:
+            timeline_ax.axvspan(start / 60, (start + length) / 60, color='#2ecc71', alpha=0.3)
+        # 采样间断用灰色斜线标出，跨天的间断只画当天的部分
+        day_start = datetime.strptime(date, "%Y-%m-%d")
+        for gap_start, gap_end, kind, _ in gaps:
+            start_hour = max((gap_start - day_start).total_seconds() / 3600, 0)
+            end_hour = min((gap_end - day_start).total_seconds() / 3600, 24)
+            timeline_ax.axvspan(start_hour, end_hour, facecolor='none', edgecolor='#7f8c8d',
+                                hatch='//', linewidth=0)
+        timeline_ax.set_xlim(0, 24)
+        timeline_ax.set_xticks(range(0, 25, 2))
+        timeline_ax.set_xticklabels([f"{h:02d}:00" for h in range(0, 25, 2)])
+        timeline_ax.set_yticks([])
+        gap_text = f", 采样间断{len(gaps)}次(斜线)" if gaps else ""
+        timeline_ax.set_xlabel(f"活动时间线 (每格{resolution}秒{gap_text})", fontsize=10)
+        
         # 紧凑布局
         plt.tight_layout()
         
@@ -132,12 +174,13 @@ class UsageVisualizer:
             end_date = datetime.now().strftime("%Y-%m-%d")
             
         log_manager.info(f"开始生成截至{end_date}的周热力图...")
-        # 获取一周的数据
-        weekly_data = self.db_manager.get_weekly_heatmap_data(end_date)
-        
-        # 准备热力图数据
-        dates = list(weekly_data.keys())
-        dates.sort()  # 确保日期有序
+        # 提交数据库写缓冲，确保报表包含最近几分钟的数据
+        self.db_manager.flush(timeout=10)
+        # 一次查询获取一周的(天数×24小时)活跃分钟矩阵
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+        start_dt = end_dt - timedelta(days=6)
+        data_matrix = self.db_manager.get_activity_matrix(start_dt, end_dt, bucket="hour")
+        dates = [(start_dt + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(len(data_matrix))]
         
         # 记录数据情况
         if len(dates) == 0:
@@ -145,11 +188,6 @@ class UsageVisualizer:
         else:
             log_manager.info(f"获取到{len(dates)}天的数据，从{dates[0]}到{dates[-1]}")
             
-        # 创建数据矩阵
-        data_matrix = []
-        for date in dates:
-            data_matrix.append(weekly_data[date])
-            
         # 创建热力图
         fig, ax = plt.subplots(figsize=(14, 8))
         
@@ -213,6 +251,8 @@ class UsageVisualizer:
             str: 生成的报告文件路径，如无数据则生成空报告
         """
         log_manager.info(f"开始生成过去{days}天的月度摘要...")
+        # 提交数据库写缓冲，确保报表包含最近几分钟的数据
+        self.db_manager.flush(timeout=10)
         # 获取每日汇总数据
         daily_data = self.db_manager.get_daily_summaries(days)
         
@@ -326,6 +366,9 @@ class UsageVisualizer:
         """
         log_manager.info("开始生成综合使用统计HTML报告...")
         
+        # 提交数据库写缓冲，确保报表包含最近几分钟的数据
+        self.db_manager.flush(timeout=10)
+        
         # 确保目录存在
         try:
             if not os.path.exists(self.output_dir):